@@ -17,6 +17,10 @@ def create_app():
     # 설정 로드
     app.config.from_object(Config)
     
+    # [신규] DB 엔진/커넥션 풀 옵션 (환경변수 DB_*, PostgreSQL만 적용)
+    from services.db_pool import build_engine_options
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = build_engine_options(app.config)
+    
     # DB 초기화
     db.init_app(app)
     
@@ -27,6 +31,10 @@ def create_app():
     from extensions import limiter
     limiter.init_app(app)
     
+    # [신규] bcrypt 풀 포화 시 429
+    from services.password_hasher import HasherBusy, busy_response
+    app.register_error_handler(HasherBusy, busy_response)
+    
     # Blueprint 등록
     app.register_blueprint(public_bp)
     app.register_blueprint(admin_bp)
@@ -58,6 +66,73 @@ def create_app():
 
         db.create_all()
 
+        # [Self-Healing] 전화번호 검색 해시 백필 (해시 누락/구버전 회원만 처리)
+        try:
+            from services.member_lookup import backfill_phone_hashes
+            updated = backfill_phone_hashes()
+            if updated:
+                print(f"Phone hash backfill: {updated} members updated")
+        except Exception as e:
+            print(f"Phone hash backfill failed: {e}")
+
+        # [Self-Healing] 이름/전화번호 검색 토큰 백필 (토큰 없는 회원만 처리)
+        try:
+            from services.member_search import backfill_search_tokens
+            updated = backfill_search_tokens()
+            if updated:
+                print(f"Search token backfill: {updated} members updated")
+        except Exception as e:
+            print(f"Search token backfill failed: {e}")
+
+        # [비동기 영수증] 재시작 전 처리되지 못한 대기 작업 재개
+        if app.config.get("RECEIPT_ASYNC"):
+            try:
+                from services.receipt_jobs import resume_queued_jobs
+                resumed = resume_queued_jobs()
+                if resumed:
+                    print(f"Receipt jobs resumed: {resumed}")
+            except Exception as e:
+                print(f"Receipt job resume failed: {e}")
+
+        # [신규] 보관 기간이 지난 영수증 작업 결과 정리
+        try:
+            from services.receipt_jobs import purge_finished_jobs
+            purged = purge_finished_jobs()
+            if purged:
+                print(f"Receipt jobs purged: {purged}")
+        except Exception as e:
+            print(f"Receipt job purge failed: {e}")
+
+        # [신규] 시작 작업(마이그레이션/백필)에 쓴 연결 정리
+        # Gunicorn --preload로 fork된 워커들이 같은 DB 소켓을 물려받지 않도록 (워커는 새로 연결)
+        db.engine.dispose()
+
+    # [신규] 구조화 로그 + 요청 ID
+    # (자동 마이그레이션의 alembic 로그 설정이 루트 핸들러를 덮어쓰므로 그 이후에 설정)
+    from services.log_service import init_logging
+    init_logging(app)
+
+    # [신규] 처리 단계별 지표 (/metrics, Server-Timing 헤더)
+    from services.metrics import init_metrics, register_gauge
+    init_metrics(app)
+    from models import Members
+    register_gauge("pii_plaintext_rows", Members.count_plaintext_rows)
+    from services.db_pool import init_pool_metrics
+    init_pool_metrics(app, db)
+
+    # [신규] 중단된 비동기 영수증 작업 재처리 스레드 (RECEIPT_ASYNC일 때, 워커별로 첫 요청 시 시작)
+    from services.receipt_jobs import ensure_job_sweeper
+    app.before_request(lambda: ensure_job_sweeper(app))
+
+    # [신규] 만료 쿠폰 일괄 처리 스레드 (COUPON_EXPIRY_INTERVAL > 0일 때, 워커별로 첫 요청 시 시작)
+    from services.coupon_expiry import ensure_expiry_sweeper
+    app.before_request(lambda: ensure_expiry_sweeper(app))
+
+    # [신규] 알림톡 발송 대기열 처리 스레드 (ALIMTALK_DISPATCH_INTERVAL > 0일 때, 워커별로 첫 요청 시 시작)
+    from services.alimtalk_outbox import ensure_dispatcher, count_pending
+    app.before_request(lambda: ensure_dispatcher(app))
+    register_gauge("alimtalk_outbox_pending", count_pending, ttl=30)
+
     return app
 
 # Gunicorn 구동을 위해 전역 변수로 app 객체 생성
@@ -0,0 +1,187 @@
+"""
+주요 조회 쿼리 실행 계획(EXPLAIN) 검사 - SQLite / PostgreSQL
+
+사용법:
+    python audit_query_plans.py        # 쿼리별 실행 계획 출력, 큰 테이블 전체 스캔이 있으면 exit 1
+    python audit_query_plans.py -v     # 전체 실행 계획 상세 출력
+
+- 라우트/서비스의 조회 쿼리와 같은 조건으로 만든 쿼리를 EXPLAIN (실제 데이터는 읽지 않음)
+- PostgreSQL은 작은 테이블에서 인덱스가 있어도 Seq Scan을 고르므로 enable_seqscan=off로 검사
+  (이 상태에서도 Seq Scan이면 쓸 수 있는 인덱스가 없다는 뜻)
+- index_only=True 쿼리는 인덱스만으로 처리되어야 함 (1일 1회 적립 확인, 중복 영수증 확인, 회원 수 집계, 회원 검색)
+"""
+import sys
+import json
+import argparse
+from datetime import datetime
+from sqlalchemy import select, func, or_
+from app import app
+from models import (db, Members, Receipts, Coupons, Staffs, PointLedger, IdempotencyKeys, ReceiptJobs,
+                    AlimtalkOutbox, MemberSearchTokens)
+from routes.admin import VISIT_SORT_KEY, BRANCH_SORT_KEY
+
+# 데이터가 계속 늘어나는 테이블 (전체 스캔 금지)
+LARGE_TABLES = {"members", "receipts", "coupons", "point_ledger", "member_search_tokens",
+                "receipt_jobs", "idempotency_keys", "staffs", "alimtalk_outbox"}
+
+
+def hot_queries():
+    """(이름, 쿼리, index_only) - 라우트/서비스 조회와 같은 조건 (값은 임의)"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return [
+        # services/receipt_service.py
+        ("receipt daily limit", select(Receipts.query.filter(
+            Receipts.member_id == 1, Receipts.visit_date >= today).exists()), True),
+        ("receipt duplicate", select(Receipts.query.filter(
+            Receipts.receipt_no.in_(["AUTO_x_1000_20260101", "AUTO_x_1000_010548"])).exists()), True),
+        # services/member_lookup.py
+        ("member by phone hash", Members.query.filter_by(phone_hash_value="x").statement, False),
+        # routes/public.py check
+        ("recent spend history", PointLedger.query.filter(
+            PointLedger.member_id == 1, PointLedger.spend_delta != 0, PointLedger.kind != 'opening'
+        ).order_by(PointLedger.id.desc()).limit(3).statement, False),
+        ("ledger first row", PointLedger.query.filter(PointLedger.member_id == 1)
+            .order_by(PointLedger.id.asc()).limit(1).statement, False),
+        ("pre-ledger receipt history", Receipts.query.filter(
+            Receipts.member_id == 1, Receipts.visit_date < today
+        ).order_by(Receipts.visit_date.desc()).limit(3).statement, False),
+        # routes/reward.py
+        ("my coupons available", Coupons.query.filter(
+            Coupons.member_id == 1, Coupons.status == 'AVAILABLE', Coupons.expiry_date >= today
+        ).order_by(Coupons.expiry_date.asc()).statement, False),
+        ("my coupons used/expired", Coupons.query.filter(
+            Coupons.member_id == 1, Coupons.status.in_(['USED', 'EXPIRED'])
+        ).order_by(Coupons.used_date.desc(), Coupons.expiry_date.desc()).statement, False),
+        ("coupon by code", Coupons.query.filter_by(coupon_code="CP-XXXXXXXX").statement, False),
+        ("idempotency key", IdempotencyKeys.query.filter_by(scope="claim:1", key="x").statement, False),
+        # services/staff_auth.py
+        ("staff by pin index", Staffs.query.filter_by(branch="dongdaemun", pin_index="x").statement, False),
+        ("staff by id", Staffs.query.filter_by(id=1, branch="dongdaemun").statement, False),
+        # routes/admin.py
+        ("admin member receipts", Receipts.query.filter_by(member_id=1)
+            .order_by(Receipts.visit_date.desc()).statement, False),
+        ("admin member coupons", Coupons.query.filter_by(member_id=1)
+            .order_by(Coupons.issued_date.desc()).statement, False),
+        ("admin receipt summary", select(
+            Receipts.member_id, func.count(Receipts.id), func.coalesce(func.sum(Receipts.amount), 0),
+            func.max(Receipts.visit_date)
+        ).where(Receipts.member_id.in_([1, 2, 3])).group_by(Receipts.member_id), False),
+        ("admin members page", Members.query.filter(Members.id < 1000)
+            .order_by(Members.id.desc()).limit(51).statement, False),
+        ("admin members page by visits", Members.query.filter(
+            VISIT_SORT_KEY <= 3, or_(VISIT_SORT_KEY < 3, Members.id < 1000)
+        ).order_by(VISIT_SORT_KEY.desc(), Members.id.desc()).limit(51).statement, False),
+        ("admin members page by branch", Members.query.filter(
+            BRANCH_SORT_KEY >= "dongdaemun", or_(BRANCH_SORT_KEY > "dongdaemun", Members.id > 1000)
+        ).order_by(BRANCH_SORT_KEY.asc(), Members.id.asc()).limit(51).statement, False),
+        ("admin member totals", select(func.count(Members.id), func.sum(Members.visit_count)), True),
+        # services/member_search.py
+        ("member search tokens", select(MemberSearchTokens.member_id).where(
+            MemberSearchTokens.token.in_(["a", "b", "c"])
+        ).group_by(MemberSearchTokens.member_id).having(
+            func.count(func.distinct(MemberSearchTokens.token)) == 3
+        ).order_by(MemberSearchTokens.member_id.desc()).limit(21), True),
+        # services/coupon_expiry.py
+        ("coupon expiry sweep", select(Coupons.id).where(
+            Coupons.status == 'AVAILABLE', Coupons.expiry_date < today).limit(1000), True),
+        # services/alimtalk_outbox.py
+        ("alimtalk outbox claim", select(AlimtalkOutbox.id).where(
+            AlimtalkOutbox.status.in_(('PENDING', 'SENDING')), AlimtalkOutbox.next_attempt_at <= today
+        ).order_by(AlimtalkOutbox.next_attempt_at).limit(100), False),
+        # services/receipt_jobs.py
+        ("receipt job", ReceiptJobs.query.filter_by(id="x").statement, False),
+    ]
+
+
+def _explain_rows(conn, statement):
+    # IN (...) 목록은 실제 실행처럼 파라미터 개수만큼 펼쳐서 컴파일
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN (FORMAT JSON) "
+    return conn.exec_driver_sql(prefix + str(compiled), params).all()
+
+
+def _check_sqlite(rows, index_only):
+    """반환값: (계획 요약 줄 리스트, 문제 리스트)"""
+    plan, problems = [], []
+    for row in rows:
+        detail = row[-1]
+        plan.append(detail)
+        words = detail.split()
+        # "SCAN receipts" / "SEARCH receipts USING INDEX ..." 형식만 검사
+        if len(words) < 2 or words[0] not in ("SCAN", "SEARCH") or words[1] not in LARGE_TABLES:
+            continue
+        if words[0] == "SCAN" and "INDEX" not in detail:
+            problems.append(f"full table scan: {detail}")
+        elif index_only and "COVERING INDEX" not in detail and "PRIMARY KEY" not in detail:
+            problems.append(f"not index-only: {detail}")
+    return plan, problems
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _check_postgres(rows, index_only):
+    plan, problems = [], []
+    root = rows[0][0]
+    if isinstance(root, str):
+        root = json.loads(root)
+    for node in _walk(root[0]["Plan"]):
+        relation = node.get("Relation Name")
+        label = node["Node Type"] + (f" on {relation}" if relation else "") + (
+            f" using {node['Index Name']}" if node.get("Index Name") else "")
+        plan.append(label)
+        if relation not in LARGE_TABLES:
+            continue
+        if node["Node Type"] == "Seq Scan":
+            problems.append(f"full table scan: {label}")
+        elif index_only and node["Node Type"] != "Index Only Scan":
+            problems.append(f"not index-only: {label}")
+    return plan, problems
+
+
+def audit(verbose=False):
+    """반환값: 문제 있는 쿼리 수"""
+    failures = 0
+    with db.engine.connect() as conn:
+        is_sqlite = conn.dialect.name == "sqlite"
+        if not is_sqlite:
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            conn.exec_driver_sql("SET enable_bitmapscan = off")
+
+        for name, statement, index_only in hot_queries():
+            rows = _explain_rows(conn, statement)
+            plan, problems = (_check_sqlite if is_sqlite else _check_postgres)(rows, index_only)
+            mark = "❌" if problems else "✅"
+            print(f"{mark} {name}" + (" (index-only)" if index_only else ""))
+            if verbose or problems:
+                for line in plan:
+                    print(f"     {line}")
+            for problem in problems:
+                print(f"     -> {problem}")
+            failures += bool(problems)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="주요 조회 쿼리 실행 계획 검사")
+    parser.add_argument("-v", "--verbose", action="store_true", help="모든 쿼리의 실행 계획 출력")
+    args = parser.parse_args()
+
+    with app.app_context():
+        print(f"Database: {db.engine.dialect.name}")
+        failures = audit(args.verbose)
+
+    if failures:
+        print(f"{failures} queries need an index")
+        sys.exit(1)
+    print("All hot queries use indexes")
+
+
+if __name__ == "__main__":
+    main()
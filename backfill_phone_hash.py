@@ -0,0 +1,17 @@
+import sys
+from app import app
+from models import db
+from services.db_pool import disable_session_timeouts
+from services.member_lookup import backfill_phone_hashes
+
+def backfill():
+    # --all: 정규화 규칙 변경 등으로 전체 회원 재해싱이 필요할 때
+    force = "--all" in sys.argv
+    with app.app_context():
+        disable_session_timeouts(db.engine)  # 웹 요청용 DB 시간 제한 해제 (장시간 배치)
+        print("Starting phone hash backfill...")
+        count = backfill_phone_hashes(force=force)
+        print(f"Backfill completed. {count} members updated.")
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,161 @@
+"""
+영수증 파서 벤치마크 / 정확도 측정 (parser_fixtures/ 코퍼스 사용)
+
+사용법:
+    python bench_parser.py                    # 속도(건/초, p50/p99) + 필드별 정확도 리포트
+    python bench_parser.py --gate             # 기준선(baseline.json) 대비 회귀가 있으면 exit 1
+    python bench_parser.py --gate --speed     # 속도 회귀도 검사 (같은 장비에서 만든 기준선일 때만)
+    python bench_parser.py --update-baseline  # 현재 결과를 기준선으로 저장
+
+FERNET_KEY / FLASK_SECRET_KEY 없이 실행 가능 (파서는 config를 import하지 않음)
+코퍼스 추가: parser_fixtures/에 OCR 텍스트(.txt, 개인정보 제거)를 넣고 expected.json에 정답 등록
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from services.ocr_parser import parse_receipt_text
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_fixtures")
+EXPECTED_FILE = os.path.join(FIXTURE_DIR, "expected.json")
+BASELINE_FILE = os.path.join(FIXTURE_DIR, "baseline.json")
+
+FIELDS = ["amount", "branch_paid", "date", "receipt_no"]
+
+# 속도 회귀 허용폭 (기준선 대비 30% 이상 느려지면 실패)
+SPEED_TOLERANCE = 0.3
+
+
+def load_corpus():
+    with open(EXPECTED_FILE, encoding="utf-8") as f:
+        expected = json.load(f)
+    expected.pop("_comment", None)
+
+    corpus = []
+    for name in sorted(expected):
+        with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+            corpus.append((name, f.read(), expected[name]))
+    return corpus
+
+
+def check_accuracy(corpus):
+    """반환값: ({필드: (정답 수, 채점 수)}, {파일명: [맞춘 필드]}, [(파일명, 필드, 정답, 결과)])"""
+    today = datetime.now().strftime("%Y%m%d")
+    scores = {field: [0, 0] for field in FIELDS}
+    correct = {}
+    misses = []
+
+    results = [(name, parse_receipt_text(text), expected) for name, text, expected in corpus]
+
+    for name, result, expected in results:
+        correct[name] = []
+        for field in FIELDS:
+            if field not in expected:
+                continue
+            want = expected[field]
+            if field == "date" and want is None:
+                want = today  # 날짜 없는 영수증은 오늘 날짜로 처리
+            scores[field][1] += 1
+            if result[field] == want:
+                scores[field][0] += 1
+                correct[name].append(field)
+            else:
+                misses.append((name, field, want, result[field]))
+
+    return {field: tuple(score) for field, score in scores.items()}, correct, misses
+
+
+def measure_speed(corpus, rounds):
+    """반환값: (건/초, p50 us, p99 us)"""
+    texts = [text for _, text, _ in corpus]
+    latencies = []
+
+    for _ in range(rounds):
+        for text in texts:
+            start = time.perf_counter_ns()
+            parse_receipt_text(text)
+            latencies.append(time.perf_counter_ns() - start)
+
+    latencies.sort()
+    total_sec = sum(latencies) / 1e9
+    p50 = latencies[len(latencies) // 2] / 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] / 1000
+    return len(latencies) / total_sec, p50, p99
+
+
+def gate(baseline, scores, correct, parses_per_sec, check_speed):
+    """기준선 대비 회귀 목록 반환 (비어 있으면 통과)"""
+    failures = []
+
+    for field, (ok, total) in scores.items():
+        base_ok = baseline["accuracy"].get(field, 0)
+        if ok < base_ok:
+            failures.append(f"{field} 정확도 하락: {base_ok} -> {ok}")
+
+    # 기준선에서 맞추던 (파일, 필드)를 틀리게 된 경우
+    for name, fields in baseline["correct"].items():
+        for field in fields:
+            if field not in correct.get(name, []):
+                failures.append(f"{name}: {field} 회귀")
+
+    if check_speed:
+        base_speed = baseline["parses_per_sec"]
+        if parses_per_sec < base_speed * (1 - SPEED_TOLERANCE):
+            failures.append(f"속도 하락: {base_speed:,.0f} -> {parses_per_sec:,.0f} 건/초")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="영수증 파서 벤치마크 / 정확도 회귀 검사")
+    parser.add_argument("--rounds", type=int, default=200, help="속도 측정 시 코퍼스 반복 횟수")
+    parser.add_argument("--gate", action="store_true", help="기준선 대비 회귀 시 exit 1")
+    parser.add_argument("--speed", action="store_true", help="--gate 시 속도 회귀도 검사")
+    parser.add_argument("--update-baseline", action="store_true", help="현재 결과를 기준선으로 저장")
+    parser.add_argument("-v", "--verbose", action="store_true", help="틀린 필드 상세 출력")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    scores, correct, misses = check_accuracy(corpus)
+    parses_per_sec, p50, p99 = measure_speed(corpus, args.rounds)
+
+    print(f"코퍼스: {len(corpus)}건 x {args.rounds}회")
+    print(f"속도: {parses_per_sec:,.0f} 건/초 | p50 {p50:,.1f}us | p99 {p99:,.1f}us")
+    for field, (ok, total) in scores.items():
+        print(f"  {field:<12} {ok:>3}/{total:<3} ({ok / total * 100 if total else 0:.1f}%)")
+
+    if args.verbose:
+        for name, field, want, got in misses:
+            print(f"  ✗ {name} [{field}] 정답={want!r} 결과={got!r}")
+
+    if args.update_baseline:
+        baseline = {
+            "accuracy": {field: ok for field, (ok, _) in scores.items()},
+            "correct": correct,
+            "parses_per_sec": round(parses_per_sec),
+        }
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=4)
+            f.write("\n")
+        print(f"기준선 저장: {BASELINE_FILE}")
+
+    if args.gate:
+        if not os.path.exists(BASELINE_FILE):
+            print("기준선이 없습니다. --update-baseline으로 먼저 생성하세요.")
+            sys.exit(1)
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        failures = gate(baseline, scores, correct, parses_per_sec, args.speed)
+        if failures:
+            print("❌ 회귀 발견:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print("✅ 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
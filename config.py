@@ -1,7 +1,6 @@
 import os
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 
-import bcrypt
 
 # 경로 설정
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -17,18 +16,31 @@ FERNET_KEY = os.environ.get("FERNET_KEY")
 if not FERNET_KEY:
     raise RuntimeError("FERNET_KEY environment variable is not set. Encryption cannot work.")
 
-cipher_suite = Fernet(FERNET_KEY)
+# [신규] 키 교체(Rotation): 새 키를 FERNET_KEY로, 이전 키를 FERNET_KEYS_PREVIOUS(쉼표 구분)에 두면
+# 암호화는 새 키로, 복호화는 모든 키로 수행 -> migrate_encrypt.py로 재암호화 완료 후 이전 키 제거
+FERNET_KEYS_PREVIOUS = [k.strip() for k in os.environ.get("FERNET_KEYS_PREVIOUS", "").split(",") if k.strip()]
+primary_cipher = Fernet(FERNET_KEY)
+cipher_suite = MultiFernet([primary_cipher] + [Fernet(k) for k in FERNET_KEYS_PREVIOUS])
 
 def encrypt_data(data):
     if not data: return data
     return cipher_suite.encrypt(data.encode()).decode()
 
+# Fernet 토큰은 버전 바이트(0x80) + 타임스탬프로 시작하므로 base64 인코딩 시 항상 'gAAAAA'로 시작
+FERNET_TOKEN_PREFIX = "gAAAAA"
+
 def decrypt_data(data):
     if not data: return data
-    try:
-        return cipher_suite.decrypt(data.encode()).decode()
-    except:
-        return data  # 마이그레이션 전 평문일 경우 그대로 반환
+    # [수정] 암호문 형식이 아니면 복호화 시도(HMAC 검증) 없이 바로 평문으로 처리
+    if data.startswith(FERNET_TOKEN_PREFIX):
+        try:
+            return cipher_suite.decrypt(data.encode()).decode()
+        except (InvalidToken, UnicodeDecodeError):
+            pass
+    # 마이그레이션 전 평문일 경우 그대로 반환 (남은 평문 데이터 파악용 지표 기록)
+    from services.metrics import inc_counter
+    inc_counter("plaintext_decrypt_total")
+    return data
 
 class Config:
     SECRET_KEY = os.environ.get("FLASK_SECRET_KEY")
@@ -37,18 +49,127 @@ class Config:
     database_url = os.environ.get('DATABASE_URL')
     if database_url and database_url.startswith("postgres://"):
         database_url = database_url.replace("postgres://", "postgresql://", 1)
+    # [수정] 드라이버 명시 (SQLAlchemy 2.1부터 postgresql:// 기본 드라이버가 psycopg 3 -> 설치된 psycopg2 사용)
+    if database_url and database_url.startswith("postgresql://"):
+        database_url = database_url.replace("postgresql://", "postgresql+psycopg2://", 1)
 
     SQLALCHEMY_DATABASE_URI = database_url or f'sqlite:///{os.path.join(APP_ROOT, "instance", "members.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # [신규] DB 커넥션 풀 (PostgreSQL, Gunicorn 워커 프로세스별) - 엔진 옵션은 services/db_pool에서 구성
+    # 워커 수 x (DB_POOL_SIZE + DB_MAX_OVERFLOW)가 DB 최대 연결 수보다 작아야 함
+    # 요청 스레드 외에 영수증 작업 스레드(RECEIPT_JOB_WORKERS), 만료/알림톡 스레드도 연결을 사용
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))   # 풀에서 연결을 기다리는 최대 시간(초)
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))   # 오래된 연결 교체 주기(초) - 유휴 연결 끊김 대비
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"  # 사용 전 연결 확인 (끊긴 연결 자동 교체)
+    DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
+    # 서버 측 시간 제한(밀리초, 0 = 제한 없음): 쿼리 실행, 트랜잭션 중 유휴
+    # 웹 요청 기준 - 자동 마이그레이션과 배치 CLI는 트랜잭션마다 해제 (services/db_pool.disable_session_timeouts)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.environ.get("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "60000"))
+    # PgBouncer(transaction 모드) 경유 시 1: 앱 쪽 풀 대신 요청마다 연결 (PgBouncer가 풀링)
+    # 시작 파라미터(options)를 쓸 수 없으므로 시간 제한은 DB 역할에 설정 (ALTER ROLE ... SET statement_timeout = ...)
+    DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
+    
     # 관리자 비밀번호 (Bcrypt 해시, 예: $2b$12$...)
     ADMIN_PASSWORD_BCRYPT = os.environ.get("ADMIN_PASSWORD_BCRYPT", "$2b$12$Kj5KSvJ3W.o7s6mKEabht.PLRuWPoJllo9TiYN/17UwvoMA8RIhke")
     
     # 전화번호 검색용 해시 Salt (Pepper)
     PHONE_HASH_PEPPER = os.environ.get("PHONE_HASH_PEPPER", "default_pepper")
+    # [신규] Pepper 교체(Rotation) 지원: 버전을 올리고 이전 Pepper를 함께 설정하면
+    # 백필 작업이 끝날 때까지 이전 해시로도 조회 가능 (점진적 전환)
+    # (버전 2: 숫자만 남기는 정규화 + '+82' 처리 적용)
+    PHONE_HASH_VERSION = int(os.environ.get("PHONE_HASH_VERSION", "2"))
+    PHONE_HASH_PEPPER_PREVIOUS = os.environ.get("PHONE_HASH_PEPPER_PREVIOUS")
+    
+    # [신규] 이름/전화번호 부분 검색용 Blind Index HMAC 키 (미설정 시 Pepper 사용)
+    SEARCH_INDEX_KEY = os.environ.get("SEARCH_INDEX_KEY", PHONE_HASH_PEPPER)
+    
+    # [신규] 전화번호 조회 캐시 (워커별 메모리, 초 단위 TTL)
+    PHONE_LOOKUP_CACHE_SIZE = int(os.environ.get("PHONE_LOOKUP_CACHE_SIZE", "2048"))
+    PHONE_LOOKUP_CACHE_TTL = int(os.environ.get("PHONE_LOOKUP_CACHE_TTL", "300"))
+    # 미가입 번호 캐시는 다른 워커에서 가입 시 무효화가 불가하므로 짧게 유지
+    PHONE_LOOKUP_NEGATIVE_TTL = int(os.environ.get("PHONE_LOOKUP_NEGATIVE_TTL", "30"))
+
+    # [신규] 관리자 회원 목록 상단 전체 회원 수/방문 수 캐시 (워커별 메모리, 초 단위 TTL)
+    ADMIN_TOTALS_CACHE_TTL = int(os.environ.get("ADMIN_TOTALS_CACHE_TTL", "60"))
+    
+    # [신규] 직원 PIN 조회용 HMAC 키 (미설정 시 검색 인덱스 키 사용, 변경 시 직원 PIN 재설정 필요)
+    STAFF_PIN_INDEX_KEY = os.environ.get("STAFF_PIN_INDEX_KEY", SEARCH_INDEX_KEY)
+    # 직원 PIN 연속 실패 허용 횟수 / 잠금 시간(분)
+    STAFF_PIN_MAX_FAILURES = int(os.environ.get("STAFF_PIN_MAX_FAILURES", "5"))
+    STAFF_PIN_LOCK_MINUTES = int(os.environ.get("STAFF_PIN_LOCK_MINUTES", "15"))
+    # [신규] 직원을 특정할 수 없는 PIN 단독 입력 실패의 지점별 허용 한도 (초과 시 직원 선택 필수, limits 표기)
+    STAFF_PIN_ONLY_FAILURE_LIMIT = os.environ.get("STAFF_PIN_ONLY_FAILURE_LIMIT", "10 per 10 minutes")
+    
+    # [신규] 비밀번호/PIN bcrypt 검증 전용 스레드 풀 (워커별)
+    # 풀 크기 + 대기열을 넘는 요청은 즉시 429 -> 로그인 폭주가 영수증 처리까지 막지 않도록
+    BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+    BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", "2"))
+    BCRYPT_MAX_PENDING = int(os.environ.get("BCRYPT_MAX_PENDING", "4"))
+    BCRYPT_TIMEOUT = float(os.environ.get("BCRYPT_TIMEOUT", "3"))
     
     # 파일 업로드 제한 (32MB) - 고화질 사진 대응
     MAX_CONTENT_LENGTH = 32 * 1024 * 1024
+    
+    # [신규] OCR 전 이미지 축소 (긴 변 픽셀, JPEG 품질) - 영수증 글자 인식에 충분한 해상도
+    OCR_IMAGE_MAX_SIDE = int(os.environ.get("OCR_IMAGE_MAX_SIDE", "2000"))
+    OCR_IMAGE_JPEG_QUALITY = int(os.environ.get("OCR_IMAGE_JPEG_QUALITY", "85"))
+    
+    # [신규] OCR 결과 캐시 (같은 사진 재업로드 시 Vision 재호출 방지, 워커 간 공유 SQLite 파일)
+    OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "1") == "1"
+    OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", os.path.join(APP_ROOT, "instance", "ocr_cache.db"))
+    OCR_CACHE_TTL = int(os.environ.get("OCR_CACHE_TTL", str(7 * 24 * 3600)))
+    OCR_CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", "10000"))
+    
+    # [신규] 비동기 영수증 처리 (업로드 즉시 작업 ID 반환, OCR은 워커 스레드에서 처리)
+    RECEIPT_ASYNC = os.environ.get("RECEIPT_ASYNC", "0") == "1"
+    RECEIPT_JOB_WORKERS = int(os.environ.get("RECEIPT_JOB_WORKERS", "4"))
+    # 완료/실패 작업 보관 시간(시간) - 결과 화면 재조회용, 지나면 삭제
+    RECEIPT_JOB_RETENTION_HOURS = int(os.environ.get("RECEIPT_JOB_RETENTION_HOURS", "24"))
+    # 처리 중(RUNNING) 상태가 이 시간(초)보다 오래 바뀌지 않으면 워커가 중단된 것으로 보고 다시 처리
+    RECEIPT_JOB_LEASE_SECONDS = int(os.environ.get("RECEIPT_JOB_LEASE_SECONDS", "120"))
+    # 중단된 작업 확인 주기(초) - 워커별 스레드, 0 = 앱 시작 시에만 확인
+    RECEIPT_JOB_SWEEP_INTERVAL = int(os.environ.get("RECEIPT_JOB_SWEEP_INTERVAL", "30"))
+    
+    # [신규] 만료 쿠폰 일괄 처리 (AVAILABLE -> EXPIRED)
+    # 주기(초, 기본 1시간, 0 = 앱 내 실행 안 함 -> cron으로 expire_coupons.py 실행), 1회 UPDATE 건수
+    COUPON_EXPIRY_INTERVAL = int(os.environ.get("COUPON_EXPIRY_INTERVAL", "3600"))
+    COUPON_EXPIRY_BATCH = int(os.environ.get("COUPON_EXPIRY_BATCH", "1000"))
+    
+    # [신규] 알림톡 (알리고) - API 키 미설정 시 실제 발송 없이 로그만 기록
+    ALIGO_API_URL = os.environ.get("ALIGO_API_URL", "https://kakaoapi.aligo.in/akv10/alimtalk/send/")
+    ALIGO_API_KEY = os.environ.get("ALIGO_API_KEY")
+    ALIGO_USER_ID = os.environ.get("ALIGO_USER_ID")
+    ALIGO_SENDER_KEY = os.environ.get("ALIGO_SENDER_KEY")
+    ALIGO_SENDER = os.environ.get("ALIGO_SENDER")
+    ALIGO_TPL_SIGNUP = os.environ.get("ALIGO_TPL_SIGNUP", "TB_SIGNUP_001")
+    ALIGO_TPL_REWARD = os.environ.get("ALIGO_TPL_REWARD", "TB_REWARD_001")
+    ALIGO_TIMEOUT = float(os.environ.get("ALIGO_TIMEOUT", "5"))
+    # [신규] 알림톡 발송 대기열: 발송 주기(초, 0 = 앱 내 발송 안 함 -> cron으로 dispatch_alimtalk.py 실행),
+    # 1회 요청당 수신자 수(알리고 최대 500), 최대 시도 횟수, 재시도 대기(초, 실패마다 2배), 발송 완료 건 보관 기간(일)
+    ALIMTALK_DISPATCH_INTERVAL = int(os.environ.get("ALIMTALK_DISPATCH_INTERVAL", "5"))
+    ALIMTALK_BATCH_SIZE = min(int(os.environ.get("ALIMTALK_BATCH_SIZE", "100")), 500)
+    ALIMTALK_MAX_ATTEMPTS = int(os.environ.get("ALIMTALK_MAX_ATTEMPTS", "6"))
+    ALIMTALK_RETRY_SECONDS = int(os.environ.get("ALIMTALK_RETRY_SECONDS", "30"))
+    ALIMTALK_RETENTION_DAYS = int(os.environ.get("ALIMTALK_RETENTION_DAYS", "30"))
+    
+    # [신규] 구조화 로그 (json | text)
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+    # 파싱/OCR 상세 추적 로그 샘플링 비율 (0~1, 기본 0 = 끔) - OCR 원문(개인정보)이 포함되므로 주의
+    PARSE_TRACE_SAMPLE_RATE = float(os.environ.get("PARSE_TRACE_SAMPLE_RATE", "0"))
+    # 요청 단위 추적: X-Debug-Trace 헤더 값이 이 토큰과 같으면 해당 요청만 추적 (미설정 시 비활성)
+    TRACE_TOKEN = os.environ.get("TRACE_TOKEN")
+    
+    # [신규] 처리 단계별 지표 (/metrics, Prometheus 형식) - 토큰 미설정 시 엔드포인트 비활성
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # 워커별 지표를 합산하기 위한 공유 폴더, 기록 주기(초), 종료된 워커 파일 보관 기간(초)
+    METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(APP_ROOT, "instance", "metrics"))
+    METRICS_FLUSH_INTERVAL = int(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+    METRICS_STALE_SECONDS = int(os.environ.get("METRICS_STALE_SECONDS", str(24 * 3600)))
 
 def check_admin_password(password):
     """입력받은 비밀번호와 환경변수의 Bcrypt 해시를 비교 검증"""
@@ -56,12 +177,16 @@ def check_admin_password(password):
         # 설정이 없으면 로그인 불가
         return False
     
-    # 입력된 비밀번호를 bytes로 변환
-    password_bytes = password.encode('utf-8')
-    # 환경변수의 해시값도 bytes로 변환
-    known_hash = Config.ADMIN_PASSWORD_BCRYPT.encode('utf-8')
+    # [수정] bcrypt 전용 스레드 풀에서 검증 (가득 차면 HasherBusy -> 429)
+    from services.password_hasher import check_password, needs_rehash
+    if not check_password(password, Config.ADMIN_PASSWORD_BCRYPT):
+        return False
     
-    return bcrypt.checkpw(password_bytes, known_hash)
+    # 환경변수에 저장된 해시라 자동 재해싱은 불가 -> cost 변경 시 교체 안내만 남김
+    if needs_rehash(Config.ADMIN_PASSWORD_BCRYPT):
+        import logging
+        logging.getLogger(__name__).warning("ADMIN_PASSWORD_BCRYPT cost differs from BCRYPT_ROUNDS=%s; regenerate the hash", Config.BCRYPT_ROUNDS)
+    return True
 
 # 지점 정보
 BRANCH_MAP = {
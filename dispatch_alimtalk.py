@@ -0,0 +1,40 @@
+"""
+알림톡 발송 대기열 처리 (앱 내 발송 스레드를 끈 경우 cron으로 실행)
+
+사용법:
+    python dispatch_alimtalk.py            # 발송 가능한 알림 모두 발송 (cron 등록 예: * * * * *)
+    python dispatch_alimtalk.py --status   # 상태별 건수만 확인
+    python dispatch_alimtalk.py --purge    # 발송 후 보관 기간(ALIMTALK_RETENTION_DAYS)이 지난 알림 삭제
+
+앱 내에서 발송하려면 ALIMTALK_DISPATCH_INTERVAL(초, 기본 5)을 설정 (이 스크립트 불필요)
+"""
+import argparse
+from sqlalchemy import func
+from app import app
+from models import db, AlimtalkOutbox
+from services.db_pool import disable_session_timeouts
+from services.alimtalk_outbox import dispatch_pending, purge_sent
+from services.metrics import flush
+
+def main():
+    parser = argparse.ArgumentParser(description="알림톡 발송 대기열 처리")
+    parser.add_argument("--batch", type=int, help="1회 요청당 수신자 수 (기본: ALIMTALK_BATCH_SIZE)")
+    parser.add_argument("--status", action="store_true", help="상태별 건수만 출력 (발송 안 함)")
+    parser.add_argument("--purge", action="store_true", help="보관 기간이 지난 발송 완료 알림 삭제")
+    args = parser.parse_args()
+
+    with app.app_context():
+        disable_session_timeouts(db.engine)  # 웹 요청용 DB 시간 제한 해제 (장시간 배치)
+        if args.status:
+            rows = db.session.query(AlimtalkOutbox.status, func.count(AlimtalkOutbox.id)).group_by(AlimtalkOutbox.status).all()
+            for status, count in sorted(rows):
+                print(f"{status}: {count:,}")
+            return
+        if args.purge:
+            print(f"{purge_sent():,} sent messages purged")
+        totals = dispatch_pending(limit=args.batch)
+        flush(force=True)
+        print(f"sent {totals['sent']:,}, retry later {totals['retry']:,}, failed {totals['failed']:,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+유효기간이 지난 쿠폰 일괄 만료 처리 (AVAILABLE -> EXPIRED)
+
+사용법:
+    python expire_coupons.py               # 만료 처리 (cron 등록 예: 0 * * * *)
+    python expire_coupons.py --dry-run     # 만료 대상 건수만 확인
+    python expire_coupons.py --batch 5000  # 1회 UPDATE 건수 (기본: COUPON_EXPIRY_BATCH)
+
+앱 내에서는 COUPON_EXPIRY_INTERVAL(초, 기본 3600) 주기로 실행됨 - 0으로 끈 경우 cron으로 이 스크립트 실행
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import func
+from app import app
+from models import db, Coupons
+from services.db_pool import disable_session_timeouts
+from services.coupon_expiry import expire_coupons
+from services.metrics import flush
+
+def main():
+    parser = argparse.ArgumentParser(description="만료 쿠폰 일괄 처리")
+    parser.add_argument("--batch", type=int, help="1회 UPDATE 건수 (배치마다 커밋)")
+    parser.add_argument("--dry-run", action="store_true", help="만료 대상 건수만 집계 (DB 변경 없음)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        disable_session_timeouts(db.engine)  # 웹 요청용 DB 시간 제한 해제 (장시간 배치)
+        if args.dry_run:
+            count = db.session.query(func.count(Coupons.id)).filter(
+                Coupons.status == 'AVAILABLE', Coupons.expiry_date < datetime.now()
+            ).scalar()
+            print(f"{count:,} coupons would expire")
+            return
+        expired = expire_coupons(batch_size=args.batch)
+        flush(force=True)
+        print(f"{expired:,} coupons expired")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+로컬 테스트용 가짜 알리고 알림톡 서버 (실제 발송 없음)
+
+사용법:
+    python fake_aligo_server.py                  # http://127.0.0.1:8899/akv10/alimtalk/send/
+    python fake_aligo_server.py --fail-rate 0.3  # 30% 요청을 오류 응답(code -99)으로 처리
+    python fake_aligo_server.py --delay 2        # 응답 지연(초) - 시간 초과/재시도 확인용
+
+앱 실행 시 환경변수:
+    ALIGO_API_URL=http://127.0.0.1:8899/akv10/alimtalk/send/ ALIGO_API_KEY=test ...
+
+코드에서 사용 (verify_alimtalk_outbox.py):
+    server = FakeAligoServer().start()
+    ... server.url, server.requests, server.fail_next = 1 ...
+    server.stop()
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SEND_PATH = "/akv10/alimtalk/send/"
+
+
+class FakeAligoServer:
+    def __init__(self, host="127.0.0.1", port=0, fail_rate=0.0, delay=0.0, verbose=False):
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.verbose = verbose
+        self.fail_next = 0   # 다음 N건 요청을 오류로 응답
+        self.requests = []   # 받은 요청 (폼 데이터 dict)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{SEND_PATH}"
+
+    def receivers(self):
+        """받은 요청의 수신자 목록 (요청 순서대로)"""
+        with self._lock:
+            return [form[key] for form in self.requests for key in sorted(form) if key.startswith("receiver_")]
+
+    def _respond(self, form):
+        with self._lock:
+            self.requests.append(form)
+            fail = self.fail_next > 0 or random.random() < self.fail_rate
+            if self.fail_next > 0:
+                self.fail_next -= 1
+        if self.delay:
+            time.sleep(self.delay)
+        if fail:
+            return {"code": -99, "message": "fake failure"}
+        if not form.get("apikey") or not form.get("tpl_code"):
+            return {"code": -101, "message": "missing apikey or tpl_code"}
+        count = sum(1 for key in form if key.startswith("receiver_"))
+        return {"code": 0, "message": "성공적으로 전송요청 하였습니다.",
+                "info": {"type": "AT", "mid": len(self.requests), "scnt": count, "fcnt": 0}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != SEND_PATH:
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+                if server.verbose:
+                    receivers = [v for k, v in sorted(form.items()) if k.startswith("receiver_")]
+                    print(f"tpl={form.get('tpl_code')} receivers={receivers}")
+                body = json.dumps(server._respond(form), ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가짜 알리고 알림톡 서버")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="오류 응답 비율 (0~1)")
+    parser.add_argument("--delay", type=float, default=0.0, help="응답 지연(초)")
+    args = parser.parse_args()
+
+    server = FakeAligoServer(port=args.port, fail_rate=args.fail_rate, delay=args.delay, verbose=True)
+    print(f"Fake Aligo server: {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,63 @@
+"""
+개인정보(회원 이름/전화번호/생년월일, 영수증 OCR 원문) 재암호화 / 암호화 키 교체
 
-from app import app, db, Members
+키 교체 절차:
+    1. 새 키 생성 후 FERNET_KEY=<새 키>, FERNET_KEYS_PREVIOUS=<이전 키>로 앱 재시작 (읽기는 두 키 모두 가능)
+    2. python migrate_encrypt.py --dry-run   # 변경 예정 건수 확인
+    3. python migrate_encrypt.py             # 배치 단위 재암호화 (중단되면 다시 실행 시 이어서 진행)
+    4. 완료 후 FERNET_KEYS_PREVIOUS 제거
+       (exit 1이면 재시도 후에도 남은 행 또는 복호화할 수 없는 값이 있음 -> 이전 키를 제거하지 말고 확인 후 다시 실행)
 
-def migrate():
+평문으로 남아 있는 기존 데이터도 같은 방식으로 암호화됨.
+"""
+import sys
+import time
+import argparse
+from app import app
+from models import db
+from services.db_pool import disable_session_timeouts
+from services.reencrypt import TARGETS, reencrypt_table, key_fingerprint
+
+def main():
+    parser = argparse.ArgumentParser(description="개인정보 재암호화 (키 교체 / 평문 데이터 암호화)")
+    parser.add_argument("--table", choices=sorted(TARGETS), action="append", help="대상 테이블 (기본: 전체)")
+    parser.add_argument("--batch", type=int, default=500, help="배치 크기 (배치마다 커밋)")
+    parser.add_argument("--dry-run", action="store_true", help="변경 예정 건수만 집계 (DB 변경 없음)")
+    parser.add_argument("--restart", action="store_true", help="체크포인트를 무시하고 처음부터 다시 실행")
+    args = parser.parse_args()
+
+    started = time.time()
+
+    def progress(table, done, total):
+        rate = done / max(time.time() - started, 1e-6)
+        percent = done / total * 100 if total else 100
+        print(f"\r{table}: {done:,}/{total:,} ({percent:.1f}%) {rate:,.0f} rows/s", end="", flush=True)
+
+    incomplete = []
     with app.app_context():
-        print("Starting migration...")
-        members = Members.query.all()
-        count = 0
-        for m in members:
-            # m.name을 읽을 때:
-            # 1. 256비트 암호화 전 평문 데이터 -> decrypt_data -> try/except -> 평문 반환
-            # 2. 이미 암호화된 데이터 -> decrypt_data -> 평문 반환
-            
-            # 읽은 값을 다시 쓰면 setter 호출 -> encrypt_data -> 암호문 저장
-            original_name = m.name
-            original_phone = m.phone
-            original_birth = m.birth
-            
-            m.name = original_name
-            m.phone = original_phone
-            m.birth = original_birth
-            count += 1
-            
-        db.session.commit()
-        print(f"Migration completed. {count} members processed.")
+        disable_session_timeouts(db.engine)  # 웹 요청용 DB 시간 제한 해제 (장시간 배치)
+        print(f"Re-encrypting with key {key_fingerprint()}" + (" (dry run)" if args.dry_run else ""))
+        for table in args.table or list(TARGETS):
+            started = time.time()
+            stats = reencrypt_table(table, batch_size=args.batch, dry_run=args.dry_run,
+                                    restart=args.restart, progress=progress)
+            if stats["finished"]:
+                print(f"{table}: already re-encrypted with this key (use --restart to run again)")
+                continue
+            print()
+            if stats["resumed_from"]:
+                print(f"{table}: resumed after id {stats['resumed_from']}")
+            print(f"{table}: scanned {stats['scanned']:,} rows, "
+                  f"{'would update' if args.dry_run else 'updated'} {stats['updated']:,} "
+                  f"(rotated {stats['rotated']:,} / plaintext {stats['plaintext']:,} values), "
+                  f"skipped {stats['conflicts']:,} changed rows, invalid {stats['invalid']:,} values")
+            if not args.dry_run and not stats["complete"]:
+                incomplete.append(table)
+
+    if incomplete:
+        print(f"NOT COMPLETE: {', '.join(incomplete)} - keep FERNET_KEYS_PREVIOUS and run again "
+              f"(invalid values cannot be decrypted with any configured key)")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    migrate()
+    main()
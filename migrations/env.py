@@ -11,7 +11,8 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# (앱 시작 시 자동 마이그레이션에서 이미 만들어진 앱 로거가 비활성화되지 않도록 유지)
+fileConfig(config.config_file_name, disable_existing_loggers=False)
 logger = logging.getLogger('alembic.env')
 
 
@@ -104,6 +105,11 @@ def run_migrations_online():
         )
 
         with context.begin_transaction():
+            # [신규] 웹 요청용 서버 측 시간 제한(DB_STATEMENT_TIMEOUT_MS 등)이 앱 시작 시 자동 마이그레이션
+            # (큰 테이블 인덱스 생성 등)을 끊지 않도록 마이그레이션 트랜잭션에서만 해제
+            if connection.dialect.name == "postgresql":
+                connection.exec_driver_sql("SET LOCAL statement_timeout = 0")
+                connection.exec_driver_sql("SET LOCAL idle_in_transaction_session_timeout = 0")
             context.run_migrations()
 
 
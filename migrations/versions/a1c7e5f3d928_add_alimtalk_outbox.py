@@ -0,0 +1,45 @@
+"""Add alimtalk outbox
+
+Revision ID: a1c7e5f3d928
+Revises: f4a9c2e6b137
+Create Date: 2026-10-19 01:12:37.604219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c7e5f3d928'
+down_revision = 'f4a9c2e6b137'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('alimtalk_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dedupe_key', sa.String(length=64), nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('template', sa.String(length=20), nullable=False),
+        sa.Column('params_json', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claimed_by', sa.String(length=32), nullable=True),
+        sa.Column('last_error', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['member_id'], ['members.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dedupe_key')
+    )
+    with op.batch_alter_table('alimtalk_outbox', schema=None) as batch_op:
+        batch_op.create_index('ix_alimtalk_outbox_status_next_attempt_at', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('alimtalk_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_alimtalk_outbox_status_next_attempt_at')
+
+    op.drop_table('alimtalk_outbox')
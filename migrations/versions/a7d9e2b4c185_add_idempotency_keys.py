@@ -0,0 +1,36 @@
+"""Add idempotency keys
+
+Revision ID: a7d9e2b4c185
+Revises: f3c6d1a9e274
+Create Date: 2026-10-18 17:31:52.640918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d9e2b4c185'
+down_revision = 'f3c6d1a9e274'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('idempotency_keys',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=30), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('response_json', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('idempotency_keys', schema=None) as batch_op:
+        batch_op.create_index('uq_idempotency_keys_scope_key', ['scope', 'key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('idempotency_keys', schema=None) as batch_op:
+        batch_op.drop_index('uq_idempotency_keys_scope_key')
+
+    op.drop_table('idempotency_keys')
@@ -0,0 +1,32 @@
+"""Add staff pin index and lockout columns
+
+Revision ID: b4e8c2d6f391
+Revises: a7d9e2b4c185
+Create Date: 2026-10-18 19:04:27.318542
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8c2d6f391'
+down_revision = 'a7d9e2b4c185'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('staffs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pin_index', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('failed_pin_attempts', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pin_locked_until', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_staffs_pin_index'), ['pin_index'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('staffs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_staffs_pin_index'))
+        batch_op.drop_column('pin_locked_until')
+        batch_op.drop_column('failed_pin_attempts')
+        batch_op.drop_column('pin_index')
@@ -0,0 +1,26 @@
+"""Add phone hash version
+
+Revision ID: b7d41c2e9a10
+Revises: 9ea172f81dbd
+Create Date: 2026-10-18 10:12:03.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d41c2e9a10'
+down_revision = '9ea172f81dbd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('members', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_hash_version', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('members', schema=None) as batch_op:
+        batch_op.drop_column('phone_hash_version')
@@ -0,0 +1,29 @@
+"""Add member sort indexes
+
+Revision ID: b9e4d7a2c615
+Revises: a1c7e5f3d928
+Create Date: 2026-10-19 03:05:41.218377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e4d7a2c615'
+down_revision = 'a1c7e5f3d928'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 관리자 회원 목록 방문순/지점순 정렬 키(COALESCE 식)와 같은 식의 인덱스
+    # 방문순 인덱스 끝에 visit_count를 포함해 전체 방문 수 합계도 인덱스만으로 집계
+    # db_fixer가 먼저 만들었을 수 있으므로 IF NOT EXISTS (SQLite / PostgreSQL 공통)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_members_visit_sort ON members ((COALESCE(visit_count, 0)), id, visit_count)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_members_branch_sort ON members ((COALESCE(branch, '')), id)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_members_branch_sort")
+    op.execute("DROP INDEX IF EXISTS ix_members_visit_sort")
@@ -0,0 +1,38 @@
+"""Add member search tokens
+
+Revision ID: c3e8f5a1d204
+Revises: b7d41c2e9a10
+Create Date: 2026-10-18 11:02:47.905531
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8f5a1d204'
+down_revision = 'b7d41c2e9a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('member_search_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('field', sa.String(length=10), nullable=False),
+        sa.Column('token', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['member_id'], ['members.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('member_search_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_member_search_tokens_member_id'), ['member_id'], unique=False)
+        batch_op.create_index('ix_member_search_tokens_token_member', ['token', 'member_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('member_search_tokens', schema=None) as batch_op:
+        batch_op.drop_index('ix_member_search_tokens_token_member')
+        batch_op.drop_index(batch_op.f('ix_member_search_tokens_member_id'))
+
+    op.drop_table('member_search_tokens')
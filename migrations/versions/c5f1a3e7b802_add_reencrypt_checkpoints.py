@@ -0,0 +1,35 @@
+"""Add reencrypt checkpoints
+
+Revision ID: c5f1a3e7b802
+Revises: b4e8c2d6f391
+Create Date: 2026-10-18 20:12:05.734219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f1a3e7b802'
+down_revision = 'b4e8c2d6f391'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reencrypt_checkpoints',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job', sa.String(length=64), nullable=False),
+        sa.Column('last_id', sa.Integer(), nullable=True),
+        sa.Column('scanned', sa.Integer(), nullable=True),
+        sa.Column('updated', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job')
+    )
+
+
+def downgrade():
+    op.drop_table('reencrypt_checkpoints')
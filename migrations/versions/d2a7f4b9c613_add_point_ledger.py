@@ -0,0 +1,52 @@
+"""Add point ledger
+
+Revision ID: d2a7f4b9c613
+Revises: c5f1a3e7b802
+Create Date: 2026-10-18 21:26:43.902517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a7f4b9c613'
+down_revision = 'c5f1a3e7b802'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('point_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('spend_delta', sa.Integer(), nullable=False),
+        sa.Column('balance_after', sa.Integer(), nullable=False),
+        sa.Column('lifetime_after', sa.Integer(), nullable=False),
+        sa.Column('ref', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['member_id'], ['members.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('point_ledger', schema=None) as batch_op:
+        batch_op.create_index('ix_point_ledger_member_id_id', ['member_id', 'id'], unique=False)
+
+    # 기존 회원의 현재 잔액/누적 금액을 시작 잔액(opening)으로 기록
+    op.execute("""
+        INSERT INTO point_ledger (member_id, kind, amount, spend_delta, balance_after, lifetime_after, created_at)
+        SELECT id, 'opening',
+               COALESCE(current_reward_balance, 0), COALESCE(total_lifetime_spend, 0),
+               COALESCE(current_reward_balance, 0), COALESCE(total_lifetime_spend, 0),
+               CURRENT_TIMESTAMP
+        FROM members
+        WHERE COALESCE(current_reward_balance, 0) != 0 OR COALESCE(total_lifetime_spend, 0) != 0
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('point_ledger', schema=None) as batch_op:
+        batch_op.drop_index('ix_point_ledger_member_id_id')
+
+    op.drop_table('point_ledger')
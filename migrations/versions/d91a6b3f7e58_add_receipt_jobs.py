@@ -0,0 +1,40 @@
+"""Add receipt jobs
+
+Revision ID: d91a6b3f7e58
+Revises: c3e8f5a1d204
+Create Date: 2026-10-18 13:40:19.227864
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd91a6b3f7e58'
+down_revision = 'c3e8f5a1d204'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('receipt_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('image_path', sa.String(length=255), nullable=True),
+        sa.Column('image_ext', sa.String(length=10), nullable=True),
+        sa.Column('result_json', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['member_id'], ['members.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('receipt_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_receipt_jobs_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('receipt_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_receipt_jobs_status'))
+
+    op.drop_table('receipt_jobs')
@@ -0,0 +1,26 @@
+"""Add receipt ocr text
+
+Revision ID: e5b2a8c4f019
+Revises: d91a6b3f7e58
+Create Date: 2026-10-18 16:20:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b2a8c4f019'
+down_revision = 'd91a6b3f7e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('receipts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ocr_text', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('receipts', schema=None) as batch_op:
+        batch_op.drop_column('ocr_text')
@@ -0,0 +1,29 @@
+"""Add hot query indexes
+
+Revision ID: e8b3c5d1a476
+Revises: d2a7f4b9c613
+Create Date: 2026-10-18 22:40:18.125903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3c5d1a476'
+down_revision = 'd2a7f4b9c613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db_fixer가 먼저 만들었을 수 있으므로 IF NOT EXISTS (SQLite / PostgreSQL 공통)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_receipts_member_id_visit_date ON receipts (member_id, visit_date)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_coupons_member_id_status_expiry_date ON coupons (member_id, status, expiry_date)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_staffs_branch ON staffs (branch)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_staffs_branch")
+    op.execute("DROP INDEX IF EXISTS ix_coupons_member_id_status_expiry_date")
+    op.execute("DROP INDEX IF EXISTS ix_receipts_member_id_visit_date")
@@ -0,0 +1,29 @@
+"""Add receipt visit day
+
+Revision ID: f3c6d1a9e274
+Revises: e5b2a8c4f019
+Create Date: 2026-10-18 16:58:07.104223
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c6d1a9e274'
+down_revision = 'e5b2a8c4f019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 기존 영수증은 visit_day를 채우지 않음 (과거 중복 데이터로 유니크 인덱스 생성이 실패하지 않도록)
+    with op.batch_alter_table('receipts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('visit_day', sa.String(length=10), nullable=True))
+        batch_op.create_index('uq_receipts_member_visit_day', ['member_id', 'visit_day'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('receipts', schema=None) as batch_op:
+        batch_op.drop_index('uq_receipts_member_visit_day')
+        batch_op.drop_column('visit_day')
@@ -0,0 +1,25 @@
+"""Add coupon expiry index
+
+Revision ID: f4a9c2e6b137
+Revises: e8b3c5d1a476
+Create Date: 2026-10-18 23:55:02.418730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a9c2e6b137'
+down_revision = 'e8b3c5d1a476'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db_fixer가 먼저 만들었을 수 있으므로 IF NOT EXISTS (SQLite / PostgreSQL 공통)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_coupons_status_expiry_date ON coupons (status, expiry_date)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_coupons_status_expiry_date")
@@ -1,6 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from config import encrypt_data, decrypt_data
+from config import encrypt_data, decrypt_data, FERNET_TOKEN_PREFIX
 
 db = SQLAlchemy()
 
@@ -12,44 +12,123 @@ class Members(db.Model):
     
     @property
     def name(self):
-        return decrypt_data(self._name)
+        return self._decrypt_field("name", self._name)
     
     @name.setter
     def name(self, value):
-        self._name = encrypt_data(value)
+        self._name = self._encrypt_field("name", value)
+        self._set_search_tokens("name", value)
 
     @property
     def phone(self):
-        return decrypt_data(self._phone)
+        return self._decrypt_field("phone", self._phone)
     
     @phone.setter
     def phone(self, value):
-        self._phone = encrypt_data(value)
+        self._phone = self._encrypt_field("phone", value)
         # 검색용 해시 생성 및 저장
         if value:
+            from config import Config
             self.phone_hash_value = Members.generate_phone_hash(value)
+            self.phone_hash_version = Config.PHONE_HASH_VERSION
+        self._set_search_tokens("phone", value)
+
+    # [신규] 복호화 결과 인스턴스 캐시: {필드: (암호문, 평문)}
+    # 템플릿에서 같은 필드를 여러 번 읽어도 복호화는 1회, 암호문이 바뀌면(setter/DB 갱신) 다시 복호화
+    def _pii_cache(self):
+        return self.__dict__.setdefault("_pii", {})
+
+    def _decrypt_field(self, field, raw):
+        cached = self._pii_cache().get(field)
+        if cached is not None and cached[0] == raw:
+            return cached[1]
+        value = decrypt_data(raw)
+        self._pii_cache()[field] = (raw, value)
+        return value
+
+    def _encrypt_field(self, field, value):
+        raw = encrypt_data(value)
+        self._pii_cache()[field] = (raw, value)
+        return raw
+
+    @staticmethod
+    def decrypt_many(members, fields=("name", "phone")):
+        """목록 화면용 일괄 복호화 (각 회원의 캐시를 미리 채움, 이미 캐시된 필드는 건너뜀)"""
+        for m in members:
+            for field in fields:
+                m._decrypt_field(field, getattr(m, "_" + field))
+        return members
+
+    @staticmethod
+    def count_plaintext_rows():
+        """아직 암호화되지 않은(마이그레이션 전 평문) 이름/전화번호/생년월일이 남은 회원 수"""
+        columns = (Members._name, Members._phone, Members._birth)
+        return Members.query.filter(db.or_(*[
+            db.and_(c.isnot(None), c != "", ~c.startswith(FERNET_TOKEN_PREFIX)) for c in columns
+        ])).count()
 
     # 검색용 해시 컬럼
     phone_hash_value = db.Column(db.String(128), index=True)
+    # [신규] 해시 생성에 사용된 Pepper 버전 (Pepper 교체 시 점진적 재해싱용)
+    phone_hash_version = db.Column(db.Integer)
+
+    @staticmethod
+    def normalize_phone(phone_number):
+        """전화번호 정규화: 숫자만 남기고 국가번호(+82)는 국내 형식(010...)으로 변환"""
+        digits = "".join(filter(str.isdigit, phone_number or ""))
+        if digits.startswith("82") and len(digits) >= 11:
+            digits = digits[2:]
+            if not digits.startswith("0"):
+                digits = "0" + digits
+        return digits
 
     @staticmethod
-    def generate_phone_hash(phone_number):
+    def generate_phone_hash(phone_number, pepper=None):
         import hashlib
         from config import Config
-        # 정규화: 하이픈, 공백 제거
-        normalized = phone_number.replace("-", "").replace(" ", "").strip()
-        # Pepper 추가
-        plain = normalized + Config.PHONE_HASH_PEPPER
+        # 정규화: 숫자만 (+82 -> 010)
+        normalized = Members.normalize_phone(phone_number)
+        # Pepper 추가 (미지정 시 현재 Pepper 사용)
+        plain = normalized + (pepper if pepper is not None else Config.PHONE_HASH_PEPPER)
         # SHA-256 해싱
         return hashlib.sha256(plain.encode()).hexdigest()
 
+    @staticmethod
+    def generate_search_tokens(field, value):
+        """
+        암호화 컬럼 검색용 Blind Index 토큰 생성 (HMAC-SHA256, 평문 저장 없음)
+        - phone: 숫자 4-gram (뒷자리 4자리 등 부분 검색)
+        - name: 1-gram + 2-gram (공백 제거, 소문자)
+        """
+        import hmac
+        import hashlib
+        from config import Config
+        if not value:
+            return set()
+        if field == "phone":
+            digits = Members.normalize_phone(value)
+            grams = {digits[i:i + 4] for i in range(len(digits) - 3)}
+        else:
+            text = value.replace(" ", "").lower()
+            grams = set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+        key = Config.SEARCH_INDEX_KEY.encode()
+        return {hmac.new(key, f"{field}:{g}".encode(), hashlib.sha256).hexdigest() for g in grams}
+
+    def _set_search_tokens(self, field, value):
+        # 해당 필드의 기존 토큰은 delete-orphan으로 삭제되고 새 토큰으로 교체
+        kept = [t for t in self.search_tokens if t.field != field]
+        self.search_tokens = kept + [
+            MemberSearchTokens(field=field, token=token)
+            for token in Members.generate_search_tokens(field, value)
+        ]
+
     @property
     def birth(self):
-        return decrypt_data(self._birth)
+        return self._decrypt_field("birth", self._birth)
     
     @birth.setter
     def birth(self, value):
-        self._birth = encrypt_data(value)
+        self._birth = self._encrypt_field("birth", value)
         
     branch = db.Column(db.String(50))
     gender = db.Column(db.String(10))     # [신규] 성별
@@ -61,16 +140,56 @@ class Members(db.Model):
     created_at = db.Column(db.String(30))
     receipts = db.relationship('Receipts', backref='member', lazy=True)
     coupons = db.relationship('Coupons', backref='member', lazy=True)
+    search_tokens = db.relationship('MemberSearchTokens', backref='member', lazy=True, cascade='all, delete-orphan')
     
     # [신규] 쿠폰 시스템 필드
     current_reward_balance = db.Column(db.Integer, default=0) # 현재 사용 가능한 적립금
     total_lifetime_spend = db.Column(db.Integer, default=0)   # 총 누적 사용 금액 (통계용)
 
+    # [신규] 관리자 회원 목록 방문순/지점순 정렬용 식 인덱스 (routes/admin.py 정렬 키와 같은 식이어야 사용됨)
+    __table_args__ = (
+        db.Index('ix_members_visit_sort', db.text('COALESCE(visit_count, 0)'), 'id', 'visit_count'),
+        db.Index('ix_members_branch_sort', db.text("COALESCE(branch, '')"), 'id'),
+    )
+
+class MemberSearchTokens(db.Model):
+    """[신규] 암호화된 이름/전화번호 검색용 Blind Index (Members setter에서 자동 갱신)"""
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False, index=True)
+    field = db.Column(db.String(10), nullable=False) # name, phone
+    token = db.Column(db.String(64), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_member_search_tokens_token_member', 'token', 'member_id'),
+    )
+
 class Staffs(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    branch = db.Column(db.String(50), nullable=False)
+    branch = db.Column(db.String(50), nullable=False, index=True)
     name = db.Column(db.String(50), nullable=False)
     pin_hash = db.Column(db.String(128), nullable=False) # Bcrypt 해시된 PIN
+    # [신규] PIN 조회용 HMAC 인덱스 (지점+PIN) - 지점 직원 전원을 bcrypt로 대조하지 않고 1명만 검증
+    pin_index = db.Column(db.String(64), index=True)
+    # [신규] PIN 연속 실패 횟수 / 잠금 해제 시각 (무차별 대입 방지)
+    failed_pin_attempts = db.Column(db.Integer, default=0)
+    pin_locked_until = db.Column(db.DateTime)
+
+    @staticmethod
+    def generate_pin_index(branch, pin):
+        import hmac
+        import hashlib
+        from config import Config
+        key = Config.STAFF_PIN_INDEX_KEY.encode()
+        return hmac.new(key, f"{branch}:{pin}".encode(), hashlib.sha256).hexdigest()
+
+    def set_pin(self, pin):
+        """PIN 변경 시 bcrypt 해시와 조회용 인덱스를 함께 갱신"""
+        import bcrypt
+        from config import Config
+        self.pin_hash = bcrypt.hashpw(pin.encode('utf-8'), bcrypt.gensalt(Config.BCRYPT_ROUNDS)).decode('utf-8')
+        self.pin_index = Staffs.generate_pin_index(self.branch, pin)
+        self.failed_pin_attempts = 0
+        self.pin_locked_until = None
 
 class Receipts(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -85,6 +204,19 @@ class Receipts(db.Model):
     status = db.Column(db.String(20), default='PENDING') # PENDING(대기), APPROVED(승인), REJECTED(거절)
     amount_claimed = db.Column(db.Integer) # 사용자/OCR이 주장한 금액 (검증 전)
     image_url = db.Column(db.String(255))  # 영수증 이미지 경로 (S3 또는 로컬) 
+    
+    # [신규] OCR 원문 (암호화 저장) - 파서 수정 후 과거 영수증 재파싱/대사용
+    ocr_text = db.Column(db.Text)
+    
+    # [신규] 1일 1회 적립 제한용 적립일 (YYYY-MM-DD, 적립 건만 기록 / 환불·보정 건은 NULL)
+    # (member_id, visit_day) 유니크 인덱스로 동시 업로드 시에도 하루 1건만 저장됨
+    visit_day = db.Column(db.String(10))
+    
+    __table_args__ = (
+        db.Index('uq_receipts_member_visit_day', 'member_id', 'visit_day', unique=True),
+        # [신규] 회원별 영수증 조회 (1일 1회 적립 확인, 관리자 회원 상세, 회원 목록 요약)
+        db.Index('ix_receipts_member_id_visit_date', 'member_id', 'visit_date'),
+    )
 
 class Coupons(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -101,3 +233,86 @@ class Coupons(db.Model):
     status = db.Column(db.String(20), default='AVAILABLE') # AVAILABLE(사용가능), USED(사용완료), EXPIRED(만료)
     redeemed_by_staff_id = db.Column(db.Integer, db.ForeignKey('staffs.id'), nullable=True)
     is_substitutable = db.Column(db.Boolean, default=True) # 재료 소진 시 타 메뉴 변경 가능 여부
+
+    __table_args__ = (
+        # [신규] 회원별 쿠폰함 조회 (상태별 + 만료일 순)
+        db.Index('ix_coupons_member_id_status_expiry_date', 'member_id', 'status', 'expiry_date'),
+        # [신규] 만료 쿠폰 일괄 처리 (AVAILABLE + 만료일 지난 쿠폰)
+        db.Index('ix_coupons_status_expiry_date', 'status', 'expiry_date'),
+    )
+
+class ReceiptJobs(db.Model):
+    """[신규] 비동기 영수증 OCR 작업 큐 (DB 테이블 기반)"""
+    id = db.Column(db.String(36), primary_key=True) # UUID (외부 노출용 작업 ID)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    status = db.Column(db.String(20), default='QUEUED', index=True) # QUEUED(대기), RUNNING(처리중), DONE(완료), FAILED(실패)
+    image_path = db.Column(db.String(255))
+    image_ext = db.Column(db.String(10))
+    result_json = db.Column(db.Text) # result.html 렌더링용 결과 (JSON)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+
+class IdempotencyKeys(db.Model):
+    """[신규] 중복 요청 방지 키 (더블 탭/재전송 시 처음 처리 결과를 그대로 반환)"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(30), nullable=False) # 'claim:<회원ID>', 'redeem:<쿠폰ID>' 등
+    key = db.Column(db.String(64), nullable=False)   # 클라이언트가 보낸 요청 키
+    response_json = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('uq_idempotency_keys_scope_key', 'scope', 'key', unique=True),
+    )
+
+class ReencryptCheckpoints(db.Model):
+    """[신규] 암호화 키 교체(재암호화) 작업 진행 위치 (중단 후 이어서 실행)"""
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(64), unique=True, nullable=False) # '<테이블>:<대상 키 지문>'
+    last_id = db.Column(db.Integer, default=0)   # 처리 완료된 마지막 행 id
+    scanned = db.Column(db.Integer, default=0)
+    updated = db.Column(db.Integer, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+class PointLedger(db.Model):
+    """
+    [신규] 적립금 원장 (추가 전용, 수정/삭제 없음).
+    적립/차감마다 1행을 남기고 변경 직후의 잔액/누적 금액을 함께 기록 (services/point_service에서만 추가)
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False) # receipt, receipt_edit, receipt_delete, claim, adjust, opening, correction
+    amount = db.Column(db.Integer, nullable=False, default=0)      # 적립금(current_reward_balance) 증감
+    spend_delta = db.Column(db.Integer, nullable=False, default=0) # 누적 금액(total_lifetime_spend) 증감
+    balance_after = db.Column(db.Integer, nullable=False)
+    lifetime_after = db.Column(db.Integer, nullable=False)
+    ref = db.Column(db.String(50)) # 영수증 번호 / 쿠폰 코드
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_point_ledger_member_id_id', 'member_id', 'id'),
+    )
+
+class AlimtalkOutbox(db.Model):
+    """
+    [신규] 알림톡 발송 대기열 (Transactional Outbox).
+    쿠폰과 같은 트랜잭션으로 저장하고 백그라운드 발송기(services/alimtalk_outbox)가 일괄 발송.
+    전화번호/이름은 저장하지 않고 발송 시점에 회원 정보에서 읽음.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    dedupe_key = db.Column(db.String(64), unique=True, nullable=False) # 'coupon:<쿠폰코드>' (같은 알림 중복 등록 방지)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    template = db.Column(db.String(20), nullable=False) # WELCOME, REWARD
+    params_json = db.Column(db.Text) # 템플릿 변수 (쿠폰명, 유효기간 등)
+    status = db.Column(db.String(20), nullable=False, default='PENDING') # PENDING(대기), SENDING(발송중), SENT(완료), FAILED(실패)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now) # 다음 발송 시도 시각 (SENDING이면 선점 만료 시각)
+    claimed_by = db.Column(db.String(32)) # 발송기 선점 토큰
+    last_error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_alimtalk_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
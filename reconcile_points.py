@@ -0,0 +1,51 @@
+"""
+적립금 원장 대사 (회원 잔액/누적 금액 vs 원장)
+
+사용법:
+    python reconcile_points.py                  # 불일치 회원 리포트만 출력 (DB 변경 없음)
+    python reconcile_points.py --report a.csv   # 불일치 내역 CSV 저장
+    python reconcile_points.py --fix            # 원장에 보정(correction) 행 추가 (회원 잔액은 그대로)
+"""
+import csv
+import sys
+import argparse
+from app import app
+from models import db
+from services.db_pool import disable_session_timeouts
+from services.point_service import find_ledger_drift, fix_ledger_drift
+
+COLUMNS = ["member_id", "balance", "ledger_balance", "sum_amount", "lifetime", "ledger_lifetime", "sum_spend"]
+
+def main():
+    parser = argparse.ArgumentParser(description="회원 적립금과 적립금 원장 대사")
+    parser.add_argument("--report", help="불일치 내역 CSV 경로")
+    parser.add_argument("--fix", action="store_true", help="불일치 회원에 보정 행 추가")
+    parser.add_argument("--limit", type=int, default=20, help="화면에 출력할 최대 건수")
+    args = parser.parse_args()
+
+    with app.app_context():
+        disable_session_timeouts(db.engine)  # 웹 요청용 DB 시간 제한 해제 (장시간 배치)
+        drift = find_ledger_drift()
+        print(f"Drifted members: {len(drift)}")
+        for item in drift[:args.limit]:
+            print(f"  member {item['member_id']}: balance {item['balance']:,} / ledger {item['ledger_balance']:,} "
+                  f"(sum {item['sum_amount']:,}), lifetime {item['lifetime']:,} / ledger {item['ledger_lifetime']:,} "
+                  f"(sum {item['sum_spend']:,})")
+
+        if args.report:
+            with open(args.report, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                writer.writeheader()
+                writer.writerows(drift)
+            print(f"Report: {args.report}")
+
+        if args.fix and drift:
+            fixed = fix_ledger_drift(drift)
+            print(f"Corrected: {fixed} members")
+
+    # 보정하지 않은 불일치가 있으면 exit 1 (스케줄러 알림용)
+    if drift and not args.fix:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
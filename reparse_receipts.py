@@ -0,0 +1,39 @@
+"""
+과거 영수증 재파싱 / 대사 (파서 휴리스틱 수정 후 실행)
+
+사용법:
+    python reparse_receipts.py                      # 불일치 리포트만 생성 (DB 변경 없음)
+    python reparse_receipts.py --since 2025-01-01   # 특정 날짜 이후 영수증만
+    python reparse_receipts.py --apply              # 지점명 + 승인 대기 건 금액 일괄 수정
+"""
+import argparse
+from datetime import datetime
+from app import app
+from models import db
+from services.db_pool import disable_session_timeouts
+from services.receipt_reparse import reparse_receipts
+
+def main():
+    parser = argparse.ArgumentParser(description="저장된 OCR 원문으로 과거 영수증 재파싱 및 대사")
+    parser.add_argument("--report", default=f"reparse_report_{datetime.now():%Y%m%d_%H%M%S}.csv", help="불일치 리포트(CSV) 경로")
+    parser.add_argument("--chunk", type=int, default=1000, help="청크(배치) 크기")
+    parser.add_argument("--workers", type=int, default=None, help="파싱 프로세스 수 (기본: CPU 수, 0: 단일 프로세스)")
+    parser.add_argument("--since", type=lambda s: datetime.strptime(s, "%Y-%m-%d"), help="이 날짜(YYYY-MM-DD) 이후 영수증만")
+    parser.add_argument("--apply", action="store_true", help="불일치 항목 일괄 수정")
+    args = parser.parse_args()
+
+    with app.app_context():
+        disable_session_timeouts(db.engine)  # 웹 요청용 DB 시간 제한 해제 (장시간 배치)
+        print("Starting receipt re-parse...")
+        summary = reparse_receipts(args.report, chunk_size=args.chunk, workers=args.workers,
+                                   since=args.since, apply=args.apply)
+
+    print(f"Scanned: {summary['scanned']} receipts")
+    print(f"Mismatched: {summary['mismatched']} (amount {summary['amount']}, branch {summary['branch_paid']})")
+    print(f"Amount delta (re-parsed - stored): {summary['amount_delta']:,}")
+    if args.apply:
+        print(f"Updated: {summary['updated']} receipts")
+    print(f"Report: {args.report}")
+
+if __name__ == "__main__":
+    main()
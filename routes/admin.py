@@ -1,10 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, session, current_app
-from sqlalchemy import func
+from sqlalchemy import func, or_, literal_column
 from datetime import datetime
 import uuid
+import time
+import threading
 import hashlib
-from models import db, Members, Receipts, Coupons
+from models import db, Members, Receipts, Coupons, PointLedger, AlimtalkOutbox
 from config import Config, check_admin_password
+from services.member_lookup import invalidate_phone_cache
+from services.member_search import search_members
+from services.point_service import adjust_member_points, cancel_visit
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin_8848')
 from extensions import limiter
@@ -27,22 +32,110 @@ def admin_logout():
     session.pop('admin_logged_in', None)
     return redirect("/admin_8848/login")
 
+# 회원 목록 페이지 크기
+MEMBERS_PAGE_SIZE = 50
+MEMBERS_PAGE_SIZE_MAX = 200
+
+# [신규] 정렬 키 (models.Members의 ix_members_visit_sort / ix_members_branch_sort와 같은 식이어야 인덱스 사용)
+# 기본값을 바인드 파라미터가 아닌 리터럴로 넣어야 SQLite가 식 인덱스와 같은 식으로 인식
+VISIT_SORT_KEY = func.coalesce(Members.visit_count, literal_column("0"))
+BRANCH_SORT_KEY = func.coalesce(Members.branch, literal_column("''"))
+
+# [신규] 상단 전체 회원 수/방문 수 캐시 (워커별, 페이지 넘길 때마다 전체 집계하지 않도록)
+_totals_cache = {"value": None, "expires_at": 0.0}
+_totals_lock = threading.Lock()
+
+def _member_totals():
+    """(전체 회원 수, 전체 방문 수) - ADMIN_TOTALS_CACHE_TTL초 동안 캐시"""
+    with _totals_lock:
+        if _totals_cache["value"] is not None and _totals_cache["expires_at"] > time.monotonic():
+            return _totals_cache["value"]
+    # COUNT/SUM 모두 ix_members_visit_sort 인덱스만 읽음
+    total_members, total_visits = db.session.query(func.count(Members.id), func.sum(Members.visit_count)).one()
+    value = (total_members, total_visits or 0)
+    with _totals_lock:
+        _totals_cache["value"] = value
+        _totals_cache["expires_at"] = time.monotonic() + Config.ADMIN_TOTALS_CACHE_TTL
+    return value
+
 @admin_bp.route("/members")
 def admin_members():
     if not session.get('admin_logged_in'):
         return redirect("/admin_8848/login")
 
     sort = request.args.get("sort", "date")
-    if sort == "name": members = Members.query.order_by(Members._name.asc()).all()
-    elif sort == "branch": members = Members.query.order_by(Members.branch.asc()).all()
-    elif sort == "visit": members = Members.query.order_by(Members.visit_count.desc()).all()
-    else: members = Members.query.order_by(Members.id.desc()).all()
+    cursor = request.args.get("cursor")
+    limit = min(max(request.args.get("limit", MEMBERS_PAGE_SIZE, type=int), 1), MEMBERS_PAGE_SIZE_MAX)
     
-    all_receipts = Receipts.query.order_by(Receipts.visit_date.desc()).all()
-    total_members = Members.query.count()
-    total_visits = db.session.query(func.sum(Members.visit_count)).scalar() or 0
+    # [수정] 전체 조회 대신 Keyset 페이지네이션
+    # 이름은 암호문이라 DB 정렬이 무의미하므로 최신순으로 대체 (이름 검색은 쿠폰 페이지 검색 사용)
+    try:
+        members, next_cursor = _paginate_members(sort, cursor, limit)
+    except ValueError:
+        # 잘못된 cursor는 첫 페이지로 처리
+        members, next_cursor = _paginate_members(sort, None, limit)
+    Members.decrypt_many(members)
     
-    return render_template("members.html", members=members, sort=sort, total_members=total_members, total_visits=total_visits, all_receipts=all_receipts)
+    # [수정] 전체 영수증 대신 현재 페이지 회원의 영수증 요약만 집계 (1회 쿼리)
+    receipt_summary = {}
+    member_ids = [m.id for m in members]
+    if member_ids:
+        rows = db.session.query(
+            Receipts.member_id,
+            func.count(Receipts.id),
+            func.coalesce(func.sum(Receipts.amount), 0),
+            func.max(Receipts.visit_date)
+        ).filter(Receipts.member_id.in_(member_ids)).group_by(Receipts.member_id).all()
+        for member_id, count, total, last_date in rows:
+            receipt_summary[member_id] = {"count": count, "total": total, "last_date": last_date}
+    
+    total_members, total_visits = _member_totals()
+    
+    return render_template("members.html", members=members, sort=sort, total_members=total_members, total_visits=total_visits,
+                           receipt_summary=receipt_summary, next_cursor=next_cursor, limit=limit)
+
+def _paginate_members(sort, cursor, limit):
+    """
+    정렬 기준별 Keyset 페이지네이션 (OFFSET 없이 '마지막 행 이후'부터 조회).
+    cursor 형식: "<정렬값>|<id>" (최신순은 "<id>")
+    반환값: (회원 리스트, 다음 페이지 cursor 또는 None)
+    """
+    query = Members.query
+    
+    if sort == "visit":
+        key = VISIT_SORT_KEY
+        query = query.order_by(key.desc(), Members.id.desc())
+        if cursor:
+            value, last_id = cursor.rsplit("|", 1)
+            value, last_id = int(value), int(last_id)
+            # 앞쪽 범위 조건(key <= value)이 있어야 인덱스에서 커서 위치부터 바로 읽음 (OR만 있으면 처음부터 건너뜀)
+            query = query.filter(key <= value, or_(key < value, Members.id < last_id))
+    elif sort == "branch":
+        key = BRANCH_SORT_KEY
+        query = query.order_by(key.asc(), Members.id.asc())
+        if cursor:
+            value, last_id = cursor.rsplit("|", 1)
+            last_id = int(last_id)
+            query = query.filter(key >= value, or_(key > value, Members.id > last_id))
+    else:
+        query = query.order_by(Members.id.desc())
+        if cursor:
+            query = query.filter(Members.id < int(cursor))
+    
+    rows = query.limit(limit + 1).all()
+    members = rows[:limit]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last = members[-1]
+        if sort == "visit":
+            next_cursor = f"{last.visit_count or 0}|{last.id}"
+        elif sort == "branch":
+            next_cursor = f"{last.branch or ''}|{last.id}"
+        else:
+            next_cursor = str(last.id)
+    
+    return members, next_cursor
 
 @admin_bp.route("/delete_member/<int:id>")
 def delete_member(id):
@@ -50,10 +143,14 @@ def delete_member(id):
         return redirect("/admin_8848/login")
     member = Members.query.get(id)
     if member:
+        phone_hash = member.phone_hash_value
         Receipts.query.filter_by(member_id=id).delete()
         Coupons.query.filter_by(member_id=id).delete()
+        PointLedger.query.filter_by(member_id=id).delete() # 회원 삭제 시에만 원장도 함께 삭제
+        AlimtalkOutbox.query.filter_by(member_id=id).delete()
         db.session.delete(member)
         db.session.commit()
+        invalidate_phone_cache(phone_hash)
     return redirect("/admin_8848/members")
 
 # [신규] 쿠폰 관리 페이지
@@ -63,23 +160,28 @@ def admin_coupons():
         return redirect("/admin_8848/login")
     
     keyword = request.args.get("keyword", "").strip()
+    page = request.args.get("page", 1, type=int)
+    selected_id = request.args.get("member_id", type=int)
     member = None
+    candidates = []
+    has_next = False
     coupons = []
     
     if keyword:
-        # 암호화 적용으로 인해 like 검색 불가 -> 메모리 필터링
-        all_members = Members.query.all()
-        # 이름 또는 전화번호에 키워드가 포함된 회원 찾기
-        member_candidates = [m for m in all_members if keyword in m.name or keyword in m.phone]
+        # [수정] 메모리 필터링(전체 복호화) 대신 Blind Index 토큰 검색 (페이지 단위)
+        candidates, has_next = search_members(keyword, page=max(page, 1))
         
-        # 첫 번째 매칭 회원 선택 (기존 로직 유지)
-        if member_candidates:
-            member = member_candidates[0]
+        # 선택한 회원이 없으면 첫 번째 후보 선택
+        if selected_id:
+            member = next((m for m in candidates if m.id == selected_id), None) or Members.query.get(selected_id)
+        elif candidates:
+            member = candidates[0]
 
         if member:
             coupons = Coupons.query.filter_by(member_id=member.id).order_by(Coupons.is_used.asc(), Coupons.expiry_date.asc()).all()
             
-    return render_template("admin_coupons.html", member=member, coupons=coupons, keyword=keyword)
+    return render_template("admin_coupons.html", member=member, coupons=coupons, keyword=keyword,
+                           candidates=candidates, page=page, has_next=has_next)
 
 # [신규] 쿠폰 사용 처리
 @admin_bp.route("/use_coupon/<int:coupon_id>")
@@ -89,6 +191,7 @@ def use_coupon(coupon_id):
     
     coupon = Coupons.query.get(coupon_id)
     keyword = request.args.get("keyword", "")
+    member_id = request.args.get("member_id", "")
     
     if coupon and not coupon.is_used:
         coupon.is_used = True
@@ -96,7 +199,7 @@ def use_coupon(coupon_id):
         coupon.used_at_branch = "관리자처리" 
         db.session.commit()
     
-    return redirect(f"/admin_8848/coupons?keyword={keyword}")
+    return redirect(f"/admin_8848/coupons?keyword={keyword}&member_id={member_id}")
 
 @admin_bp.route("/member/<int:member_id>/edit", methods=["GET", "POST"])
 def edit_member(member_id):
@@ -107,8 +210,8 @@ def edit_member(member_id):
     if not member:
         return "회원 정보를 찾을 수 없습니다."
 
-    # 현재 누적 금액 계산
-    current_total = db.session.query(func.sum(Receipts.amount)).filter_by(member_id=member.id).scalar() or 0
+    # [수정] 현재 누적 금액 (영수증 전체 SUM 대신 적립금 원장과 함께 관리되는 회원 누적 금액 사용)
+    current_total = member.total_lifetime_spend or 0
 
     curr_receipts = Receipts.query.filter_by(member_id=member.id).order_by(Receipts.visit_date.desc()).all()
     
@@ -116,6 +219,8 @@ def edit_member(member_id):
     coupons = Coupons.query.filter_by(member_id=member.id).order_by(Coupons.issued_date.desc()).all()
 
     if request.method == "POST":
+        old_phone_hash = member.phone_hash_value
+        
         # 1. 기본 정보 수정
         member.name = request.form.get("name")
         member.phone = request.form.get("phone")
@@ -134,11 +239,15 @@ def edit_member(member_id):
                 branch_paid="관리자보정",
                 amount=diff,
                 visit_date=datetime.now(),
-                is_coupon_used=False
+                is_coupon_used=False,
+                status='APPROVED'
             )
             db.session.add(adjustment_receipt)
+            # [수정] 적립금/누적 금액도 함께 보정 (원장 기록)
+            adjust_member_points(member.id, diff, kind="adjust", ref=adjustment_receipt.receipt_no)
         
         db.session.commit()
+        invalidate_phone_cache(old_phone_hash, member.phone_hash_value)
         return redirect("/admin_8848/members")
 
     return render_template("edit_member.html", member=member, total_amount=current_total, receipts=curr_receipts, coupons=coupons)
@@ -158,11 +267,8 @@ def update_receipt(receipt_id):
             # 단, 'APPROVED' 상태이거나 아직 상태가 없는(구데이터) 경우에만 반영 감안
             # 현재 로직상 PENDING인 고액 건을 수정해서 승인하는 로직은 별도지만, 
             # 여기선 단순 금액 수정이므로 즉시 반영으로 통일 (테스트 편의성)
-            member = Members.query.get(receipt.member_id)
-            if member:
-                diff = new_amount - old_amount
-                member.current_reward_balance = (member.current_reward_balance or 0) + diff
-                member.total_lifetime_spend = (member.total_lifetime_spend or 0) + diff
+            # [수정] 동시 적립과 겹쳐도 값이 덮어써지지 않도록 SQL에서 증감
+            adjust_member_points(receipt.member_id, new_amount - old_amount, kind="receipt_edit", ref=receipt.receipt_no)
             
             receipt.amount = new_amount
             db.session.commit()
@@ -179,15 +285,10 @@ def delete_receipt(receipt_id):
     receipt = Receipts.query.get(receipt_id)
     if receipt:
         member_id = receipt.member_id
-        member = Members.query.get(member_id)
         
-        # [Fix] 삭제 시 포인트 차감
-        if member:
-            member.current_reward_balance = (member.current_reward_balance or 0) - receipt.amount
-            member.total_lifetime_spend = (member.total_lifetime_spend or 0) - receipt.amount
-            
-            if member.visit_count > 0:
-                member.visit_count -= 1
+        # [Fix] 삭제 시 포인트 차감 (SQL에서 원자적으로 증감)
+        adjust_member_points(member_id, -(receipt.amount or 0), kind="receipt_delete", ref=receipt.receipt_no)
+        cancel_visit(member_id)
         
         db.session.delete(receipt)
         db.session.commit()
@@ -1,10 +1,26 @@
 
+from datetime import datetime
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
-from models import Members, Coupons
+from sqlalchemy import or_, and_
+from models import Members, Coupons, Staffs
 from services.coupon_service import TIERS, claim_reward_service
+from services.member_lookup import find_member_by_phone
+from services.idempotency import get_request_key
+from extensions import limiter
 
 reward_bp = Blueprint('reward', __name__, url_prefix='/reward')
 
+# 모바일 쿠폰함 지점명(ocr_parser BRANCH_NAMES 키) -> 직원 테이블 지점 코드
+MOBILE_BRANCH_CODES = {
+    "동대문": "dongdaemun",
+    "굿모닝시티": "goodmorning",
+    "영등포": "yeongdeungpo",
+    "양재": "yangjae",
+    "수원 영통": "suwon",
+    "동탄": "dongtan",
+    "룸비니": "lumbini"
+}
+
 @reward_bp.route("/status")
 def status():
     # 간단한 인증: member_id 또는 phone으로 접근 허용
@@ -16,34 +32,17 @@ def status():
     if member_id:
         member = Members.query.get(member_id)
     elif phone:
-        # 전화번호로 조회 (해시 -> Fallback)
-        input_hash = Members.generate_phone_hash(phone)
-        member = Members.query.filter_by(phone_hash_value=input_hash).first()
-        
-        if not member:
-            # Fallback (전체 검색) - 테스트 편의성을 위해
-            all_members = Members.query.all()
-            # 숫자만 추출하여 정규화
-            norm_input = "".join(filter(str.isdigit, phone))
-            
-            print(f"[DEBUG] Looking for phone(digits): {norm_input}")
-            
-            for m in all_members:
-                 try:
-                     db_phone = m.phone or ""
-                     norm_db = "".join(filter(str.isdigit, db_phone))
-                     if norm_db == norm_input:
-                         member = m
-                         print(f"[DEBUG] Found match! ID: {m.id}, Phone: {db_phone}")
-                         break
-                 except Exception as e:
-                     continue # 복호화 실패 등 무시
-                     
+        # 전화번호로 조회 (해시 인덱스)
+        member = find_member_by_phone(phone)
+
     if not member:
         return f"회원 정보를 찾을 수 없습니다. (입력: {phone})", 404
         
     # 사용 가능 쿠폰 조회
-    available_coupons = Coupons.query.filter_by(member_id=member.id, status='AVAILABLE').all()
+    available_coupons = Coupons.query.filter(
+        Coupons.member_id == member.id, Coupons.status == 'AVAILABLE',
+        or_(Coupons.expiry_date.is_(None), Coupons.expiry_date >= datetime.now())
+    ).all()
     
     return render_template("reward_status.html", 
                            member=member, 
@@ -55,7 +54,7 @@ def claim():
     member_id = request.form.get("member_id")
     tier_level = int(request.form.get("tier_level"))
     
-    result = claim_reward_service(member_id, tier_level)
+    result = claim_reward_service(member_id, tier_level, idempotency_key=get_request_key())
     
     if result["success"]:
         return jsonify(result) # 프론트에서 성공 처리
@@ -89,22 +88,37 @@ def my_coupons():
         return render_template("my_coupons_login.html", error="회원 정보를 찾을 수 없습니다.")
         
     # 2. 쿠폰 분류 (사용가능 / 사용완료+만료)
-    active_coupons = Coupons.query.filter_by(member_id=member.id, status='AVAILABLE').order_by(Coupons.expiry_date.asc()).all()
-    
-    # 사용했거나(USED) 만료된(EXPIRED) 쿠폰
+    # [수정] 만료 처리(coupon_expiry) 전이라도 유효기간이 지난 쿠폰은 사용 가능 목록에서 제외
+    now = datetime.now()
+    not_expired = or_(Coupons.expiry_date.is_(None), Coupons.expiry_date >= now)
+    active_coupons = Coupons.query.filter(
+        Coupons.member_id == member.id, Coupons.status == 'AVAILABLE', not_expired
+    ).order_by(Coupons.expiry_date.asc()).all()
+    
+    # 사용했거나(USED) 만료된(EXPIRED, 아직 처리 전인 기간 지난 AVAILABLE 포함) 쿠폰
     inactive_coupons = Coupons.query.filter(
         Coupons.member_id == member.id,
-        Coupons.status.in_(['USED', 'EXPIRED'])
+        or_(Coupons.status.in_(['USED', 'EXPIRED']),
+            and_(Coupons.status == 'AVAILABLE', Coupons.expiry_date < now))
     ).order_by(Coupons.used_date.desc(), Coupons.expiry_date.desc()).all()
     
     # 지점 목록 (모달에서 사용)
     from services.ocr_parser import BRANCH_NAMES
     # BRANCH_NAMES 키들(동대문, 굿모닝시티 등)을 리스트로 전달
     branch_list = list(BRANCH_NAMES.keys())
-    
-    return render_template("my_coupons.html", member=member, active_coupons=active_coupons, inactive_coupons=inactive_coupons, branch_list=branch_list)
+
+    # [신규] 직원 선택 목록 (지점 선택에 따라 화면에서 필터링, 인덱스 없는 기존 직원도 선택 후 PIN 인증 가능)
+    branch_names = {code: name for name, code in MOBILE_BRANCH_CODES.items()}
+    staffs = [
+        {"id": s.id, "name": s.name, "branch": branch_names.get(s.branch)}
+        for s in Staffs.query.with_entities(Staffs.id, Staffs.branch, Staffs.name)
+        .filter(Staffs.branch.in_(list(branch_names))).order_by(Staffs.branch, Staffs.name)
+    ]
+    
+    return render_template("my_coupons.html", member=member, active_coupons=active_coupons, inactive_coupons=inactive_coupons, branch_list=branch_list, staffs=staffs)
 
 @reward_bp.route("/redeem-mobile", methods=["POST"])
+@limiter.limit("10 per minute") # [보안] 직원 PIN 대입 공격 방지
 def redeem_mobile():
     """
     모바일 웹에서 직원이 PIN을 입력하여 쿠폰을 즉시 사용하는 API
@@ -125,21 +139,13 @@ def redeem_mobile():
     # [임시 조치] 현재 Staff 테이블의 branch 컬럼이 영문('dongdaemun')인지 한글('동대문')인지 확인 필요.
     # 보통 코드('dongdaemun')를 쓰므로 매핑 로직 추가.
     
-    # 간단 매핑 (하드코딩 or config 참조 권장)
-    branch_map = {
-        "동대문": "dongdaemun",
-        "굿모닝시티": "goodmorning",
-        "영등포": "yeongdeungpo",
-        "양재": "yangjae",
-        "수원 영통": "suwon",
-        "동탄": "dongtan",
-        "룸비니": "lumbini"
-    }
-    
-    branch_code = branch_map.get(branch_name, "dongdaemun") # 기본값 동대문
+    branch_code = MOBILE_BRANCH_CODES.get(branch_name, "dongdaemun") # 기본값 동대문
+    # [신규] 직원을 선택한 경우 해당 직원의 PIN만 검증
+    staff_id = request.json.get("staff_id")
+    staff_id = int(staff_id) if str(staff_id or "").isdigit() else None
     
     from services.coupon_service import redeem_coupon_service
-    result = redeem_coupon_service(coupon_code, staff_pin, branch_code)
+    result = redeem_coupon_service(coupon_code, staff_pin, branch_code, idempotency_key=get_request_key(), staff_id=staff_id)
     
     if result["success"]:
         return jsonify(result)
@@ -150,21 +156,8 @@ def redeem_mobile():
 def my_coupons_auth():
     phone = request.form.get("phone")
     
-    # 해시 조회
-    input_hash = Members.generate_phone_hash(phone)
-    member = Members.query.filter_by(phone_hash_value=input_hash).first()
-    
-    if not member:
-        # 간단한 Fallback: 해시 실패시 전체 검색 (public.py와 동일 로직이 좋지만 여기선 약식 구현)
-        # 운영상 필요시 public.check 로직을 서비스로 분리해야 함.
-        # 일단 약식으로 폰번호 뒷자리 비교 등 없이 정확히 일치해야 하는 것으로 가정 
-        # (편의상 전체 검색 fallback 하나만 추가)
-        all_members = Members.query.all()
-        norm_input = phone.replace("-", "").replace(" ", "").strip()
-        for m in all_members:
-             if m.phone and m.phone.replace("-", "").replace(" ", "").strip() == norm_input:
-                 member = m
-                 break
+    # 해시 조회 (public.check와 동일한 공용 조회 서비스)
+    member = find_member_by_phone(phone)
     
     if not member:
         return render_template("my_coupons_login.html", error="등록되지 않은 번호입니다.", phone=phone)
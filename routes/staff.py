@@ -1,26 +1,36 @@
 
+import uuid
 from flask import Blueprint, render_template, request, jsonify
+from models import Staffs
+from extensions import limiter
 from services.coupon_service import redeem_coupon_service
+from services.idempotency import get_request_key
 from config import BRANCH_MAP
 
 staff_bp = Blueprint('staff', __name__, url_prefix='/staff')
 
+def _render(**context):
+    # 직원 선택 목록 (지점 선택에 따라 화면에서 필터링)
+    staffs = Staffs.query.with_entities(Staffs.id, Staffs.branch, Staffs.name).order_by(Staffs.branch, Staffs.name).all()
+    return render_template("staff_redeem.html", branches=BRANCH_MAP, staffs=staffs, idempotency_key=uuid.uuid4().hex, **context)
+
 @staff_bp.route("/redeem", methods=["GET", "POST"])
+@limiter.limit("10 per minute", methods=["POST"]) # [보안] PIN 대입 공격 방지
 def redeem():
     if request.method == "POST":
         coupon_code = request.form.get("coupon_code")
         staff_pin = request.form.get("staff_pin")
         branch_code = request.form.get("branch_code")
+        staff_id = request.form.get("staff_id", type=int)
         
         if not all([coupon_code, staff_pin, branch_code]):
-            return render_template("staff_redeem.html", branches=BRANCH_MAP, message="모든 정보를 입력해주세요.", success=False)
+            return _render(message="모든 정보를 입력해주세요.", success=False)
             
-        result = redeem_coupon_service(coupon_code, staff_pin, branch_code)
+        result = redeem_coupon_service(coupon_code, staff_pin, branch_code, idempotency_key=get_request_key(), staff_id=staff_id)
         
-        return render_template("staff_redeem.html", 
-                               branches=BRANCH_MAP, 
-                               message=result["message"], 
-                               success=result["success"],
-                               last_coupon=coupon_code if result["success"] else None)
+        # 폼 재전송(더블 클릭/새로고침)은 같은 키로 처리되고, 다음 쿠폰은 새 키로 처리
+        return _render(message=result["message"], 
+                       success=result["success"],
+                       last_coupon=coupon_code if result["success"] else None)
                                
-    return render_template("staff_redeem.html", branches=BRANCH_MAP)
+    return _render()
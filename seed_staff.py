@@ -2,7 +2,6 @@
 from app import create_app, db
 from models import Staffs
 from config import BRANCH_MAP
-import bcrypt
 
 app = create_app()
 
@@ -11,11 +10,11 @@ def seed_staffs():
         # 기본 직원 생성 (테스트용)
         # PIN: 1234
         pin = "1234"
-        hashed = bcrypt.hashpw(pin.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
         
         # 동대문점 직원
         if not Staffs.query.filter_by(name="관리자").first():
-            staff1 = Staffs(branch="dongdaemun", name="관리자", pin_hash=hashed)
+            staff1 = Staffs(branch="dongdaemun", name="관리자")
+            staff1.set_pin(pin)
             db.session.add(staff1)
             print("Staff '관리자' created for dongdaemun (PIN: 1234)")
         
@@ -23,7 +22,8 @@ def seed_staffs():
         for code, name in BRANCH_MAP.items():
             if code == "dongdaemun": continue
             if not Staffs.query.filter_by(branch=code).first():
-                s = Staffs(branch=code, name=f"{name}직원", pin_hash=hashed)
+                s = Staffs(branch=code, name=f"{name}직원")
+                s.set_pin(pin)
                 db.session.add(s)
                 print(f"Staff for {name} created.")
                 
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer
+from sqlalchemy import select, update
+from models import db, Members, AlimtalkOutbox
+from config import Config
+from services.metrics import inc_counter, flush
+from services.notification_service import get_alimtalk_template, send_alimtalk_batch, AligoError
+
+# 템플릿 종류 -> (알리고 템플릿 코드 설정 이름, 알림톡 제목)
+TEMPLATES = {
+    "WELCOME": ("ALIGO_TPL_SIGNUP", "멤버십 가입 쿠폰 안내"),
+    "REWARD": ("ALIGO_TPL_REWARD", "리워드 교환 쿠폰 안내"),
+}
+
+# 발송 중(SENDING) 선점 유지 시간 - 발송기가 중간에 죽으면 이후 다른 발송기가 다시 가져감
+CLAIM_LEASE = timedelta(minutes=5)
+# 재시도 대기 상한
+MAX_RETRY_DELAY = 3600
+
+# 프로세스(워커)별 발송 스레드
+_thread = None
+_thread_pid = None
+_thread_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def enqueue_alimtalk(member_id, template, dedupe_key, **params):
+    """
+    알림톡을 발송 대기열에 추가 (세션에 추가만 하고 커밋은 호출한 쪽에서 쿠폰과 함께).
+    커밋 후 notify_dispatcher()를 호출하면 주기를 기다리지 않고 바로 발송.
+    """
+    db.session.add(AlimtalkOutbox(
+        dedupe_key=dedupe_key,
+        member_id=member_id,
+        template=template,
+        params_json=json.dumps(params, ensure_ascii=False),
+        status='PENDING',
+        attempts=0,
+        next_attempt_at=datetime.now(),
+        created_at=datetime.now()
+    ))
+
+
+def notify_dispatcher():
+    """발송 스레드 깨우기 (요청 스레드는 발송을 기다리지 않음)"""
+    _wake.set()
+
+
+def _claim(limit, now):
+    """
+    발송할 알림을 선점 (다른 워커/cron과 같은 알림을 중복 발송하지 않도록 토큰 기록).
+    PENDING이거나, 선점 만료된 SENDING(발송기 중단)이 대상.
+    """
+    token = uuid.uuid4().hex
+    due_ids = (
+        select(AlimtalkOutbox.id)
+        .where(AlimtalkOutbox.status.in_(('PENDING', 'SENDING')), AlimtalkOutbox.next_attempt_at <= now)
+        .order_by(AlimtalkOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    db.session.execute(
+        update(AlimtalkOutbox)
+        .where(AlimtalkOutbox.id.in_(due_ids),
+               AlimtalkOutbox.status.in_(('PENDING', 'SENDING')),
+               AlimtalkOutbox.next_attempt_at <= now)
+        .values(status='SENDING', claimed_by=token, attempts=AlimtalkOutbox.attempts + 1,
+                next_attempt_at=now + CLAIM_LEASE)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return AlimtalkOutbox.query.filter_by(claimed_by=token, status='SENDING').order_by(AlimtalkOutbox.id).all()
+
+
+def _render(row, member):
+    """대기열 1건 -> 알리고 수신자 1명 분량 (쿠폰함 링크는 발송 시점에 생성)"""
+    params = json.loads(row.params_json or "{}")
+    s = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+    token = s.dumps(member.id, salt='coupon-access')
+    link_url = f"https://membership.everestfood.com/my-coupons?token={token}"
+    button = {
+        "name": "쿠폰 확인하기",
+        "linkType": "WL",
+        "linkTypeName": "웹링크",
+        "linkMo": link_url,
+        "linkPc": link_url
+    }
+    return {
+        "receiver": member.phone,
+        "recvname": member.name,
+        "subject": TEMPLATES[row.template][1],
+        "message": get_alimtalk_template(row.template, link=link_url, **params),
+        "button": json.dumps({"button": [button]}, ensure_ascii=False),
+    }
+
+
+def _retry_delay(attempts):
+    return min(Config.ALIMTALK_RETRY_SECONDS * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def dispatch_once(limit=None):
+    """
+    대기열에서 최대 limit건을 선점해 템플릿별로 한 번에 발송.
+    실패하면 attempts에 따라 재시도 대기(ALIMTALK_RETRY_SECONDS부터 2배씩), ALIMTALK_MAX_ATTEMPTS 도달 시 FAILED.
+    반환값: {"claimed", "sent", "retry", "failed"}
+    """
+    now = datetime.now()
+    rows = _claim(limit or Config.ALIMTALK_BATCH_SIZE, now)
+    stats = {"claimed": len(rows), "sent": 0, "retry": 0, "failed": 0}
+    if not rows:
+        return stats
+
+    members = Members.query.filter(Members.id.in_({row.member_id for row in rows})).all()
+    members = {m.id: m for m in Members.decrypt_many(members)}
+
+    groups = {}
+    for row in rows:
+        member = members.get(row.member_id)
+        if row.template not in TEMPLATES or member is None or not member.phone:
+            row.status, row.claimed_by = 'FAILED', None
+            row.last_error = "unknown template" if row.template not in TEMPLATES else "member or phone not found"
+            stats["failed"] += 1
+            continue
+        groups.setdefault(row.template, []).append((row, _render(row, member)))
+
+    for template, items in groups.items():
+        template_code = getattr(Config, TEMPLATES[template][0])
+        try:
+            send_alimtalk_batch(template_code, [message for _, message in items])
+            error = None
+        except AligoError as e:
+            error = str(e)[:255]
+            current_app.logger.warning(f"Alimtalk batch failed ({len(items)} messages): {error}")
+
+        for row, _ in items:
+            row.claimed_by = None
+            if error is None:
+                row.status, row.sent_at, row.last_error = 'SENT', datetime.now(), None
+                stats["sent"] += 1
+            elif row.attempts >= Config.ALIMTALK_MAX_ATTEMPTS:
+                row.status, row.last_error = 'FAILED', error
+                stats["failed"] += 1
+            else:
+                row.status, row.last_error = 'PENDING', error
+                row.next_attempt_at = datetime.now() + timedelta(seconds=_retry_delay(row.attempts))
+                stats["retry"] += 1
+
+    db.session.commit()
+    for result in ("sent", "retry", "failed"):
+        if stats[result]:
+            inc_counter("alimtalk_messages_total", stats[result], result=result)
+    return stats
+
+
+def dispatch_pending(limit=None):
+    """발송 가능한 알림이 없을 때까지 반복 발송. 반환값: 결과별 합계"""
+    totals = {"claimed": 0, "sent": 0, "retry": 0, "failed": 0}
+    while True:
+        stats = dispatch_once(limit)
+        for key in totals:
+            totals[key] += stats[key]
+        if stats["claimed"] < (limit or Config.ALIMTALK_BATCH_SIZE):
+            return totals
+
+
+def purge_sent(days=None):
+    """발송 완료 후 보관 기간(ALIMTALK_RETENTION_DAYS)이 지난 알림 삭제. 반환값: 삭제 건수"""
+    cutoff = datetime.now() - timedelta(days=days or Config.ALIMTALK_RETENTION_DAYS)
+    result = db.session.execute(
+        AlimtalkOutbox.__table__.delete()
+        .where(AlimtalkOutbox.status == 'SENT', AlimtalkOutbox.sent_at < cutoff)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def count_pending():
+    """발송 대기(재시도 대기 포함) 알림 수"""
+    return AlimtalkOutbox.query.filter(AlimtalkOutbox.status.in_(('PENDING', 'SENDING'))).count()
+
+
+def _dispatch_loop(app):
+    last_purge = 0.0
+    while True:
+        _wake.wait(Config.ALIMTALK_DISPATCH_INTERVAL)
+        _wake.clear()
+        with app.app_context():
+            try:
+                totals = dispatch_pending()
+                if time.time() - last_purge > 3600:
+                    purge_sent()
+                    last_purge = time.time()
+                if totals["claimed"]:
+                    flush(force=True)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Alimtalk dispatch failed")
+            finally:
+                db.session.remove()
+
+
+def ensure_dispatcher(app):
+    """
+    ALIMTALK_DISPATCH_INTERVAL > 0이면 워커 프로세스별 발송 스레드 시작 (요청마다 호출, 이미 있으면 무시).
+    Gunicorn preload로 fork된 워커에도 스레드가 생기도록 PID가 바뀌면 새로 시작한다.
+    """
+    global _thread, _thread_pid, _wake
+    if Config.ALIMTALK_DISPATCH_INTERVAL <= 0:
+        return
+    pid = os.getpid()
+    if _thread_pid == pid:
+        return
+    with _thread_lock:
+        if _thread_pid != pid:
+            _wake = threading.Event()
+            _thread = threading.Thread(target=_dispatch_loop, args=(app,), name="alimtalk-dispatch", daemon=True)
+            _thread.start()
+            _thread_pid = pid
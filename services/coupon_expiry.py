@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+from datetime import datetime
+from sqlalchemy import select, update
+from models import db, Coupons
+from config import Config
+from services.metrics import inc_counter, flush
+
+# 프로세스(워커)별 만료 처리 스레드
+_thread = None
+_thread_pid = None
+_thread_lock = threading.Lock()
+
+
+def _expire_batch(now, batch_size):
+    """
+    만료 대상 최대 batch_size건을 UPDATE 한 번으로 EXPIRED 처리 (Python으로 행을 읽지 않음).
+    - 바깥 WHERE에도 status 조건: 서브쿼리 이후 사용 처리된 쿠폰은 건드리지 않음
+    - PostgreSQL: 다른 트랜잭션(쿠폰 사용, 다른 워커의 만료 처리)이 잡고 있는 행은 건너뜀 (SQLite는 무시)
+    """
+    expired_ids = (
+        select(Coupons.id)
+        .where(Coupons.status == 'AVAILABLE', Coupons.expiry_date < now)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = db.session.execute(
+        update(Coupons)
+        .where(Coupons.id.in_(expired_ids), Coupons.status == 'AVAILABLE')
+        .values(status='EXPIRED')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def expire_coupons(batch_size=None, now=None):
+    """
+    유효기간이 지난 AVAILABLE 쿠폰을 EXPIRED로 일괄 변경.
+    배치마다 짧은 트랜잭션으로 커밋 (ix_coupons_status_expiry_date 인덱스 사용, 테이블 전체 잠금 없음)
+    반환값: 만료 처리 건수
+    """
+    batch_size = batch_size or Config.COUPON_EXPIRY_BATCH
+    now = now or datetime.now()
+    total = 0
+    while True:
+        count = _expire_batch(now, batch_size)
+        total += count
+        if count < batch_size:
+            break
+    if total:
+        inc_counter("coupons_expired_total", total)
+    return total
+
+
+def _sweep_loop(app):
+    # 워커 시작 직후 1회 처리 후 주기 대기 (주기보다 자주 재시작되는 워커도 만료 처리)
+    while True:
+        with app.app_context():
+            try:
+                expired = expire_coupons()
+                if expired:
+                    app.logger.info("Coupons expired", extra={"expired": expired})
+                    flush(force=True)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Coupon expiry sweep failed")
+            finally:
+                db.session.remove()
+        time.sleep(Config.COUPON_EXPIRY_INTERVAL)
+
+
+def ensure_expiry_sweeper(app):
+    """
+    COUPON_EXPIRY_INTERVAL > 0이면 워커 프로세스별 만료 처리 스레드 시작 (요청마다 호출, 이미 있으면 무시).
+    Gunicorn preload로 fork된 워커에도 스레드가 생기도록 PID가 바뀌면 새로 시작한다.
+    여러 워커가 동시에 실행해도 같은 쿠폰을 두 번 처리하지 않음 (조건부 UPDATE).
+    """
+    global _thread, _thread_pid
+    if Config.COUPON_EXPIRY_INTERVAL <= 0:
+        return
+    pid = os.getpid()
+    if _thread_pid == pid:
+        return
+    with _thread_lock:
+        if _thread_pid != pid:
+            _thread = threading.Thread(target=_sweep_loop, args=(app,), name="coupon-expiry", daemon=True)
+            _thread.start()
+            _thread_pid = pid
@@ -2,6 +2,9 @@
 from datetime import datetime, timedelta
 import uuid
 from models import db, Members, Coupons, Receipts
+from services.point_service import deduct_member_points
+from services.idempotency import get_saved_response, save_response
+from services.alimtalk_outbox import enqueue_alimtalk, notify_dispatcher
 
 TIERS = {
     1: {"cost": 100000, "name": "사모사 or 굴자빵 무료"},
@@ -25,14 +28,13 @@ def get_coupon_name_by_amount(amount):
     else:
         return "Unknown Reward"
 
-def claim_reward_service(user_id, tier_level):
+def claim_reward_service(user_id, tier_level, idempotency_key=None):
     """
     사용자가 리워드를 수령(포인트 차감 -> 쿠폰 발급).
     유효기간: 30일
+    [수정] 잔액 확인/차감은 조건부 UPDATE 1회로 처리 (동시 요청 시 초과 차감 방지)
+    idempotency_key: 같은 키로 다시 요청하면 처음 결과를 그대로 반환 (더블 탭 방지)
     """
-    import os
-    import json
-    
     member = Members.query.get(user_id)
     if not member:
         return {"success": False, "message": "사용자를 찾을 수 없습니다."}
@@ -41,19 +43,23 @@ def claim_reward_service(user_id, tier_level):
     if not tier_info:
         return {"success": False, "message": "잘못된 리워드 등급입니다."}
     
+    scope = f"claim:{member.id}"
+    saved = get_saved_response(scope, idempotency_key)
+    if saved:
+        return saved
+    
     cost = tier_info["cost"]
     
-    # 잔액 확인
-    current_balance = member.current_reward_balance or 0
-    if current_balance < cost:
-        return {"success": False, "message": f"포인트가 부족합니다. (필요: {cost:,} P, 보유: {current_balance:,} P)"}
+    unique_code = f"CP-{uuid.uuid4().hex[:8].upper()}"
     
-    # 1. 포인트 차감
-    member.current_reward_balance = current_balance - cost
+    # 1. 포인트 차감 (잔액이 충분할 때만)
+    if not deduct_member_points(member.id, cost, ref=unique_code):
+        db.session.rollback()
+        current_balance = member.current_reward_balance or 0
+        return {"success": False, "message": f"포인트가 부족합니다. (필요: {cost:,} P, 보유: {current_balance:,} P)"}
     
     # 2. 쿠폰 발급
     expiry_date = datetime.now() + timedelta(days=30) # 유효기간 30일
-    unique_code = f"CP-{uuid.uuid4().hex[:8].upper()}"
     
     # 쿠폰 타입명은 TIERS의 이름을 그대로 사용 (DB 저장용)
     # 알림톡 발송 시에는 get_coupon_name_by_amount로 변환된 이름을 사용
@@ -69,72 +75,62 @@ def claim_reward_service(user_id, tier_level):
     
     db.session.add(new_coupon)
     
+    result = {
+        "success": True, 
+        "message": f"{tier_info['name']} 쿠폰이 발급되었습니다!",
+        "coupon_code": unique_code,
+        "remaining_balance": member.current_reward_balance
+    }
+    save_response(scope, idempotency_key, result)
+    
+    # [수정] 알림톡 발송 대기열에 쿠폰과 같은 트랜잭션으로 등록 (알림톡 쿠폰명은 금액별 표시명 사용)
+    enqueue_alimtalk(member.id, "REWARD", f"coupon:{unique_code}",
+                     coupon_name=get_coupon_name_by_amount(cost),
+                     expiry_date=expiry_date.strftime("%Y-%m-%d"),
+                     points_used=cost)
+    
     try:
         db.session.commit()
-        
-        # [Notification] 알림톡 발송 (Aligo)
-        from flask import current_app
-        from itsdangerous import URLSafeTimedSerializer
-        from services.notification_service import send_alimtalk
-        
-        # 환경변수 템플릿 코드 (없으면 기본값)
-        template_code = os.environ.get("ALIGO_TPL_REWARD", "TB_REWARD_001")
-        
-        s = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
-        token = s.dumps(member.id, salt='coupon-access')
-        link_url = f"https://membership.everestfood.com/my-coupons?token={token}"
-        formatted_expiry = expiry_date.strftime("%Y-%m-%d")
-        
-        # [Logic] 금액에 따른 쿠폰명 매핑
-        display_coupon_name = get_coupon_name_by_amount(cost)
-        
-        # 변수 매핑
-        variable_map = {
-            "#{이름}": member.name,
-            "#{쿠폰이름}": display_coupon_name,
-            "#{유효기간}": formatted_expiry
-        }
-        
-        # 버튼 설정
-        button_data = {
-            "name": "쿠폰 확인하기",
-            "linkType": "WL",
-            "linkTypeName": "웹링크",
-            "linkMo": link_url,
-            "linkPc": link_url
-        }
-        button_json = json.dumps({"button": [button_data]})
-        
-        send_alimtalk(member.phone, template_code, variable_map, button_json)
-        
-        return {
-            "success": True, 
-            "message": f"{tier_info['name']} 쿠폰이 발급되었습니다!",
-            "coupon_code": unique_code,
-            "remaining_balance": member.current_reward_balance
-        }
     except Exception as e:
         db.session.rollback()
+        # 같은 키의 동시 요청이 먼저 처리된 경우 그 결과 반환
+        saved = get_saved_response(scope, idempotency_key)
+        if saved:
+            return saved
         return {"success": False, "message": f"처리 중 오류가 발생했습니다: {e}"}
+    
+    # [수정] 알림톡은 커밋된 대기열에서 백그라운드로 발송 (요청은 발송을 기다리지 않음)
+    notify_dispatcher()
+    
+    return result
 
-def redeem_coupon_service(coupon_code, staff_pin, branch_code):
+def redeem_coupon_service(coupon_code, staff_pin, branch_code, idempotency_key=None, staff_id=None):
     """
     직원이 쿠폰을 사용 처리 (PIN 인증 필수).
+    staff_id: 직원을 선택한 경우 해당 직원의 PIN만 검증
+    [수정] AVAILABLE -> USED 조건부 UPDATE로 처리 (두 기기에서 동시에 사용 처리해도 1번만 성공)
+    idempotency_key: 같은 키로 다시 요청하면 처음 결과를 그대로 반환
     """
-    from models import Staffs
-    import bcrypt
+    from services.staff_auth import verify_staff_pin
     
     # 1. 쿠폰 조회
     coupon = Coupons.query.filter_by(coupon_code=coupon_code).first()
     if not coupon:
         return {"success": False, "message": "유효하지 않은 쿠폰 코드입니다."}
     
+    scope = f"redeem:{coupon.id}"
+    saved = get_saved_response(scope, idempotency_key)
+    if saved:
+        return saved
+    
     if coupon.status != 'AVAILABLE':
         return {"success": False, "message": f"이미 사용되었거나 만료된 쿠폰입니다. (상태: {coupon.status})"}
     
     # 만료일 체크
     if coupon.expiry_date and coupon.expiry_date < datetime.now():
-        coupon.status = 'EXPIRED'
+        Coupons.query.filter_by(id=coupon.id, status='AVAILABLE').update(
+            {"status": 'EXPIRED'}, synchronize_session=False
+        )
         db.session.commit()
         return {"success": False, "message": "유효기간이 만료된 쿠폰입니다."}
 
@@ -153,59 +149,62 @@ def redeem_coupon_service(coupon_code, staff_pin, branch_code):
         if not staff_pin:
              return {"success": False, "message": "직원 PIN 번호를 입력해주세요."}
              
-        # branch_code에 해당하는 직원들 중 PIN이 일치하는 사람이 있는지 확인
-        # (보안상 직원을 먼저 선택하고 PIN을 넣는게 좋지만, 편의상 해당 지점의 어떤 직원이라도 PIN 맞으면 통과)
-        staffs = Staffs.query.filter_by(branch=branch_code).all()
-        
-        for staff in staffs:
-            if bcrypt.checkpw(staff_pin.encode('utf-8'), staff.pin_hash.encode('utf-8')):
-                valid_staff = staff
-                break
-                
+        # [수정] 지점 직원 전원을 bcrypt로 대조하지 않고 선택한 직원 또는 PIN 인덱스로 찾은 직원 1명만 검증
+        valid_staff, error = verify_staff_pin(branch_code, staff_pin, staff_id)
         if not valid_staff:
-            return {"success": False, "message": "직원 인증 실패: PIN 번호가 올바르지 않습니다."}
+            return {"success": False, "message": error}
 
         
-    # 3. 사용 처리
-    coupon.status = 'USED'
-    coupon.is_used = True
-    coupon.used_date = datetime.now()
-    coupon.used_at_branch = branch_code
-    coupon.redeemed_by_staff_id = valid_staff.id if valid_staff else None # PIN 생략시 None
-
+    # 3. 사용 처리 (아직 AVAILABLE인 경우에만)
+    updated = Coupons.query.filter_by(id=coupon.id, status='AVAILABLE').update({
+        "status": 'USED',
+        "is_used": True,
+        "used_date": datetime.now(),
+        "used_at_branch": branch_code,
+        "redeemed_by_staff_id": valid_staff.id if valid_staff else None # PIN 생략시 None
+    }, synchronize_session=False)
+    
+    if updated == 0:
+        db.session.rollback()
+        # 같은 키의 동시 요청이 먼저 처리된 경우 그 결과 반환
+        saved = get_saved_response(scope, idempotency_key)
+        if saved:
+            return saved
+        return {"success": False, "message": "이미 사용되었거나 만료된 쿠폰입니다."}
+    
+    result = {
+        "success": True, 
+        "message": f"쿠폰 사용이 완료되었습니다. (처리자: {valid_staff.name if valid_staff else '본인 확인'})",
+        "coupon": coupon.coupon_type
+    }
+    save_response(scope, idempotency_key, result)
     
     try:
         db.session.commit()
-        return {
-            "success": True, 
-            "message": f"쿠폰 사용이 완료되었습니다. (처리자: {valid_staff.name if valid_staff else '본인 확인'})",
-            "coupon": coupon.coupon_type
-        }
+        return result
     except Exception as e:
         db.session.rollback()
+        saved = get_saved_response(scope, idempotency_key)
+        if saved:
+            return saved
         return {"success": False, "message": f"처리 중 오류: {e}"}
 
 def process_signup_bonus(member):
     """
     신규 회원 가입 시 환영 쿠폰 발급 및 알림톡 발송
     - Coupon: 플레인 난(Plain Naan) 1개 무료
-    - Notification: AlimTalk (ALIGO_TPL_SIGNUP)
+    - Notification: AlimTalk (ALIGO_TPL_SIGNUP) - [수정] 발송 대기열에 등록, 백그라운드에서 발송
     """
-    import os
-    import json
-    from flask import current_app
-    from itsdangerous import URLSafeTimedSerializer
-    from services.notification_service import send_alimtalk
-    
     # 1. 쿠폰 생성
     today_date = datetime.now()
     expiry_date = today_date + timedelta(days=30)
     unique_code = f"WC-{uuid.uuid4().hex[:8].upper()}"
+    coupon_type = "플레인 난(Plain Naan) 1개 무료" # [요청사항 반영]
     
     welcome_coupon = Coupons(
         member_id=member.id,
         coupon_code=unique_code,
-        coupon_type="플레인 난(Plain Naan) 1개 무료", # [요청사항 반영]
+        coupon_type=coupon_type,
         issued_date=today_date,
         expiry_date=expiry_date,
         status='AVAILABLE',
@@ -213,39 +212,11 @@ def process_signup_bonus(member):
     )
     db.session.add(welcome_coupon)
     
-    # 2. 알림톡 발송 준비
-    try:
-        # 환경변수에서 템플릿 코드 로드 (없으면 기본값)
-        template_code = os.environ.get("ALIGO_TPL_SIGNUP", "TB_SIGNUP_001")
-        
-        # 매직 링크 생성
-        s = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
-        token = s.dumps(member.id, salt='coupon-access')
-        link_url = f"https://membership.everestfood.com/my-coupons?token={token}"
-        
-        # 변수 매핑
-        variable_map = {
-            "#{이름}": member.name,
-            "#{발급일}": today_date.strftime("%Y-%m-%d"),
-            "#{유효기간}": expiry_date.strftime("%Y-%m-%d")
-        }
-        
-        # 버튼 설정
-        button_data = {
-            "name": "쿠폰 확인하기", # 버튼명 (템플릿 설정에 따름)
-            "linkType": "WL", # Web Link
-            "linkTypeName": "웹링크",
-            "linkMo": link_url,
-            "linkPc": link_url
-        }
-        button_json = json.dumps({"button": [button_data]}) # 알리고 형식 (버튼 리스트)
-        
-        # 알림톡 발송 요청
-        send_alimtalk(member.phone, template_code, variable_map, button_json)
-        
-    except Exception as e:
-        current_app.logger.error(f"Signup bonus notification failed: {e}")
-        # 알림 실패해도 쿠폰은 저장되어야 함
+    # 2. 알림톡 발송 대기열 등록 (회원/쿠폰과 같은 트랜잭션)
+    enqueue_alimtalk(member.id, "WELCOME", f"coupon:{unique_code}",
+                     coupon_name=coupon_type,
+                     expiry_date=expiry_date.strftime("%Y-%m-%d"))
 
     db.session.commit()
+    notify_dispatcher()
     return True
@@ -22,6 +22,9 @@ def check_and_fix_schema():
                 if 'total_lifetime_spend' not in columns:
                     print("Fixing Members table: Adding total_lifetime_spend")
                     conn.execute(text("ALTER TABLE members ADD COLUMN total_lifetime_spend INTEGER DEFAULT 0"))
+                if 'phone_hash_version' not in columns:
+                    print("Fixing Members table: Adding phone_hash_version")
+                    conn.execute(text("ALTER TABLE members ADD COLUMN phone_hash_version INTEGER"))
             
             # 2. Receipts 테이블 컬럼 확인 및 복구
             if 'receipts' in existing_tables:
@@ -35,6 +38,13 @@ def check_and_fix_schema():
                 if 'image_url' not in columns:
                     print("Fixing Receipts table: Adding image_url")
                     conn.execute(text("ALTER TABLE receipts ADD COLUMN image_url VARCHAR(255)"))
+                if 'ocr_text' not in columns:
+                    print("Fixing Receipts table: Adding ocr_text")
+                    conn.execute(text("ALTER TABLE receipts ADD COLUMN ocr_text TEXT"))
+                if 'visit_day' not in columns:
+                    print("Fixing Receipts table: Adding visit_day")
+                    conn.execute(text("ALTER TABLE receipts ADD COLUMN visit_day VARCHAR(10)"))
+                    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_receipts_member_visit_day ON receipts (member_id, visit_day)"))
                     
             # 3. Coupons 테이블 컬럼 확인 및 복구
             if 'coupons' in existing_tables:
@@ -52,6 +62,28 @@ def check_and_fix_schema():
             # 4. Staffs 테이블 생성 (create_all이 실패했을 경우 대비, 또는 테이블은 있는데 컬럼 문제 검사)
             # Staffs는 create_all에서 처리되므로 여기서는 생략하거나, 
             # 만약 테이블이 없으면 create_all이 처리해줄 것임.
+            if 'staffs' in existing_tables:
+                columns = [c['name'] for c in inspector.get_columns('staffs')]
+                if 'pin_index' not in columns:
+                    print("Fixing Staffs table: Adding pin_index")
+                    conn.execute(text("ALTER TABLE staffs ADD COLUMN pin_index VARCHAR(64)"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_staffs_pin_index ON staffs (pin_index)"))
+                if 'failed_pin_attempts' not in columns:
+                    print("Fixing Staffs table: Adding failed_pin_attempts")
+                    conn.execute(text("ALTER TABLE staffs ADD COLUMN failed_pin_attempts INTEGER DEFAULT 0"))
+                if 'pin_locked_until' not in columns:
+                    print("Fixing Staffs table: Adding pin_locked_until")
+                    conn.execute(text("ALTER TABLE staffs ADD COLUMN pin_locked_until TIMESTAMP"))
+            
+            # 5. [신규] 조회용 인덱스 (마이그레이션 누락 대비, 이미 있으면 무시)
+            if {'receipts', 'coupons', 'staffs'} <= set(existing_tables):
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_receipts_member_id_visit_date ON receipts (member_id, visit_date)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_coupons_member_id_status_expiry_date ON coupons (member_id, status, expiry_date)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_staffs_branch ON staffs (branch)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_coupons_status_expiry_date ON coupons (status, expiry_date)"))
+            if 'members' in existing_tables:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_members_visit_sort ON members ((COALESCE(visit_count, 0)), id, visit_count)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_members_branch_sort ON members ((COALESCE(branch, '')), id)"))
             
             conn.commit()
             print("Schema check and fix completed.")
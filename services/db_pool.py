@@ -0,0 +1,112 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool, NullPool
+from services.metrics import inc_counter, observe, register_gauge
+
+
+class _TimedGetMixin:
+    """풀에서 연결을 얻기까지 걸린 시간(대기 + 새 연결 생성) 기록, 풀 포화로 시간 초과 시 카운트"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            inc_counter("db_pool_timeouts_total")
+            raise
+        finally:
+            observe("db_pool_wait_seconds", time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedGetMixin, QueuePool):
+    pass
+
+
+class TimedNullPool(_TimedGetMixin, NullPool):
+    pass
+
+
+def build_engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS 구성 (설정은 config.py의 DB_* 환경변수).
+    - PostgreSQL: 워커별 풀 크기/초과 연결/대기 시간/재사용 주기/사전 확인 + 서버 측 시간 제한
+      (시간 제한은 웹 요청 기준, 마이그레이션과 배치 CLI는 disable_session_timeouts로 해제)
+    - PgBouncer(transaction 모드): 앱 쪽 풀 없이 요청마다 연결, 시작 파라미터 사용 안 함
+    - SQLite(로컬 개발): 기본값 유지
+    """
+    if not config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+        return {}
+
+    connect_args = {"connect_timeout": config["DB_CONNECT_TIMEOUT"], "application_name": "everest-mp"}
+    if config["DB_PGBOUNCER"]:
+        return {"poolclass": TimedNullPool, "connect_args": connect_args}
+
+    options = []
+    if config["DB_STATEMENT_TIMEOUT_MS"]:
+        options.append(f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}")
+    if config["DB_IDLE_IN_TRANSACTION_TIMEOUT_MS"]:
+        options.append(f"-c idle_in_transaction_session_timeout={config['DB_IDLE_IN_TRANSACTION_TIMEOUT_MS']}")
+    if options:
+        connect_args["options"] = " ".join(options)
+
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_use_lifo": True,  # 최근 사용한 연결부터 재사용 -> 남는 연결은 유휴 상태로 두었다가 재사용 주기에 정리
+        "connect_args": connect_args,
+    }
+
+
+def disable_session_timeouts(engine):
+    """
+    [신규] 배치 CLI용: 이 프로세스의 모든 트랜잭션에서 서버 측 시간 제한 해제 (PostgreSQL만).
+    DB_STATEMENT_TIMEOUT_MS / DB_IDLE_IN_TRANSACTION_TIMEOUT_MS는 웹 요청 기준이라
+    재파싱/재암호화처럼 오래 걸리는 배치 작업이 중간에 끊기지 않도록 트랜잭션마다 SET LOCAL로 0을 지정.
+    SET LOCAL은 트랜잭션이 끝나면 원래 값으로 돌아가므로 PgBouncer(transaction 모드)에서도 다른 연결에 남지 않음
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        # psycopg2는 첫 문장에서 트랜잭션을 시작하므로 이 SET LOCAL이 새 트랜잭션의 첫 문장이 됨
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            cursor.execute("SET LOCAL idle_in_transaction_session_timeout = 0")
+        finally:
+            cursor.close()
+
+
+def _checked_out(db):
+    pool = db.engine.pool
+    return pool.checkedout() if isinstance(pool, QueuePool) else None
+
+
+def init_pool_metrics(app, db):
+    """커넥션 풀 사용량 지표 (사용 중 연결 수, 초과 연결 사용, 새 연결/폐기 건수)"""
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        # 풀 크기(DB_POOL_SIZE)를 넘어 초과 연결을 쓰는 비율이 높으면 풀이 부족하다는 뜻
+        pool = engine.pool
+        overflow = isinstance(pool, QueuePool) and pool.checkedout() > pool.size()
+        inc_counter("db_pool_checkouts_total", source="overflow" if overflow else "pool")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        inc_counter("db_pool_connections_total", event="connect")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exception):
+        inc_counter("db_pool_connections_total", event="invalidate")
+
+    # 현재 워커(/metrics를 처리한 워커)의 사용 중 연결 수
+    register_gauge("db_pool_checked_out", lambda: _checked_out(db), ttl=0)
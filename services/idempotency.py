@@ -0,0 +1,43 @@
+import re
+import json
+from datetime import datetime
+from flask import request
+from models import db, IdempotencyKeys
+
+# 클라이언트 요청 키 형식 (UUID 등)
+_KEY_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def get_request_key():
+    """요청의 멱등성 키 (Idempotency-Key 헤더 또는 idempotency_key 필드). 없거나 형식이 틀리면 None"""
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        if request.is_json:
+            key = (request.get_json(silent=True) or {}).get("idempotency_key")
+        else:
+            key = request.form.get("idempotency_key")
+    if key and _KEY_RE.match(str(key)):
+        return str(key)
+    return None
+
+
+def get_saved_response(scope, key):
+    """같은 키로 이미 처리된 요청의 응답 (없으면 None)"""
+    if not key:
+        return None
+    row = IdempotencyKeys.query.filter_by(scope=scope, key=key).first()
+    if row and row.response_json:
+        return json.loads(row.response_json)
+    return None
+
+
+def save_response(scope, key, response):
+    """
+    처리 결과를 키와 함께 저장 (호출한 쪽 트랜잭션에서 커밋).
+    같은 키의 동시 요청은 (scope, key) 유니크 인덱스로 커밋 시 IntegrityError -> 롤백 후 get_saved_response 사용
+    """
+    if not key:
+        return
+    db.session.add(IdempotencyKeys(
+        scope=scope, key=key, response_json=json.dumps(response, ensure_ascii=False), created_at=datetime.now()
+    ))
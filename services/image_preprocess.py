@@ -0,0 +1,25 @@
+import io
+from PIL import Image, ImageOps
+from config import Config
+
+
+def preprocess_receipt_image(content):
+    """
+    OCR 전 영수증 이미지 전처리 (Pillow).
+    - EXIF 회전 정보 반영 -> 흑백 변환 -> 긴 변 기준 OCR_IMAGE_MAX_SIDE로 축소 -> JPEG 재인코딩
+    - Pillow가 열 수 없는 형식(HEIC 등)이나 이미 더 작은 결과가 나오지 않으면 원본 그대로 반환
+    반환값: OCR에 보낼 이미지 bytes
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("L")
+            img.thumbnail((Config.OCR_IMAGE_MAX_SIDE, Config.OCR_IMAGE_MAX_SIDE), Image.LANCZOS)
+
+            output = io.BytesIO()
+            img.save(output, format="JPEG", quality=Config.OCR_IMAGE_JPEG_QUALITY, optimize=True)
+            processed = output.getvalue()
+    except Exception:
+        return content
+
+    return processed if len(processed) < len(content) else content
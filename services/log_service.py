@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import hmac
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+
+# 요청(또는 비동기 작업) 단위 상관관계 ID / 상세 추적 여부
+# (ContextVar라서 스레드 풀에 copy_context()로 넘기면 비동기 작업에도 그대로 전달됨)
+_request_id = contextvars.ContextVar("request_id", default=None)
+_trace_enabled = contextvars.ContextVar("trace_enabled", default=False)
+
+# 외부에서 받은 X-Request-ID는 로그 주입 방지를 위해 안전한 문자만 허용
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+# LogRecord 기본 속성 (이외의 속성은 extra로 넘긴 구조화 필드로 간주)
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """로그 레코드에 현재 요청 ID 주입 (로그를 남기는 스레드에서 실행되어야 함)"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄 JSON 로그 (extra로 넘긴 필드도 함께 기록)"""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ProcessQueueHandler(QueueHandler):
+    """
+    요청 스레드는 큐에 넣기만 하고, 실제 출력(I/O)은 리스너 스레드가 담당 (Non-blocking).
+    Gunicorn fork 이후에는 부모의 리스너 스레드가 복제되지 않으므로 PID가 바뀌면 큐/리스너를 새로 만든다.
+    """
+
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self._listener = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, record):
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        super().enqueue(record)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = os.getpid()
+
+    def stop(self):
+        """남은 로그를 모두 출력하고 리스너 종료 (프로세스 종료 시)"""
+        if self._listener and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._listener_pid = None
+
+
+def init_logging(app):
+    """
+    구조화 로그 설정 + 요청 ID / 추적 여부 결정 훅 등록.
+    - LOG_FORMAT: json(기본) | text, LOG_LEVEL: INFO(기본)
+    - 모든 로그는 큐를 거쳐 별도 스레드에서 stderr로 출력
+    """
+    # [수정] config는 사용 시점에 import (trace를 쓰는 영수증 파서가 비밀키 없이도 import되도록)
+    from config import Config
+    stream = logging.StreamHandler(sys.stderr)
+    if Config.LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    handler = ProcessQueueHandler(stream)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    # 기존 루트 핸들러(alembic 설정, 앱 재생성 시 이전 핸들러 등) 정리
+    for old in list(root.handlers):
+        if isinstance(old, ProcessQueueHandler):
+            old.stop()
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, Config.LOG_LEVEL.upper(), logging.INFO))
+
+    # Flask 기본 핸들러(동기 출력) 대신 루트 핸들러 사용
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)
+
+    app.before_request(_begin_request)
+    app.after_request(_add_request_id_header)
+    app.teardown_request(_end_request)
+    atexit.register(handler.stop)
+
+
+def _begin_request():
+    request_id = request.headers.get("X-Request-ID", "")
+    if not _REQUEST_ID_RE.match(request_id):
+        request_id = uuid.uuid4().hex[:12]
+    g.request_id = request_id
+    _request_id.set(request_id)
+
+    # 상세 추적: X-Debug-Trace 헤더가 TRACE_TOKEN과 일치하는 요청 또는 샘플링된 요청만
+    from config import Config
+    token = request.headers.get("X-Debug-Trace")
+    forced = bool(Config.TRACE_TOKEN and token and hmac.compare_digest(token, Config.TRACE_TOKEN))
+    _trace_enabled.set(forced or random.random() < Config.PARSE_TRACE_SAMPLE_RATE)
+
+
+def _add_request_id_header(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    return response
+
+
+def _end_request(exc=None):
+    _request_id.set(None)
+    _trace_enabled.set(False)
+
+
+def set_request_id(request_id):
+    """요청 밖(배치 작업 등)에서 상관관계 ID 지정"""
+    _request_id.set(request_id)
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def is_trace_enabled():
+    return _trace_enabled.get()
+
+
+def trace(logger, msg, *args, **fields):
+    """
+    상세 추적 로그 (OCR 원문 등 개인정보가 포함될 수 있음).
+    추적이 켜진 요청이면 INFO로, 아니면 DEBUG 레벨이 켜진 경우에만 기록 (운영 기본값에서는 비용 없음)
+    """
+    if _trace_enabled.get():
+        logger.info(msg, *args, extra={"trace": True, **fields})
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args, extra=fields)
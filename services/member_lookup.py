@@ -0,0 +1,145 @@
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import or_
+from models import db, Members
+from config import Config
+
+# 조회 결과가 '미가입'임을 나타내는 캐시 값
+_NOT_FOUND = 0
+
+
+class _TTLCache:
+    """크기 제한(LRU) + TTL 메모리 캐시 (스레드 안전, 워커 프로세스별)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# 해시 -> member_id (미가입 번호는 _NOT_FOUND)
+_lookup_cache = _TTLCache(Config.PHONE_LOOKUP_CACHE_SIZE)
+
+
+def invalidate_phone_cache(*phone_hashes):
+    """가입/수정/삭제 시 해당 해시의 캐시 항목 제거"""
+    for phone_hash in phone_hashes:
+        if phone_hash:
+            _lookup_cache.delete(phone_hash)
+
+
+def find_member_by_phone(phone):
+    """
+    전화번호로 회원 조회 (phone_hash_value 인덱스 조회만 사용, 전체 스캔 없음).
+    - 입력값은 Members.normalize_phone으로 1회 정규화 (숫자만, +82 -> 010)
+    - 캐시 적중 시: 회원은 PK 조회, 미가입 번호는 DB 조회 없이 None 반환
+    - 현재 Pepper 해시로 1회 조회
+    - Pepper 교체 중(PHONE_HASH_PEPPER_PREVIOUS 설정)이면 이전 해시로 1회 추가 조회 후 즉시 재해싱
+    """
+    normalized = Members.normalize_phone(phone)
+    if not normalized:
+        return None
+
+    input_hash = Members.generate_phone_hash(normalized)
+
+    cached_id = _lookup_cache.get(input_hash)
+    if cached_id == _NOT_FOUND:
+        return None
+    if cached_id is not None:
+        member = db.session.get(Members, cached_id)
+        # 다른 워커에서 수정/삭제된 경우 캐시 무시
+        if member and member.phone_hash_value == input_hash:
+            return member
+        _lookup_cache.delete(input_hash)
+
+    member = _query_member_by_hash(normalized, input_hash)
+
+    if member:
+        _lookup_cache.set(input_hash, member.id, Config.PHONE_LOOKUP_CACHE_TTL)
+    else:
+        _lookup_cache.set(input_hash, _NOT_FOUND, Config.PHONE_LOOKUP_NEGATIVE_TTL)
+    return member
+
+
+def _query_member_by_hash(phone, input_hash):
+    member = Members.query.filter_by(phone_hash_value=input_hash).first()
+    if member:
+        return member
+
+    # [Rotation] 아직 백필되지 않은 이전 버전 해시로 조회
+    if Config.PHONE_HASH_PEPPER_PREVIOUS:
+        old_hash = Members.generate_phone_hash(phone, pepper=Config.PHONE_HASH_PEPPER_PREVIOUS)
+        member = Members.query.filter_by(phone_hash_value=old_hash).first()
+        if member:
+            # [Self-Healing] 조회된 회원은 현재 버전 해시로 갱신
+            member.phone_hash_value = input_hash
+            member.phone_hash_version = Config.PHONE_HASH_VERSION
+            db.session.commit()
+
+    return member
+
+
+def backfill_phone_hashes(batch_size=500, force=False):
+    """
+    phone_hash_value가 없거나 버전이 현재와 다른 회원의 해시를 (재)생성.
+    - id 기준 Keyset 방식으로 batch_size 단위 조회 및 배치별 커밋 (테이블 장시간 잠금 방지)
+    - force=True이면 모든 회원을 재해싱 (정규화 규칙 변경 시)
+    반환값: 갱신된 회원 수
+    """
+    stale = or_(
+        Members.phone_hash_value.is_(None),
+        Members.phone_hash_version.is_(None),
+        Members.phone_hash_version != Config.PHONE_HASH_VERSION,
+    )
+
+    updated = 0
+    last_id = 0
+    while True:
+        query = Members.query.filter(Members.id > last_id)
+        if not force:
+            query = query.filter(stale)
+        batch = query.order_by(Members.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+
+        for m in batch:
+            last_id = m.id
+            phone = m.phone  # 복호화된 값
+            if not phone:
+                continue
+            m.phone_hash_value = Members.generate_phone_hash(phone)
+            m.phone_hash_version = Config.PHONE_HASH_VERSION
+            invalidate_phone_cache(m.phone_hash_value)
+            updated += 1
+
+        db.session.commit()
+
+    return updated
@@ -0,0 +1,83 @@
+import re
+from sqlalchemy import func
+from models import db, Members, MemberSearchTokens
+
+PHONE_KEYWORD_PATTERN = re.compile(r'^[0-9+\-\s]+$')
+
+
+def search_members(keyword, page=1, per_page=20):
+    """
+    Blind Index 토큰으로 회원 검색 (이름 또는 전화번호 일부).
+    - 키워드의 모든 토큰을 가진 회원만 SQL(인덱스)로 추려서 페이지 단위로 조회
+    - n-gram 특성상 생길 수 있는 오탐은 해당 페이지 후보만 복호화하여 제거
+    반환값: (회원 리스트, 다음 페이지 존재 여부)
+    """
+    keyword = (keyword or "").strip()
+    if not keyword:
+        return [], False
+
+    is_phone = bool(PHONE_KEYWORD_PATTERN.match(keyword))
+    field = "phone" if is_phone else "name"
+    tokens = Members.generate_search_tokens(field, keyword)
+    if not tokens:
+        # 전화번호는 최소 4자리부터 검색 가능
+        return [], False
+
+    matched_ids = (
+        db.session.query(MemberSearchTokens.member_id)
+        .filter(MemberSearchTokens.token.in_(tokens))
+        .group_by(MemberSearchTokens.member_id)
+        .having(func.count(func.distinct(MemberSearchTokens.token)) == len(tokens))
+        .order_by(MemberSearchTokens.member_id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+    member_ids = [row[0] for row in matched_ids]
+    has_next = len(member_ids) > per_page
+    member_ids = member_ids[:per_page]
+    if not member_ids:
+        return [], False
+
+    members = Members.query.filter(Members.id.in_(member_ids)).order_by(Members.id.desc()).all()
+
+    # 오탐 제거 (페이지 후보만 복호화, 화면에서 다시 읽을 때는 캐시 사용)
+    Members.decrypt_many(members)
+    if is_phone:
+        needle = Members.normalize_phone(keyword)
+        members = [m for m in members if needle in Members.normalize_phone(m.phone)]
+    else:
+        needle = keyword.replace(" ", "").lower()
+        members = [m for m in members if m.name and needle in m.name.replace(" ", "").lower()]
+
+    return members, has_next
+
+
+def backfill_search_tokens(batch_size=500):
+    """
+    검색 토큰이 없는 회원(기능 도입 전 가입자)의 토큰 생성.
+    id 기준 Keyset 방식으로 batch_size 단위 조회 및 배치별 커밋.
+    반환값: 갱신된 회원 수
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        batch = (
+            Members.query
+            .filter(Members.id > last_id, ~Members.search_tokens.any())
+            .order_by(Members.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        for m in batch:
+            last_id = m.id
+            m._set_search_tokens("name", m.name)
+            m._set_search_tokens("phone", m.phone)
+            updated += 1
+
+        db.session.commit()
+
+    return updated
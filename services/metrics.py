@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import hmac
+import threading
+import contextvars
+from contextlib import contextmanager
+from flask import g, request, abort, Response
+from config import Config
+
+# 단계별 소요 시간 히스토그램 버킷 (초) - Vision OCR은 수 초까지 걸릴 수 있음
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 지표 이름 -> (유형, 설명)
+METRICS = {
+    "receipt_stage_seconds": ("histogram", "영수증 처리 단계별 소요 시간(초)"),
+    "receipt_requests_total": ("counter", "영수증 처리 건수 (결과별)"),
+    "vision_errors_total": ("counter", "Google Vision OCR 오류/시간 초과 건수"),
+    "bcrypt_rejected_total": ("counter", "bcrypt 풀 포화/시간 초과로 거절된 인증 요청 수"),
+    "plaintext_decrypt_total": ("counter", "암호화되지 않은(마이그레이션 전 평문) 값 읽기 횟수"),
+    "pii_plaintext_rows": ("gauge", "평문 개인정보가 남아 있는 회원 수"),
+    "coupons_expired_total": ("counter", "유효기간이 지나 EXPIRED로 변경된 쿠폰 수"),
+    "alimtalk_messages_total": ("counter", "알림톡 발송 결과별 건수 (sent/retry/failed)"),
+    "alimtalk_outbox_pending": ("gauge", "발송 대기 중인 알림톡 수 (재시도 대기 포함)"),
+    "db_pool_wait_seconds": ("histogram", "DB 커넥션 풀에서 연결을 얻기까지 걸린 시간(초)"),
+    "db_pool_timeouts_total": ("counter", "DB 커넥션 풀 포화로 연결 대기 시간이 초과된 횟수"),
+    "db_pool_checkouts_total": ("counter", "DB 연결 사용 횟수 (풀 / 초과 연결)"),
+    "db_pool_connections_total": ("counter", "새 DB 연결 생성(connect) / 끊긴 연결 폐기(invalidate) 건수"),
+    "db_pool_checked_out": ("gauge", "사용 중인 DB 연결 수 (/metrics를 처리한 워커 기준)"),
+}
+
+# 수집 시점에 계산하는 지표: 이름 -> [함수, 캐시 유효 시간(초), 마지막 값, 계산 시각]
+_gauges = {}
+
+# 프로세스(워커)별 지표 저장소
+# Gunicorn 워커마다 메모리가 분리되어 있으므로 주기적으로 instance/metrics/<pid>.json에 기록하고
+# /metrics 요청 시 모든 워커의 파일을 합산한다.
+_lock = threading.Lock()
+_counters = {}    # (이름, 라벨 튜플) -> 값
+_histograms = {}  # (이름, 라벨 튜플) -> [버킷별 건수..., 합계, 건수]
+_pid = None
+_last_flush = 0.0
+
+# 현재 처리 중인 영수증의 단계 타이머 (요청 스레드/비동기 작업 스레드 각각)
+_current_timer = contextvars.ContextVar("stage_timer", default=None)
+
+
+def _check_pid():
+    # fork 이전에 쌓인 값이 자식 워커에 복제되어 중복 집계되지 않도록 PID가 바뀌면 초기화
+    global _pid
+    pid = os.getpid()
+    if _pid != pid:
+        _counters.clear()
+        _histograms.clear()
+        _pid = pid
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc_counter(name, value=1, **labels):
+    with _lock:
+        _check_pid()
+        key = (name, _label_key(labels))
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    with _lock:
+        _check_pid()
+        key = (name, _label_key(labels))
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(STAGE_BUCKETS) + 1) + [0.0, 0]
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+                break
+        else:
+            hist[len(STAGE_BUCKETS)] += 1  # +Inf
+        hist[-2] += value
+        hist[-1] += 1
+
+
+class StageTimer:
+    """영수증 1건 처리의 단계별 소요 시간 (Server-Timing 헤더 + 히스토그램)"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.spans = []  # [(단계, 초)]
+        self.branch = None
+
+    def server_timing(self):
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans)
+
+
+def start_timer(mode="sync"):
+    """현재 컨텍스트(요청 또는 작업 스레드)의 단계 타이머 시작"""
+    timer = StageTimer(mode)
+    _current_timer.set(timer)
+    if mode == "sync":
+        g.stage_timer = timer
+    return timer
+
+
+@contextmanager
+def stage(name):
+    """with stage("ocr"): ... - 현재 타이머가 없으면(배치 작업 등) 측정하지 않음"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.spans.append((name, time.perf_counter() - start))
+
+
+def set_stage_branch(branch):
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.branch = branch
+
+
+def finish_timer(timer, result):
+    """단계별 소요 시간과 처리 결과(success/error/queued/invalid)를 지표에 기록"""
+    timer.spans.append(("total", time.perf_counter() - timer.started))
+    branch = timer.branch or "unknown"
+    for name, seconds in timer.spans:
+        observe("receipt_stage_seconds", seconds, stage=name, branch=branch, mode=timer.mode)
+    inc_counter("receipt_requests_total", result=result, branch=branch, mode=timer.mode)
+    _current_timer.set(None)
+
+
+def register_gauge(name, fn, ttl=300):
+    """/metrics 요청 시 fn()으로 계산하는 지표 (DB 집계 등은 ttl 동안 재사용)"""
+    _gauges[name] = [fn, ttl, None, 0.0]
+
+
+def _gauge_value(name):
+    gauge = _gauges[name]
+    fn, ttl, value, computed_at = gauge
+    now = time.time()
+    if value is None or now - computed_at >= ttl:
+        try:
+            value = fn()
+        except Exception:
+            return value  # 계산 실패 시 이전 값 유지 (없으면 생략)
+        gauge[2], gauge[3] = value, now
+    return value
+
+
+def _metrics_dir():
+    return Config.METRICS_DIR
+
+
+def flush(force=False):
+    """현재 워커의 지표를 파일로 기록 (METRICS_FLUSH_INTERVAL 초마다 1회)"""
+    global _last_flush
+    now = time.time()
+    if not force and now - _last_flush < Config.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+
+    with _lock:
+        _check_pid()
+        snapshot = {
+            "counters": [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, list(labels), hist] for (name, labels), hist in _histograms.items()],
+        }
+    if not snapshot["counters"] and not snapshot["histograms"]:
+        return
+
+    try:
+        os.makedirs(_metrics_dir(), exist_ok=True)
+        path = os.path.join(_metrics_dir(), f"{_pid}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # 지표 기록 실패가 요청 처리를 막지 않도록 무시
+
+
+def _collect():
+    """모든 워커 파일 합산. 반환값: (counters, histograms)"""
+    counters, histograms = {}, {}
+    stale_before = time.time() - Config.METRICS_STALE_SECONDS
+
+    try:
+        filenames = [f for f in os.listdir(_metrics_dir()) if f.endswith(".json")]
+    except OSError:
+        filenames = []
+
+    for filename in filenames:
+        path = os.path.join(_metrics_dir(), filename)
+        try:
+            # 오래전에 종료된 워커의 파일 정리
+            if os.path.getmtime(path) < stale_before:
+                os.remove(path)
+                continue
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in snapshot["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [0] * len(hist))
+            for i, v in enumerate(hist):
+                merged[i] += v
+
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_metrics():
+    """Prometheus 텍스트 형식으로 전체 워커 지표 출력"""
+    flush(force=True)
+    counters, histograms = _collect()
+    lines = []
+
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "gauge":
+            value = _gauge_value(name) if name in _gauges else None
+            if value is not None:
+                lines.append(f"{name} {value}")
+        elif kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        else:
+            for (metric, labels), hist in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(STAGE_BUCKETS + ("+Inf",), hist[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {hist[-2]:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    """GET /metrics (METRICS_TOKEN 미설정 시 비활성, Authorization: Bearer <토큰> 필요)"""
+    if not Config.METRICS_TOKEN:
+        abort(404)
+    auth = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth, f"Bearer {Config.METRICS_TOKEN}"):
+        abort(401)
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app):
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+
+    @app.after_request
+    def _metrics_after_request(response):
+        timer = g.get("stage_timer")
+        if timer is not None and timer.spans:
+            response.headers["Server-Timing"] = timer.server_timing()
+        flush()
+        return response
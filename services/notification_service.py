@@ -1,5 +1,9 @@
 
+import json
+import urllib.parse
+import urllib.request
 from flask import current_app
+from config import Config
 
 
 def get_alimtalk_template(template_type, **kwargs):
@@ -56,33 +60,57 @@ def get_alimtalk_template(template_type, **kwargs):
         
     return ""
 
-def send_alimtalk(phone, template_code, variable_map, button_info=None):
+class AligoError(Exception):
+    """알리고 API 호출 실패 (네트워크 오류, 시간 초과, 오류 응답) - 발송 대기열에서 재시도"""
+
+
+def _mask_phone(phone):
+    """010-1234-5678 -> 010-****-5678 (로그용)"""
+    digits = "".join(ch for ch in phone or "" if ch.isdigit())
+    if len(digits) < 8:
+        return "***"
+    return f"{digits[:3]}-****-{digits[-4:]}"
+
+
+def send_alimtalk_batch(template_code, messages):
     """
-    알리고 알림톡 발송 (Placeholder)
-    - template_code: 알리고 템플릿 코드 (예: TB_1234)
-    - variable_map: 템플릿 내 변수 치환값 (예: {'#{이름}': '홍길동'})
-    - button_info: 버튼 정보 (JSON string or dict)
+    알리고 알림톡 일괄 발송 (같은 템플릿, 요청 1회에 최대 500명)
+    - messages: [{"receiver": 전화번호, "recvname": 이름, "subject": 제목, "message": 본문, "button": 버튼 JSON}, ...]
+    - ALIGO_API_KEY 미설정 시 실제 발송 없이 로그만 기록 (개발용)
+    실패 시 AligoError
     """
+    if not Config.ALIGO_API_KEY:
+        # [수정] 전화번호/본문(쿠폰 링크)은 기록하지 않고 템플릿과 마스킹한 수신번호만 기록
+        for m in messages:
+            current_app.logger.info(f"[ALIGO ALIMTALK] To: {_mask_phone(m['receiver'])} | Tpl: {template_code}")
+        return
+
+    payload = {
+        "apikey": Config.ALIGO_API_KEY,
+        "userid": Config.ALIGO_USER_ID,
+        "senderkey": Config.ALIGO_SENDER_KEY,
+        "tpl_code": template_code,
+        "sender": Config.ALIGO_SENDER,
+    }
+    for i, m in enumerate(messages, start=1):
+        payload[f"receiver_{i}"] = m["receiver"]
+        payload[f"recvname_{i}"] = m.get("recvname") or ""
+        payload[f"subject_{i}"] = m["subject"]
+        payload[f"message_{i}"] = m["message"]
+        if m.get("button"):
+            payload[f"button_{i}"] = m["button"]
+
+    req = urllib.request.Request(Config.ALIGO_API_URL, data=urllib.parse.urlencode(payload).encode("utf-8"))
     try:
-        # 실제 알리고 API 연동 시 필요한 데이터 구조
-        payload = {
-            "receiver": phone,
-            "tpl_code": template_code,
-            "replacements": variable_map, # 알리고 API에 따라 포맷 조정 필요
-            "button_1": button_info
-        }
-        
-        # 로그로 데이터 확인
-        current_app.logger.info(f"[ALIGO ALIMTALK] To: {phone} | Tpl: {template_code}")
-        current_app.logger.info(f"Vars: {variable_map}")
-        current_app.logger.info(f"Button: {button_info}")
-        
-        # 콘솔 출력 (개발용)
-        print(f"📨 [알림톡 발송 요청]\n수신: {phone}\n템플릿: {template_code}\n변수: {variable_map}\n버튼: {button_info}")
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Alimtalk failed: {e}")
-        return False
+        with urllib.request.urlopen(req, timeout=Config.ALIGO_TIMEOUT) as resp:
+            body = json.loads(resp.read().decode("utf-8"))
+    except (OSError, ValueError) as e:  # URLError/HTTPError/시간 초과는 OSError
+        raise AligoError(f"request failed: {e}") from e
+
+    # 알리고 응답: {"code": 0, "message": "...", "info": {...}} (0 이외는 실패)
+    if str(body.get("code")) != "0":
+        raise AligoError(f"code {body.get('code')}: {body.get('message')}")
+    current_app.logger.info("Alimtalk batch sent", extra={"tpl_code": template_code, "count": len(messages)})
 
 def send_notification(phone, message):
     """
@@ -0,0 +1,139 @@
+import os
+import json
+import hashlib
+import threading
+from services.metrics import inc_counter
+
+# 프로세스(워커)별 OCR 백엔드 인스턴스
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+class VisionOCRBackend:
+    """
+    Google Vision OCR 백엔드.
+    - 클라이언트(gRPC 채널)는 최초 요청 시 1회 생성하여 재사용 (요청마다 TLS/인증 핸드셰이크 제거)
+    - OCR_RECORD_DIR 설정 시 인식 결과를 <이미지 SHA-256>.txt로 저장 (ReplayOCRBackend용 녹화)
+    """
+
+    def __init__(self, record_dir=None, timeout=None):
+        self.record_dir = record_dir
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    @staticmethod
+    def _create_client():
+        from google.cloud import vision
+        from google.oauth2 import service_account
+
+        credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
+        if not credentials_json:
+            raise Exception("구글 키(JSON)가 Render 환경변수에 등록되지 않았습니다!")
+
+        try:
+            credentials_info = json.loads(credentials_json)
+            credentials = service_account.Credentials.from_service_account_info(credentials_info)
+            return vision.ImageAnnotatorClient(credentials=credentials)
+        except Exception as e:
+            raise Exception(f"구글 키 오류: {e}")
+
+    def detect_text(self, content):
+        from google.cloud import vision
+
+        client = self._get_client()
+        image = vision.Image(content=bytes(content))
+        try:
+            response = client.text_detection(image=image, timeout=self.timeout)
+        except Exception as e:
+            # [신규] 시간 초과(DeadlineExceeded 등)와 기타 오류를 구분 집계
+            name = type(e).__name__
+            inc_counter("vision_errors_total", kind="timeout" if "Deadline" in name or "Timeout" in name else "error")
+            raise
+
+        if response.error.message:
+            inc_counter("vision_errors_total", kind="api")
+            raise Exception(f"구글 API 에러: {response.error.message}")
+
+        texts = response.text_annotations
+        full_text = texts[0].description if texts else None
+
+        if full_text and self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            digest = hashlib.sha256(content).hexdigest()
+            with open(os.path.join(self.record_dir, f"{digest}.txt"), "w", encoding="utf-8") as f:
+                f.write(full_text)
+
+        return full_text
+
+
+class ReplayOCRBackend:
+    """
+    녹화된 OCR 텍스트를 재생하는 로컬 백엔드 (테스트/벤치마크용, 외부 API 호출 없음).
+    - replay_dir/<이미지 SHA-256>.txt 가 있으면 해당 텍스트 반환
+    - 없으면 replay_dir/default.txt (또는 default_text) 반환
+    """
+
+    def __init__(self, replay_dir=None, default_text=None):
+        self.replay_dir = replay_dir
+        self.default_text = default_text
+
+    def _read(self, filename):
+        if not self.replay_dir:
+            return None
+        path = os.path.join(self.replay_dir, filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def detect_text(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        text = self._read(f"{digest}.txt")
+        if text is None:
+            text = self._read("default.txt")
+        if text is None:
+            text = self.default_text
+        return text
+
+
+def create_ocr_backend():
+    """환경변수 OCR_BACKEND(vision/replay)에 따라 백엔드 생성"""
+    backend_name = os.environ.get("OCR_BACKEND", "vision")
+    if backend_name == "replay":
+        return ReplayOCRBackend(replay_dir=os.environ.get("OCR_REPLAY_DIR"))
+    # OCR_TIMEOUT: Vision 요청 제한 시간(초) - 응답이 없을 때 요청 스레드가 무한정 묶이지 않도록
+    timeout = float(os.environ.get("OCR_TIMEOUT", "20"))
+    return VisionOCRBackend(record_dir=os.environ.get("OCR_RECORD_DIR"), timeout=timeout)
+
+
+def get_ocr_backend():
+    """
+    프로세스 전역 OCR 백엔드 반환 (지연 초기화).
+    Gunicorn pre-fork 환경에서 fork 이전에 만든 gRPC 채널을 자식이 공유하지 않도록
+    PID가 바뀌면 새로 생성한다.
+    """
+    global _backend, _backend_pid
+    pid = os.getpid()
+    if _backend is None or _backend_pid != pid:
+        with _backend_lock:
+            if _backend is None or _backend_pid != pid:
+                _backend = create_ocr_backend()
+                _backend_pid = pid
+    return _backend
+
+
+def set_ocr_backend(backend):
+    """테스트/벤치마크에서 백엔드를 직접 지정 (예: ReplayOCRBackend)"""
+    global _backend, _backend_pid
+    with _backend_lock:
+        _backend = backend
+        _backend_pid = os.getpid()
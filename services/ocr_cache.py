@@ -0,0 +1,142 @@
+import time
+import sqlite3
+import hashlib
+from cryptography.fernet import InvalidToken
+from config import Config, cipher_suite
+
+# 모든 Gunicorn 워커가 공유하는 로컬 SQLite 파일 캐시
+# (이미지 SHA-256 -> OCR 텍스트, 최초 제출 회원)
+# [수정] OCR 원문은 카드번호/이름 등 개인정보를 포함하므로 암호화하여 저장 (Receipts.ocr_text와 동일)
+# [수정] 파싱 결과는 캐시하지 않음 - 파서가 바뀌어도 항상 현재 파서로 다시 파싱 (파싱 비용은 수십 us)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_text_cache (
+    image_hash TEXT PRIMARY KEY,
+    ocr_text TEXT NOT NULL,
+    member_id INTEGER,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_ocr_text_cache_last_used ON ocr_text_cache (last_used);
+CREATE INDEX IF NOT EXISTS ix_ocr_text_cache_created_at ON ocr_text_cache (created_at);
+"""
+
+_initialized_paths = set()
+
+
+def image_digest(content):
+    """이미지 bytes의 SHA-256 (캐시 키)"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def _connect():
+    path = Config.OCR_CACHE_PATH
+    conn = sqlite3.connect(path, timeout=5)
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _drop_plaintext_table(conn)
+        _initialized_paths.add(path)
+    return conn
+
+
+def _drop_plaintext_table(conn):
+    """이전 버전의 평문 캐시 테이블(ocr_cache) 삭제 후 파일에 남은 평문 페이지 정리"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ocr_cache'").fetchone():
+        conn.execute("DROP TABLE ocr_cache")
+        conn.commit()
+        conn.execute("VACUUM")
+
+
+def _encrypt(text):
+    return cipher_suite.encrypt(text.encode()).decode()
+
+
+def _decrypt(token):
+    """복호화 실패(키 교체 후 이전 키 제거 등)는 캐시 없음으로 처리"""
+    try:
+        return cipher_suite.decrypt(token.encode()).decode()
+    except (InvalidToken, UnicodeDecodeError):
+        return None
+
+
+def get_cached_ocr(image_hash):
+    """
+    캐시 조회. 반환값: {"ocr_text", "member_id"} 또는 None
+    TTL이 지난 항목은 없는 것으로 처리.
+    """
+    if not Config.OCR_CACHE_ENABLED:
+        return None
+    now = time.time()
+    try:
+        conn = _connect()
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute(
+            "SELECT ocr_text, member_id FROM ocr_text_cache WHERE image_hash = ? AND created_at >= ?",
+            (image_hash, now - Config.OCR_CACHE_TTL)
+        ).fetchone()
+        if not row:
+            return None
+        conn.execute("UPDATE ocr_text_cache SET last_used = ? WHERE image_hash = ?", (now, image_hash))
+        conn.commit()
+    except sqlite3.Error:
+        # 캐시 장애가 영수증 처리를 막지 않도록 무시
+        return None
+    finally:
+        conn.close()
+
+    ocr_text, member_id = row
+    ocr_text = _decrypt(ocr_text)
+    if ocr_text is None:
+        return None
+    return {"ocr_text": ocr_text, "member_id": member_id}
+
+
+def put_cached_ocr(image_hash, ocr_text):
+    """
+    캐시 저장(암호화) 후 TTL 만료 항목 및 최대 개수 초과분(오래 안 쓴 순) 삭제.
+    [수정] 제출 회원(member_id)은 영수증 등록 커밋 후 set_cached_owner()로만 기록 (기존 값 유지)
+    """
+    if not Config.OCR_CACHE_ENABLED or not ocr_text:
+        return
+    now = time.time()
+    try:
+        conn = _connect()
+    except sqlite3.Error:
+        return
+    try:
+        conn.execute(
+            "INSERT INTO ocr_text_cache (image_hash, ocr_text, created_at, last_used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (image_hash) DO UPDATE SET ocr_text = excluded.ocr_text, last_used = excluded.last_used",
+            (image_hash, _encrypt(ocr_text), now, now)
+        )
+        conn.execute("DELETE FROM ocr_text_cache WHERE created_at < ?", (now - Config.OCR_CACHE_TTL,))
+        conn.execute(
+            "DELETE FROM ocr_text_cache WHERE image_hash IN ("
+            " SELECT image_hash FROM ocr_text_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (Config.OCR_CACHE_MAX_ENTRIES,)
+        )
+        conn.commit()
+    except sqlite3.Error:
+        pass
+    finally:
+        conn.close()
+
+
+def set_cached_owner(image_hash, member_id):
+    """[신규] 영수증 등록(커밋)에 성공한 회원을 이미지의 제출 회원으로 기록 (이미 기록된 경우 유지)"""
+    if not Config.OCR_CACHE_ENABLED:
+        return
+    try:
+        conn = _connect()
+    except sqlite3.Error:
+        return
+    try:
+        conn.execute("UPDATE ocr_text_cache SET member_id = ? WHERE image_hash = ? AND member_id IS NULL",
+                     (member_id, image_hash))
+        conn.commit()
+    except sqlite3.Error:
+        pass
+    finally:
+        conn.close()
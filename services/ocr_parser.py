@@ -1,10 +1,9 @@
-import os
-import io
 import re
-import json
-from google.cloud import vision
-from google.oauth2 import service_account
+import logging
 from datetime import datetime
+from services.log_service import trace
+
+logger = logging.getLogger(__name__)
 
 BRANCH_NAMES = {
     "동대문": ["에베레스트 동대문", "창신동", "동대문점", "종로구"],
@@ -29,6 +28,67 @@ VALID_BIZ_NUMBERS = [
     "502-85-42712"  # 룸비니
 ]
 
+# ---------------------------------------------------------------------------
+# [신규] 파서 엔진용 사전 컴파일 패턴 (모듈 로드 시 1회만 생성)
+# ---------------------------------------------------------------------------
+
+# 금액 키워드 (★ "카드결제액", "결제액": 롯데백화점 대응)
+AMOUNT_KEYWORDS = ["합계", "결제금액", "청구금액", "받을금액", "승인금액", "매출금액", "total", "tot", "amount", "카드결제액", "결제액"]
+
+# 환불/단품취소 키워드
+REFUND_KEYWORDS = ["취소", "반품", "걸제취소", "승인취소", "매출취소"]
+
+# 금액 줄에서 큰 숫자를 의심할 단어 (승인번호, 카드번호, 가맹점번호 등)
+RISKY_LINE_WORDS = ["승인번호", "승인", "가맹점", "사업자", "Tel", "TEL", "문의", "카드번호", "Card", "No", "NO", "ID"]
+
+# 비상 대책(최대값 추정)에서 아예 제외할 줄의 단어 (승인번호, 전화번호, 날짜 등)
+FALLBACK_SKIP_WORDS = ["승인", "번호", "Tel", "TEL", "사업자", "Date", "Time", "날짜", "Card", "No", "NO", "ID", "Code"]
+
+_CLEAN_BIZ_NUMBERS = [(biz_num, biz_num.replace('-', '')) for biz_num in VALID_BIZ_NUMBERS]
+
+
+def _alternation(words):
+    # 긴 단어부터 시도하도록 정렬 후 하나의 정규식으로 결합
+    return '|'.join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+def _build_token_table():
+    """결합 패턴의 토큰 -> (지점 우선순위, 지점명) 또는 "REFUND" """
+    table = {}
+    for order, (official_name, keywords) in enumerate(BRANCH_NAMES.items()):
+        for keyword in keywords:
+            table.setdefault(keyword.replace(' ', ''), (order, official_name))
+    for keyword in REFUND_KEYWORDS:
+        table.setdefault(keyword, "REFUND")
+    return table
+
+
+# 지점 키워드 + 환불 키워드를 한 번에 찾는 결합 패턴 (공백 제거/소문자 텍스트 대상)
+# 앞보기(?=...)로 겹치는 위치의 키워드도 모두 찾는다.
+# (한 위치에서는 가장 긴 토큰만 잡히므로 토큰끼리 접두어 관계가 없어야 함)
+_TOKEN_KIND = _build_token_table()
+_TOKEN_RE = re.compile(f"(?=({_alternation(_TOKEN_KIND)}))")
+
+_AMOUNT_KEYWORD_RE = re.compile(_alternation(AMOUNT_KEYWORDS))
+_RISKY_LINE_RE = re.compile(_alternation(RISKY_LINE_WORDS))
+_FALLBACK_SKIP_RE = re.compile(_alternation(FALLBACK_SKIP_WORDS))
+
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+# 한글/영문 외 문자 제거용 (줄 구분을 유지하도록 개행은 남김)
+_NON_LETTER_RE = re.compile(r'[^가-힣a-zA-Z\n]')
+_NUMBER_RE = re.compile(r'[0-9,.]+')
+_NUMBER_NO_DOT_RE = re.compile(r'[0-9,]+')
+# [수정] 숫자열 중간 일치 제외 (사업자번호 101-05-48485의 "01-05-48" 등), 월/일 범위 확인
+# 4자리 연도(YYYY-MM-DD)를 먼저 찾고 없을 때만 2자리 연도(YY-MM-DD)
+_MONTH_DAY = r'[-/.](?:0[1-9]|1[0-2])[-/.](?:0[1-9]|[12]\d|3[01])'
+_DATE_RE = re.compile(r'(?<!\d)(?:19|20)\d{2}' + _MONTH_DAY + r'(?!\d)')
+_SHORT_DATE_RE = re.compile(r'(?<![\d-])\d{2}' + _MONTH_DAY + r'(?![\d-])')
+# [신규] 날짜 패턴 수정 전 파서의 날짜 패턴 (이미 저장된 AUTO_ 영수증 번호와 중복 확인용, 날짜 파싱에는 사용하지 않음)
+_LEGACY_DATE_RE = re.compile(r'(\d{4}[-/.]\d{2}[-/.]\d{2})|(\d{2}[-/.]\d{2}[-/.]\d{2})')
+_DATE_SEP_RE = re.compile(r'[-/.]')
+# 승인번호, 일련번호, 거래번호, APPROVAL, Auth No 등 다양한 패턴 대응
+_RECEIPT_NO_RE = re.compile(r'(승인번호|일련번호|거래번호|결제번호|approval|auth|no|number)[:.\s]*([0-9-]{8,20})')
+
 def check_business_number(ocr_text):
     """
     OCR 텍스트에서 유효한 사업자번호가 존재하는지 확인.
@@ -37,170 +97,139 @@ def check_business_number(ocr_text):
     if not ocr_text: str = ""
     
     # OCR 텍스트 정규화 (숫자만 남김)
-    normalized_text = re.sub(r'[^0-9]', '', ocr_text)
+    normalized_text = _NON_DIGIT_RE.sub('', ocr_text)
     
-    for biz_num in VALID_BIZ_NUMBERS:
-        # 비교군도 정규화
-        clean_biz = biz_num.replace('-', '')
+    for biz_num, clean_biz in _CLEAN_BIZ_NUMBERS:
         if clean_biz in normalized_text:
             return True, biz_num
             
     return False, None
 
-def detect_text_from_receipt(image_path):
-    credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
-    if not credentials_json:
-        raise Exception("구글 키(JSON)가 Render 환경변수에 등록되지 않았습니다!")
+def detect_text_from_receipt(image_content):
+    # [수정] 디스크 파일 대신 업로드 버퍼(bytes)를 그대로 사용
+    # [수정] 요청마다 클라이언트를 만들지 않고 워커별 OCR 백엔드 재사용
 
-    try:
-        credentials_info = json.loads(credentials_json)
-        credentials = service_account.Credentials.from_service_account_info(credentials_info)
-        client = vision.ImageAnnotatorClient(credentials=credentials)
-    except Exception as e:
-        raise Exception(f"구글 키 오류: {e}")
+    # [수정] OCR 관련 모듈(config 필요)은 사용 시점에 import
+    # -> parse_receipt_text / bench_parser.py는 FERNET_KEY 등 비밀키 없이 실행 가능
+    from services.ocr_backend import get_ocr_backend
+    from services.image_preprocess import preprocess_receipt_image
+    from services.metrics import stage
 
-    try:
-        with io.open(image_path, 'rb') as image_file:
-            content = image_file.read()
+    # [신규] 축소/흑백 변환된 이미지로 OCR (전송량 감소)
+    with stage("preprocess"):
+        content = preprocess_receipt_image(image_content)
 
-        image = vision.Image(content=content)
-        response = client.text_detection(image=image)
-        
-        if response.error.message:
-            raise Exception(f"구글 API 에러: {response.error.message}")
+    with stage("ocr"):
+        full_text = get_ocr_backend().detect_text(content)
 
-        texts = response.text_annotations
+    if full_text:
+        # [수정] 전체 텍스트는 개인정보가 포함될 수 있어 추적 요청에서만 기록
+        trace(logger, "OCR 원본 데이터:\n%s", full_text)
+        return full_text
+    else:
+        return None
+
+def _amount_from_line(text):
+    """한 줄에서 오른쪽 끝에 있는 유효한 금액 추출 (없으면 None)"""
+    # 승인번호, 전화번호 등이 포함된 줄은 위험하므로 큰 숫자를 거름
+    is_risky_line = None
 
+    for num_str in reversed(_NUMBER_RE.findall(text)):
+        clean_num = num_str.replace(',', '').replace('.', '')
+        if not clean_num.isdigit():
+            continue
+        val = int(clean_num)
+        # 100원 ~ 5천만원
+        if not 100 <= val < 50000000:
+            continue
+        # [핵심 수정] 8자리 이상 숫자는 '승인번호'일 확률이 매우 높음
+        # 금액이 1000만원 이상일 경우 반드시 콤마(,)가 있어야만 인정 (휴리스틱)
+        if len(clean_num) >= 8:
+            if ',' not in num_str:
+                continue # 콤마 없는 큰 숫자는 무시 (승인번호 오인 방지)
+            if is_risky_line is None:
+                is_risky_line = _RISKY_LINE_RE.search(text) is not None
+            if is_risky_line:
+                continue # 위험한 단어가 있는 줄의 큰 숫자는 무시
+        return val
+    return None
 
-        if texts:
-            # 전체 텍스트 로그 (디버깅용)
-            full_text = texts[0].description
-            print(f"\n[OCR 원본 데이터]\n{full_text}\n[OCR 끝]\n")
-            return full_text
-        else:
-            return None
 
-    except Exception as e:
+def _fallback_max_from_line(text):
+    """비상 대책용: 한 줄에서 금액 후보 중 최대값 (승인번호/전화번호/날짜 줄은 0)"""
+    if _FALLBACK_SKIP_RE.search(text):
+        return 0
+
+    max_val = 0
+    for cand in _NUMBER_NO_DOT_RE.findall(text):
+        val_str = cand.replace(',', '')
+        if not val_str.isdigit():
+            continue
+        val = int(val_str)
+        # 100원 ~ 5천만원, 콤마가 없는 8자리 이상 숫자는 금액으로 인정 안 함 (승인번호 회피)
+        if 100 <= val < 50000000 and not (len(val_str) >= 8 and ',' not in cand):
+            max_val = max(max_val, val)
+    return max_val
 
-        raise e 
 
 def parse_receipt_text(ocr_text):
+    """
+    OCR 텍스트 -> {receipt_no, branch_paid, amount, date}
+    [수정] 사전 컴파일된 패턴 + 결합 키워드 패턴으로 텍스트를 항목별로 반복 스캔하지 않음 (대량 재파싱 대비)
+    """
     data = { "receipt_no": None, "branch_paid": "미확인 지점", "amount": 0, "date": None }
     if not ocr_text: return data
 
-    # 1. 지점명 찾기
     clean_text_all = ocr_text.replace(' ', '').lower()
-    for official_name, keywords in BRANCH_NAMES.items():
-        for keyword in keywords:
-            if keyword.replace(' ', '') in clean_text_all:
-                data["branch_paid"] = official_name
-                break
-        if data["branch_paid"] != "미확인 지점": break
-            
-    # 2. 금액 찾기
-    
-    # ★ 추가된 키워드: "카드결제액", "결제액" (롯데백화점 대응)
-    keywords_list = ["합계", "결제금액", "청구금액", "받을금액", "승인금액", "매출금액", "total", "tot", "amount", "카드결제액", "결제액"]
-    
-    lines = ocr_text.split('\n')
-    found_amount = False
-
-    # [보조 함수] 한 줄에서 오른쪽 끝에 있는 유효한 금액 추출
-    def get_amount_from_line(text):
-        # 1. 승인번호, 전화번호 등이 포함된 줄은 위험하므로 거름 (단, 키워드가 명확히 있는 줄이면 통과)
-        # "카드번호", "가맹점번호" 등도 추가
-        bad_words = ["승인번호", "승인", "가맹점", "사업자", "Tel", "TEL", "문의", "카드번호", "Card", "No", "NO", "ID"]
-        is_risky_line = any(bad_word in text for bad_word in bad_words)
-        
-        numbers = re.findall(r'([0-9,.]+)', text)
-        if numbers:
-            for num_str in reversed(numbers):
-                clean_num = num_str.replace(',', '').replace('.', '')
-                if clean_num.isdigit():
-                    val = int(clean_num)
-                    # 100원 ~ 5천만원
-                    if 100 <= val < 50000000:
-                        # [핵심 수정] 8자리 이상 숫자는 '승인번호'일 확률이 매우 높음
-                        # 금액이 1000만원 이상일 경우 반드시 콤마(,)가 있어야만 인정 (휴리스틱)
-                        if len(clean_num) >= 8:
-                            if ',' not in num_str:
-                                continue # 콤마 없는 큰 숫자는 무시 (승인번호 오인 방지)
-                            if is_risky_line:
-                                continue # 위험한 단어가 있는 줄의 큰 숫자는 무시
-                        
-                        return val
-        return None
 
-    print("\n🔍 [금액 탐색 시작]")
+    # 1. 지점명 + 환불 키워드 (결합 패턴 1회 탐색)
+    # 여러 지점 키워드가 나오면 BRANCH_NAMES 순서상 앞선 지점을 채택
+    best_branch = None
+    is_refund = False
+    for match in _TOKEN_RE.finditer(clean_text_all):
+        kind = _TOKEN_KIND[match.group(1)]
+        if kind == "REFUND":
+            is_refund = True
+        elif best_branch is None or kind[0] < best_branch[0]:
+            best_branch = kind
+    if best_branch:
+        data["branch_paid"] = best_branch[1]
 
-    for i in range(len(lines)):
-        line = lines[i]
-        # 공백/특수문자 제거 ("합   계" -> "합계", "카 드 결 제 액" -> "카드결제액")
-        pure_line = re.sub(r'[^가-힣a-zA-Z]', '', line) 
+    # 2~3. 금액 찾기 (줄 단위 1회 순회)
+    # 키워드 줄 또는 그 아래 2줄 안에서 처음 나오는 금액 채택 (공백 때문에 밀린 경우 대응)
+    # 공백/특수문자 제거 ("합   계" -> "합계", "카 드 결 제 액" -> "카드결제액")는 전체 텍스트에 1회 적용
+    lines = ocr_text.split('\n')
+    pure_lines = _NON_LETTER_RE.sub('', ocr_text).split('\n')
+    last_keyword_line = None
+    found_amount = None
 
-        if any(k in pure_line for k in keywords_list):
-            print(f"👉 키워드 발견(L{i}): {line}")
-            
-            # [1단계] 같은 줄 확인
-            amount = get_amount_from_line(line)
-            if amount:
-                data["amount"] = amount
-                found_amount = True
-                print(f"✅ (같은 줄) 금액 발견: {amount}")
+    for i, line in enumerate(lines):
+        if _AMOUNT_KEYWORD_RE.search(pure_lines[i]):
+            last_keyword_line = i
+        if last_keyword_line is not None and i - last_keyword_line <= 2:
+            found_amount = _amount_from_line(line)
+            if found_amount is not None:
+                trace(logger, "금액 발견(L%d, 키워드 L%d): %s", i, last_keyword_line, found_amount)
                 break
-            
-            # [2단계] 아래 2줄까지 확인 (공백 때문에 밀린 경우)
-            print("   ↳ 같은 줄에 없음. 아래 줄 수색.")
-            for j in range(1, 3):
-                if i + j < len(lines):
-                    next_line = lines[i+j]
-                    amount_next = get_amount_from_line(next_line)
-                    if amount_next:
-                        data["amount"] = amount_next
-                        found_amount = True
-                        print(f"✅ (아래 {j}번째 줄) 금액 발견: {amount_next}")
-                        break
-            if found_amount: break
-
-    # 3. 비상 대책: 전체 숫자 중 최대값 (단, 승인번호 제외!)
-    if not found_amount:
-        print("⚠️ 키워드 실패. '승인번호' 제외하고 최대값 추정.")
-        max_val = 0
-        
-        for line in lines:
-            # ★ 핵심 수정: 승인번호, 전화번호, 날짜가 있는 줄은 아예 무시합니다.
-            # "No", "ID", "Code" 등 추가
-            if any(bad in line for bad in ["승인", "번호", "Tel", "TEL", "사업자", "Date", "Time", "날짜", "Card", "No", "NO", "ID", "Code"]):
-                continue
-
-            candidates = re.findall(r'([0-9,]+)', line)
-            for cand in candidates:
-                val_str = cand.replace(',', '').replace('.', '')
-                if val_str.isdigit():
-                    val = int(val_str)
-                    # 100원 ~ 5천만원
-                    if 100 <= val < 50000000: 
-                        # [비상대책 강화] 콤마가 없는 8자리 이상 숫자는 절대 금액으로 인정 안 함 (승인번호 회피)
-                        if len(val_str) >= 8 and ',' not in cand:
-                            continue
-                        
-                        if val > max_val:
-                            max_val = val
-                            
+
+    if found_amount is not None:
+        data["amount"] = found_amount
+    else:
+        # 비상 대책: 전체 숫자 중 최대값 (단, 승인번호 제외!)
+        max_val = max((_fallback_max_from_line(line) for line in lines), default=0)
         if max_val > 0:
             data["amount"] = max_val
-            print(f"💰 비상 대책으로 찾은 금액: {data['amount']}")
+            trace(logger, "비상 대책으로 찾은 금액: %s", max_val)
 
-    # 4. 날짜 찾기 (추가)
-    date_match = re.search(r'(\d{4}[-/.]\d{2}[-/.]\d{2})|(\d{2}[-/.]\d{2}[-/.]\d{2})', ocr_text)
+    # 4. 날짜 찾기
+    date_match = _DATE_RE.search(ocr_text) or _SHORT_DATE_RE.search(ocr_text)
     if date_match:
-        data["date"] = date_match.group(0).replace('-', '').replace('/', '').replace('.', '')
+        data["date"] = _DATE_SEP_RE.sub('', date_match.group(0))
     else:
         data["date"] = datetime.now().strftime("%Y%m%d")
 
     # 5. 승인번호 찾기 (강화)
-    # 승인번호, 일련번호, 거래번호, APPROVAL, Auth No 등 다양한 패턴 대응
-    receipt_no_match = re.search(r'(승인번호|일련번호|거래번호|결제번호|approval|auth|no|number)[:.\s]*([0-9-]{8,20})', clean_text_all)
+    receipt_no_match = _RECEIPT_NO_RE.search(clean_text_all)
     if receipt_no_match:
         data["receipt_no"] = receipt_no_match.group(2).replace('-', '')
     else:
@@ -209,17 +238,27 @@ def parse_receipt_text(ocr_text):
         safe_branch = data["branch_paid"].replace(' ', '')
         data["receipt_no"] = f"AUTO_{safe_branch}_{data['amount']}_{data['date']}"
 
-    # 6. 환불/단품취소 감지 (NEW)
-    refund_keywords = ["취소", "반품", "걸제취소", "승인취소", "매출취소"]
-    is_refund = False
-    
-    # 텍스트 전체에서 환불 키워드 검색
-    if any(k in clean_text_all for k in refund_keywords):
-        is_refund = True
-        print(f"⚠️ 환불/취소 영수증 감지됨!")
+    # 6. 환불/단품취소 감지: 환불이면 금액 마이너스 처리
+    if is_refund:
+        trace(logger, "환불/취소 영수증 감지")
+        if data["amount"] > 0:
+            data["amount"] = data["amount"] * -1
 
-    # 환불이면 금액 마이너스 처리
-    if is_refund and data["amount"] > 0:
-        data["amount"] = data["amount"] * -1
+    return data
 
-    return data
\ No newline at end of file
+
+def legacy_receipt_no(ocr_text, parsed):
+    """
+    [신규] 날짜 패턴 수정 전 파서가 같은 영수증에 붙였을 AUTO_ 영수증 번호.
+    이전 파서는 사업자번호 일부 등을 날짜로 읽어 AUTO_ 번호가 달라졌으므로, 예전에 등록된 영수증을 다시 올려도
+    중복으로 잡히도록 두 번호를 모두 확인하는 데 사용. 현재 번호와 같거나 승인번호가 있는 영수증이면 None
+    """
+    receipt_no = parsed.get("receipt_no")
+    if not ocr_text or not receipt_no or not receipt_no.startswith("AUTO_"):
+        return None
+    date_match = _LEGACY_DATE_RE.search(ocr_text)
+    if not date_match:
+        # 이전 파서도 날짜가 없으면 오늘 날짜를 사용 (현재 번호와 동일)
+        return None
+    legacy = f"{receipt_no.rsplit('_', 1)[0]}_{_DATE_SEP_RE.sub('', date_match.group(0))}"
+    return legacy if legacy != receipt_no else None
@@ -0,0 +1,96 @@
+import os
+import threading
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import request, jsonify, make_response
+from config import Config
+from services.metrics import inc_counter
+
+BUSY_MESSAGE = "요청이 많아 잠시 후 다시 시도해주세요."
+
+
+class HasherBusy(Exception):
+    """bcrypt 전용 스레드 풀이 가득 찼거나 시간 초과 (429 응답)"""
+
+
+# 프로세스(워커)별 bcrypt 전용 스레드 풀 + 대기열 제한
+# bcrypt는 GIL을 놓고 실행되므로 요청 스레드는 결과만 기다리고, 동시에 돌아가는 해싱 수는 풀 크기로 제한된다.
+_executor = None
+_slots = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_pool():
+    """워커 프로세스별 스레드 풀 반환 (지연 생성, fork 이후 PID가 바뀌면 새로 생성)"""
+    global _executor, _slots, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=Config.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+                # 실행 중 + 대기 중인 작업 수 상한
+                _slots = threading.BoundedSemaphore(Config.BCRYPT_WORKERS + Config.BCRYPT_MAX_PENDING)
+                _executor_pid = pid
+    return _executor, _slots
+
+
+def _run(fn, *args):
+    executor, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        inc_counter("bcrypt_rejected_total", reason="busy")
+        raise HasherBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    # 시간 초과로 포기한 작업도 끝날 때까지 자리를 차지하도록 완료 시점에 반환
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=Config.BCRYPT_TIMEOUT)
+    except FutureTimeout:
+        inc_counter("bcrypt_rejected_total", reason="timeout")
+        raise HasherBusy()
+
+
+def _checkpw(password, hashed):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        return False  # 잘못된 형식의 해시
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def check_password(password, hashed):
+    """비밀번호/PIN 검증 (bcrypt 풀에서 실행). 풀이 가득 차면 HasherBusy"""
+    if not password or not hashed:
+        return False
+    return _run(_checkpw, password, hashed)
+
+
+def hash_password(password):
+    """현재 설정된 cost(BCRYPT_ROUNDS)로 해시 생성 (bcrypt 풀에서 실행)"""
+    return _run(_hashpw, password, Config.BCRYPT_ROUNDS)
+
+
+def needs_rehash(hashed):
+    """해시의 cost가 현재 설정(BCRYPT_ROUNDS)과 다르면 True ($2b$12$... 형식)"""
+    try:
+        return int(hashed.split("$")[2]) != Config.BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return False
+
+
+def busy_response(e):
+    """HasherBusy -> 429 (API 요청은 JSON, 화면 요청은 텍스트)"""
+    if request.is_json:
+        response = jsonify({"success": False, "message": BUSY_MESSAGE})
+    else:
+        response = make_response(BUSY_MESSAGE)
+    response.status_code = 429
+    response.headers["Retry-After"] = "1"
+    return response
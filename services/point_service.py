@@ -0,0 +1,217 @@
+from datetime import datetime
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.orm.util import identity_key
+from models import db, Members, Receipts, PointLedger
+
+
+def adjust_member_points(member_id, amount, kind="receipt", ref=None):
+    """
+    적립금/누적 금액 증감을 DB에서 원자적으로 처리 (UPDATE ... SET balance = balance + :amount).
+    Python에서 읽고-더하고-쓰는 방식은 동시 요청(더블 탭, 여러 워커) 시 한쪽 적립이 사라질 수 있음.
+    [수정] 같은 트랜잭션에서 적립금 원장(PointLedger)에 변경 후 잔액과 함께 기록.
+    커밋은 호출한 쪽 트랜잭션에서 수행.
+    """
+    if not amount:
+        return
+    db.session.execute(
+        update(Members)
+        .where(Members.id == member_id)
+        .values(
+            current_reward_balance=func.coalesce(Members.current_reward_balance, 0) + amount,
+            total_lifetime_spend=func.coalesce(Members.total_lifetime_spend, 0) + amount,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    _expire_member(member_id)
+    _append_ledger(member_id, kind, amount, amount, ref)
+
+
+def deduct_member_points(member_id, cost, ref=None):
+    """
+    잔액이 충분할 때만 차감 (UPDATE ... WHERE balance >= :cost).
+    반환값: 차감 성공 여부 (동시 요청이 먼저 차감하여 잔액이 부족해졌으면 False)
+    """
+    result = db.session.execute(
+        update(Members)
+        .where(Members.id == member_id, func.coalesce(Members.current_reward_balance, 0) >= cost)
+        .values(current_reward_balance=func.coalesce(Members.current_reward_balance, 0) - cost)
+        .execution_options(synchronize_session=False)
+    )
+    _expire_member(member_id)
+    if result.rowcount != 1:
+        return False
+    _append_ledger(member_id, "claim", -cost, 0, ref)
+    return True
+
+
+def _append_ledger(member_id, kind, amount, spend_delta, ref):
+    """
+    원장 1행 추가. 변경 후 잔액은 방금 UPDATE한 회원 행에서 읽음
+    (UPDATE가 잡은 행 잠금이 커밋까지 유지되므로 동시 변경과 순서가 섞이지 않음)
+    """
+    balance, lifetime = db.session.execute(
+        select(func.coalesce(Members.current_reward_balance, 0), func.coalesce(Members.total_lifetime_spend, 0))
+        .where(Members.id == member_id)
+    ).one()
+    db.session.add(PointLedger(
+        member_id=member_id, kind=kind, amount=amount, spend_delta=spend_delta,
+        balance_after=balance, lifetime_after=lifetime, ref=ref, created_at=datetime.now()
+    ))
+
+
+def record_visit(member_id, today):
+    """오늘 첫 방문이면 방문 횟수 +1 (last_visit 조건부 UPDATE로 같은 날 중복 증가 방지)"""
+    db.session.execute(
+        update(Members)
+        .where(
+            Members.id == member_id,
+            or_(Members.last_visit.is_(None), Members.last_visit != today, func.coalesce(Members.visit_count, 0) == 0),
+        )
+        .values(visit_count=func.coalesce(Members.visit_count, 0) + 1, last_visit=today)
+        .execution_options(synchronize_session=False)
+    )
+    _expire_member(member_id)
+
+
+def cancel_visit(member_id):
+    """방문 횟수 -1 (0 미만으로 내려가지 않음)"""
+    db.session.execute(
+        update(Members)
+        .where(Members.id == member_id, Members.visit_count > 0)
+        .values(visit_count=Members.visit_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    _expire_member(member_id)
+
+
+def _expire_member(member_id):
+    # 세션에 로드된 회원 객체가 있으면 갱신된 값을 다시 읽도록 만료 처리
+    # (오래된 값이 커밋 시 덮어쓰이지 않도록)
+    member = db.session.identity_map.get(identity_key(Members, member_id))
+    if member is not None:
+        db.session.expire(member, ["current_reward_balance", "total_lifetime_spend", "visit_count", "last_visit"])
+
+
+def recent_spend_history(member_id, limit=3):
+    """
+    최근 적립 내역 (최신순, 누적 금액 포함) - 원장 (member_id, id) 인덱스로 limit건만 조회.
+    [수정] 원장 도입 전 영수증은 시작 잔액(opening) 1행으로만 남아 있으므로,
+    원장 내역이 limit건보다 적으면 원장 시작 이전 영수증으로 나머지를 채움
+    """
+    entries = (
+        PointLedger.query
+        .filter(PointLedger.member_id == member_id, PointLedger.spend_delta != 0, PointLedger.kind != 'opening')
+        .order_by(PointLedger.id.desc())
+        .limit(limit)
+        .all()
+    )
+    history = [
+        {"date": e.created_at.strftime("%Y-%m-%d"), "amount": e.spend_delta, "total": e.lifetime_after}
+        for e in entries
+    ]
+    if len(history) < limit:
+        history += _pre_ledger_receipt_history(member_id, limit - len(history))
+    return history
+
+
+def _pre_ledger_receipt_history(member_id, limit):
+    """
+    원장 첫 행 이전 영수증 최근 limit건 (최신순, (member_id, visit_date) 인덱스로 limit건만 조회).
+    [수정] 누적 금액은 영수증 전체 SUM 대신 원장 시작 시점의 누적 금액에서 거꾸로 빼며 계산
+    - 시작 잔액(opening) 행: lifetime_after가 원장 도입 전 누적 금액
+    - 그 외 첫 행: lifetime_after - spend_delta (첫 변경 직전 누적 금액)
+    - 원장 행이 없는 회원: 회원 누적 금액(total_lifetime_spend), 전체 영수증이 대상
+    """
+    first = (
+        PointLedger.query
+        .filter(PointLedger.member_id == member_id)
+        .order_by(PointLedger.id.asc())
+        .limit(1)
+        .first()
+    )
+    conditions = [Receipts.member_id == member_id]
+    if first is None:
+        total = db.session.query(func.coalesce(Members.total_lifetime_spend, 0)).filter(Members.id == member_id).scalar() or 0
+    else:
+        total = first.lifetime_after if first.kind == 'opening' else first.lifetime_after - first.spend_delta
+        conditions.append(Receipts.visit_date < first.created_at)
+
+    receipts = Receipts.query.filter(*conditions).order_by(Receipts.visit_date.desc()).limit(limit).all()
+
+    history = []
+    for r in receipts:
+        history.append({"date": r.visit_date.strftime("%Y-%m-%d"), "amount": r.amount, "total": total})
+        total -= r.amount or 0
+    return history
+
+
+def find_ledger_drift():
+    """
+    회원 잔액/누적 금액과 원장을 대조 (집계 쿼리 1회, 불일치 회원만 반환).
+    - 회원 값 != 마지막 원장 행의 변경 후 값 (원장 밖에서 잔액이 바뀜)
+    - 원장 증감 합계 != 마지막 원장 행의 변경 후 값 (원장 행이 누락/변조됨)
+    원장 행이 없는 회원은 0/0으로 간주.
+    """
+    totals = (
+        select(
+            PointLedger.member_id,
+            func.max(PointLedger.id).label("last_id"),
+            func.sum(PointLedger.amount).label("sum_amount"),
+            func.sum(PointLedger.spend_delta).label("sum_spend"),
+        )
+        .group_by(PointLedger.member_id)
+        .subquery()
+    )
+    balance = func.coalesce(Members.current_reward_balance, 0)
+    lifetime = func.coalesce(Members.total_lifetime_spend, 0)
+    sum_amount = func.coalesce(totals.c.sum_amount, 0)
+    sum_spend = func.coalesce(totals.c.sum_spend, 0)
+    balance_after = func.coalesce(PointLedger.balance_after, 0)
+    lifetime_after = func.coalesce(PointLedger.lifetime_after, 0)
+
+    rows = db.session.execute(
+        select(Members.id, balance, lifetime, balance_after, lifetime_after, sum_amount, sum_spend)
+        .outerjoin(totals, totals.c.member_id == Members.id)
+        .outerjoin(PointLedger, PointLedger.id == totals.c.last_id)
+        .where(or_(balance != balance_after, lifetime != lifetime_after,
+                   sum_amount != balance_after, sum_spend != lifetime_after))
+        .order_by(Members.id)
+    ).all()
+
+    return [
+        {"member_id": r[0], "balance": r[1], "lifetime": r[2], "ledger_balance": r[3],
+         "ledger_lifetime": r[4], "sum_amount": r[5], "sum_spend": r[6]}
+        for r in rows
+    ]
+
+
+def fix_ledger_drift(drift):
+    """
+    불일치 회원마다 보정(correction) 행을 추가하여 원장을 회원 잔액에 맞춤 (회원 잔액은 변경하지 않음).
+    보정 직전에 회원 행을 잠그고 다시 계산하여 검사 이후의 적립/차감과 섞이지 않도록 함.
+    반환값: 보정된 회원 수
+    """
+    fixed = 0
+    for item in drift:
+        member_id = item["member_id"]
+        balance, lifetime = db.session.execute(
+            select(func.coalesce(Members.current_reward_balance, 0), func.coalesce(Members.total_lifetime_spend, 0))
+            .where(Members.id == member_id)
+            .with_for_update()
+        ).one()
+        sum_amount, sum_spend = db.session.execute(
+            select(func.coalesce(func.sum(PointLedger.amount), 0), func.coalesce(func.sum(PointLedger.spend_delta), 0))
+            .where(PointLedger.member_id == member_id)
+        ).one()
+        last = PointLedger.query.filter_by(member_id=member_id).order_by(PointLedger.id.desc()).first()
+        if last and (balance, lifetime, sum_amount, sum_spend) == (last.balance_after, last.lifetime_after, balance, lifetime):
+            db.session.rollback()
+            continue  # 그 사이 정상화됨
+        db.session.add(PointLedger(
+            member_id=member_id, kind="correction",
+            amount=balance - sum_amount, spend_delta=lifetime - sum_spend,
+            balance_after=balance, lifetime_after=lifetime, created_at=datetime.now()
+        ))
+        db.session.commit()
+        fixed += 1
+    return fixed
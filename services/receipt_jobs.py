@@ -0,0 +1,244 @@
+import os
+import json
+import uuid
+import threading
+import contextvars
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from models import db, Members, ReceiptJobs
+from config import Config
+from services.receipt_service import process_receipt_image, save_receipt_image
+from services.metrics import start_timer, finish_timer
+
+# 프로세스(워커)별 작업 스레드 풀
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_last_purge = 0.0
+
+# 프로세스(워커)별 중단 작업 확인 스레드
+_sweeper = None
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+# 결과 중 개인정보 필드 - 작업 테이블에는 저장하지 않고 결과 조회 시 회원 정보에서 다시 채움
+PII_RESULT_FIELDS = ("member_name", "phone")
+
+
+def _get_executor():
+    """
+    워커 프로세스별 스레드 풀 반환 (지연 생성).
+    Gunicorn fork 이후에는 부모의 스레드가 복제되지 않으므로 PID가 바뀌면 새로 생성한다.
+    """
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=Config.RECEIPT_JOB_WORKERS, thread_name_prefix="receipt-job")
+                _executor_pid = pid
+    return _executor
+
+
+def enqueue_receipt_job(member_id, content, ext):
+    """
+    영수증 작업을 DB 큐에 등록하고 스레드 풀에 제출. 반환값: 작업 ID
+    (재시작 시에도 작업을 재개할 수 있도록 이미지는 처리 전까지 instance 폴더에 임시 보관)
+    """
+    _, image_path = save_receipt_image(content, ext)
+    job = ReceiptJobs(
+        id=str(uuid.uuid4()),
+        member_id=member_id,
+        status='QUEUED',
+        image_path=image_path,
+        image_ext=ext,
+        created_at=datetime.now(),
+        updated_at=datetime.now()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _submit(current_app._get_current_object(), job.id)
+    return job.id
+
+
+def _submit(app, job_id):
+    # 요청 ID / 추적 여부(ContextVar)를 작업 스레드로 전달
+    ctx = contextvars.copy_context()
+    _get_executor().submit(ctx.run, run_receipt_job, app, job_id)
+
+
+def _claim_job(job_id):
+    """QUEUED -> RUNNING 조건부 UPDATE (여러 워커가 동시에 가져가도 1곳만 처리)"""
+    claimed = ReceiptJobs.query.filter_by(id=job_id, status='QUEUED').update(
+        {"status": 'RUNNING', "updated_at": datetime.now()}, synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def run_receipt_job(app, job_id):
+    """스레드 풀에서 실행: OCR -> 파싱 -> 적립 후 결과를 작업 테이블에 저장"""
+    with app.app_context():
+        timer = None
+        try:
+            if not _claim_job(job_id):
+                return
+            timer = start_timer(mode="async")
+
+            job = db.session.get(ReceiptJobs, job_id)
+            member = db.session.get(Members, job.member_id)
+
+            # [수정] 임시 파일은 작업이 끝난 뒤(DONE/FAILED) 삭제 - 처리 중 워커가 죽으면 재시작 시 다시 처리
+            with open(job.image_path, "rb") as f:
+                content = f.read()
+
+            result = process_receipt_image(member, content, job.image_ext)
+
+            job.status = 'DONE'
+            job.result_json = json.dumps(
+                {k: v for k, v in result.items() if k not in PII_RESULT_FIELDS}, ensure_ascii=False
+            )
+            job.updated_at = datetime.now()
+            db.session.commit()
+            finish_timer(timer, "success" if result.get("success") else "error")
+            _remove_image(job.image_path)
+            _maybe_purge()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Receipt Job Error ({job_id}): {e}", exc_info=True)
+            if timer:
+                finish_timer(timer, "error")
+            job = db.session.get(ReceiptJobs, job_id)
+            if job:
+                job.status = 'FAILED'
+                job.result_json = json.dumps(
+                    {"title": "시스템 오류", "message": "처리 중 오류가 발생했습니다. 다시 시도해주세요.", "success": False},
+                    ensure_ascii=False
+                )
+                job.updated_at = datetime.now()
+                db.session.commit()
+                _remove_image(job.image_path)
+        finally:
+            db.session.remove()
+
+
+def _remove_image(image_path):
+    # 승인 대기 건은 process_receipt_image에서 별도 파일로 다시 저장하므로 임시 파일은 삭제
+    if image_path and os.path.exists(image_path):
+        try: os.remove(image_path)
+        except OSError: pass
+
+
+def get_job_result(job):
+    """완료된 작업의 result.html 렌더링용 dict (미완료면 None, 이름/전화번호는 회원 정보에서 복호화)"""
+    if job.status not in ('DONE', 'FAILED') or not job.result_json:
+        return None
+    result = json.loads(job.result_json)
+    if result.get("success"):
+        member = db.session.get(Members, job.member_id)
+        if member is None:
+            return {"title": "오류", "message": "회원 정보를 찾을 수 없습니다.", "success": False}
+        result.update(member_name=member.name, phone=member.phone, member_id=member.id)
+    return result
+
+
+def purge_finished_jobs(hours=None):
+    """보관 시간(RECEIPT_JOB_RETENTION_HOURS)이 지난 완료/실패 작업 삭제. 반환값: 삭제 건수"""
+    cutoff = datetime.now() - timedelta(hours=hours or Config.RECEIPT_JOB_RETENTION_HOURS)
+    deleted = ReceiptJobs.query.filter(
+        ReceiptJobs.status.in_(('DONE', 'FAILED')), ReceiptJobs.updated_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _maybe_purge():
+    """작업 스레드에서 1시간에 한 번 정리 (실패해도 작업 결과에는 영향 없음)"""
+    global _last_purge
+    if time.time() - _last_purge < 3600:
+        return
+    _last_purge = time.time()
+    try:
+        purge_finished_jobs()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Receipt job purge failed: {e}")
+
+
+def _requeue_stale_jobs():
+    """
+    처리 중(RUNNING)에 워커가 중단되어 RECEIPT_JOB_LEASE_SECONDS 동안 갱신되지 않은 작업 복구.
+    이미지가 남아 있으면 QUEUED로 되돌리고, 없으면 FAILED(다시 시도 안내)로 종료.
+    반환값: QUEUED로 되돌린 작업 ID 목록
+    """
+    cutoff = datetime.now() - timedelta(seconds=Config.RECEIPT_JOB_LEASE_SECONDS)
+    stale = ReceiptJobs.query.filter(ReceiptJobs.status == 'RUNNING', ReceiptJobs.updated_at < cutoff).all()
+    for job in stale:
+        job.updated_at = datetime.now()
+        if job.image_path and os.path.exists(job.image_path):
+            job.status = 'QUEUED'
+        else:
+            job.status = 'FAILED'
+            job.result_json = json.dumps(
+                {"title": "처리 실패", "message": "영수증 처리가 중단되었습니다. 다시 업로드해주세요.", "success": False},
+                ensure_ascii=False
+            )
+    db.session.commit()
+    return [job.id for job in stale if job.status == 'QUEUED']
+
+
+def resume_queued_jobs(min_age=0):
+    """
+    재시작 등으로 처리되지 못한 QUEUED 작업(중단된 RUNNING 작업 포함)을 다시 제출.
+    min_age(초): 이보다 최근에 등록/갱신된 QUEUED 작업은 제외 (다른 워커의 스레드 풀에서 대기 중일 수 있음)
+    (여러 워커가 동시에 제출해도 _claim_job에서 1곳만 처리)
+    """
+    app = current_app._get_current_object()
+    job_ids = set(_requeue_stale_jobs())
+    query = db.session.query(ReceiptJobs.id).filter(ReceiptJobs.status == 'QUEUED')
+    if min_age:
+        query = query.filter(ReceiptJobs.updated_at < datetime.now() - timedelta(seconds=min_age))
+    job_ids.update(row[0] for row in query.all())
+    for job_id in job_ids:
+        _submit(app, job_id)
+    return len(job_ids)
+
+
+def _sweep_loop(app):
+    """
+    [신규] 배포/워커 강제 종료로 중단된 작업은 재시작 직후에는 아직 선점 시간(RECEIPT_JOB_LEASE_SECONDS)이
+    지나지 않았으므로, 시작 시 1회가 아니라 주기적으로 확인해 다시 처리
+    """
+    while True:
+        time.sleep(Config.RECEIPT_JOB_SWEEP_INTERVAL)
+        with app.app_context():
+            try:
+                resumed = resume_queued_jobs(min_age=Config.RECEIPT_JOB_LEASE_SECONDS)
+                if resumed:
+                    app.logger.info("Receipt jobs resumed", extra={"resumed": resumed})
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Receipt job sweep failed")
+            finally:
+                db.session.remove()
+
+
+def ensure_job_sweeper(app):
+    """
+    RECEIPT_ASYNC이고 RECEIPT_JOB_SWEEP_INTERVAL > 0이면 워커 프로세스별 확인 스레드 시작 (요청마다 호출, 이미 있으면 무시).
+    Gunicorn preload로 fork된 워커에도 스레드가 생기도록 PID가 바뀌면 새로 시작한다.
+    """
+    global _sweeper, _sweeper_pid
+    if not Config.RECEIPT_ASYNC or Config.RECEIPT_JOB_SWEEP_INTERVAL <= 0:
+        return
+    pid = os.getpid()
+    if _sweeper_pid == pid:
+        return
+    with _sweeper_lock:
+        if _sweeper_pid != pid:
+            _sweeper = threading.Thread(target=_sweep_loop, args=(app,), name="receipt-job-sweep", daemon=True)
+            _sweeper.start()
+            _sweeper_pid = pid
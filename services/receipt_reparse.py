@@ -0,0 +1,128 @@
+import os
+import csv
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sqlalchemy import update
+from models import db, Receipts
+from config import decrypt_data
+from services.ocr_parser import parse_receipt_text
+
+REPORT_COLUMNS = ["receipt_id", "receipt_no", "status", "fields", "old_amount", "new_amount", "old_branch", "new_branch"]
+
+
+def _reparse_chunk(rows):
+    """
+    (워커 프로세스에서 실행) 저장된 OCR 원문을 다시 파싱하여 현재 값과 비교.
+    rows: [(id, receipt_no, status, amount, branch_paid, 암호화된 OCR 원문)]
+    반환값: (처리 건수, 불일치 목록)
+    """
+    diffs = []
+    for receipt_id, receipt_no, status, amount, branch_paid, ocr_text in rows:
+        parsed = parse_receipt_text(decrypt_data(ocr_text))
+
+        fields = []
+        if parsed["amount"] != amount:
+            fields.append("amount")
+        if parsed["branch_paid"] != branch_paid:
+            fields.append("branch_paid")
+        if fields:
+            diffs.append({
+                "receipt_id": receipt_id,
+                "receipt_no": receipt_no,
+                "status": status,
+                "fields": "+".join(fields),
+                "old_amount": amount,
+                "new_amount": parsed["amount"],
+                "old_branch": branch_paid,
+                "new_branch": parsed["branch_paid"],
+            })
+    return len(rows), diffs
+
+
+def _iter_chunks(chunk_size, since=None):
+    """OCR 원문이 있는 영수증을 id 순으로 chunk_size개씩 스트리밍 (yield_per: 전체를 메모리에 올리지 않음)"""
+    query = db.session.query(
+        Receipts.id, Receipts.receipt_no, Receipts.status, Receipts.amount, Receipts.branch_paid, Receipts.ocr_text
+    ).filter(Receipts.ocr_text.isnot(None))
+    if since:
+        query = query.filter(Receipts.visit_date >= since)
+
+    rows = iter(query.order_by(Receipts.id).yield_per(chunk_size))
+    while True:
+        chunk = [tuple(row) for row in islice(rows, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def _apply_fixes(diffs, batch_size):
+    """
+    불일치 항목 일괄 UPDATE (기본키 기준 bulk update, 배치마다 커밋).
+    - 지점명: 포인트와 무관하므로 모두 수정
+    - 금액: 아직 적립되지 않은 승인 대기(PENDING) 건만 수정
+      (이미 적립된 건은 회원 잔액과 맞춰야 하므로 리포트만 하고 관리자 화면에서 수정)
+    반환값: 수정된 영수증 수
+    """
+    branch_rows = [{"id": d["receipt_id"], "branch_paid": d["new_branch"]}
+                   for d in diffs if "branch_paid" in d["fields"]]
+    amount_rows = [{"id": d["receipt_id"], "amount": d["new_amount"], "amount_claimed": d["new_amount"]}
+                   for d in diffs if "amount" in d["fields"] and d["status"] == 'PENDING']
+
+    for rows in (branch_rows, amount_rows):
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(update(Receipts), rows[start:start + batch_size])
+            db.session.commit()
+
+    return len({row["id"] for row in branch_rows + amount_rows})
+
+
+def reparse_receipts(report_path, chunk_size=1000, workers=None, since=None, apply=False):
+    """
+    저장된 OCR 원문으로 과거 영수증을 재파싱하여 현재 금액/지점과 대사(Reconciliation).
+    - 청크 단위로 프로세스 풀에 분산 (workers=0이면 현재 프로세스에서 처리)
+    - 불일치 내역은 report_path(CSV)에 기록, apply=True면 일괄 수정
+    반환값: 요약 dict
+    """
+    summary = {"scanned": 0, "mismatched": 0, "amount": 0, "branch_paid": 0, "amount_delta": 0, "updated": 0}
+    diffs = []
+
+    with open(report_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+
+        def collect(result):
+            scanned, chunk_diffs = result
+            summary["scanned"] += scanned
+            for diff in chunk_diffs:
+                writer.writerow(diff)
+                summary["mismatched"] += 1
+                if "amount" in diff["fields"]:
+                    summary["amount"] += 1
+                    summary["amount_delta"] += (diff["new_amount"] or 0) - (diff["old_amount"] or 0)
+                if "branch_paid" in diff["fields"]:
+                    summary["branch_paid"] += 1
+            diffs.extend(chunk_diffs)
+
+        if workers == 0:
+            for chunk in _iter_chunks(chunk_size, since):
+                collect(_reparse_chunk(chunk))
+        else:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # 제출 대기 중인 청크 수를 제한 (DB에서 읽는 속도가 파싱보다 빨라도 메모리가 늘지 않도록)
+                max_pending = workers * 2
+                pending = set()
+                for chunk in _iter_chunks(chunk_size, since):
+                    pending.add(pool.submit(_reparse_chunk, chunk))
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                for future in pending:
+                    collect(future.result())
+
+    # 스트리밍 조회가 끝난 뒤 수정 (조회 중 커밋하면 서버 측 커서가 닫힘)
+    if apply and diffs:
+        summary["updated"] = _apply_fixes(diffs, chunk_size)
+
+    return summary
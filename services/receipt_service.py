@@ -0,0 +1,230 @@
+import io
+import os
+import uuid
+from datetime import datetime
+from flask import current_app
+from PIL import Image
+from models import db, Receipts
+from config import encrypt_data
+from services.ocr_parser import detect_text_from_receipt, parse_receipt_text, check_business_number, legacy_receipt_no
+from services.ocr_cache import image_digest, get_cached_ocr, put_cached_ocr, set_cached_owner
+from services.log_service import trace
+from services.metrics import stage, set_stage_branch
+from services.point_service import adjust_member_points, record_visit
+
+# 조건부 자동 승인 기준 금액 (15만원)
+THRESHOLD_AUTO_APPROVE = 150000
+
+
+def _error(title, message):
+    return {"title": title, "message": message, "success": False}
+
+
+def _receipt_keys(ocr_text, parsed):
+    """중복 확인용 영수증 번호 목록 (현재 번호 + 날짜 패턴 수정 전 파서의 AUTO_ 번호)"""
+    keys = [parsed["receipt_no"]] if parsed["receipt_no"] else []
+    legacy = legacy_receipt_no(ocr_text, parsed)
+    if legacy:
+        keys.append(legacy)
+    return keys
+
+
+def _registered_by(ocr_text, member_id):
+    """OCR 텍스트의 영수증 번호가 해당 회원 영수증으로 실제 등록되어 있는지 (관리자 삭제 등 반영)"""
+    keys = _receipt_keys(ocr_text, parse_receipt_text(ocr_text))
+    if not keys:
+        return False
+    return db.session.query(Receipts.query.filter(
+        Receipts.receipt_no.in_(keys), Receipts.member_id == member_id
+    ).exists()).scalar()
+
+
+def save_receipt_image(content, ext):
+    """영수증 이미지를 instance 폴더에 저장. 반환값: (파일명, 전체 경로)"""
+    image_filename = str(uuid.uuid4()) + f".{ext}"
+    image_path = os.path.join(current_app.instance_path, image_filename)
+    with open(image_path, "wb") as f:
+        f.write(content)
+    return image_filename, image_path
+
+
+def process_receipt_image(member, content, ext):
+    """
+    업로드 버퍼(bytes)를 검증 -> OCR -> 파싱 -> 적립(DB 커밋)까지 처리.
+    동기 요청(routes/public.py)과 비동기 작업(services/receipt_jobs.py)에서 공통 사용.
+    이미지는 관리자 승인 대기(PENDING) 건만 디스크에 저장한다.
+    반환값: result.html 렌더링용 dict
+    """
+    if not member:
+        return _error("오류", "회원 정보를 찾을 수 없습니다.")
+
+    ocr_result_text = None
+    cached = None
+
+    try:
+        # [보안] 이미지 무결성 검사 (Pillow) - HEIC는 Pillow 기본 미지원일 수 있으므로 try-except 완화
+        try:
+            with stage("verify"), Image.open(io.BytesIO(content)) as img:
+                img.verify()
+        except Exception as e:
+            current_app.logger.warning(f"Image verification warning (might be HEIC): {e}")
+            # HEIC라면 검증 실패해도 일단 진행 (Google Vision이 처리하도록)
+            if ext not in ['heic', 'heif']:
+                return _error("보안 경고", "유효하지 않은 이미지 파일입니다.")
+
+        # [신규] 같은 이미지의 OCR 결과가 캐시에 있으면 Vision 호출 생략
+        with stage("ocr_cache"):
+            image_hash = image_digest(content)
+            cached = get_cached_ocr(image_hash)
+        if cached:
+            current_app.logger.info(f"OCR cache hit: {image_hash[:12]}")
+            # 동일한 사진을 다른 회원이 이미 등록한 경우 차단
+            # [수정] 캐시 기록만 믿지 않고 해당 회원의 영수증이 실제로 등록되어 있는지 확인
+            if cached["member_id"] and cached["member_id"] != member.id and _registered_by(cached["ocr_text"], cached["member_id"]):
+                current_app.logger.warning(f"Same receipt image submitted by another member: {member.id} (first: {cached['member_id']})")
+                return _error("이미 등록된 영수증", "이미 다른 회원님이 등록한 영수증입니다.")
+            ocr_result_text = cached["ocr_text"]
+        else:
+            ocr_result_text = detect_text_from_receipt(content)
+            # 인증 실패(흐릿한 사진 등) 후 재시도도 캐시되도록 OCR 직후 저장 (제출 회원은 등록 커밋 후 기록)
+            put_cached_ocr(image_hash, ocr_result_text)
+        current_app.logger.info(f"OCR Result Length: {len(ocr_result_text) if ocr_result_text else 0}")
+
+        # [보안 강화] 사업자등록번호 검증 (가짜/수기 영수증 차단)
+        # 이제 단순 키워드('에베레스트')가 아닌, 등록된 사업자번호 유무로 판단합니다.
+        is_valid_biz, matched_biz = check_business_number(ocr_result_text)
+
+        if is_valid_biz:
+            current_app.logger.info(f"Valid Business Number Found: {matched_biz}")
+        else:
+            if ocr_result_text:
+                current_app.logger.warning(f"Invalid Receipt (No Biz Num): member {member.id}, {len(ocr_result_text)} chars")
+                trace(current_app.logger, "Invalid Receipt OCR text: %s", ocr_result_text[:100])
+
+            return _error("인증 실패", "영수증에서 '사업자등록번호'를 식별할 수 없습니다.<br>화질이 흐릿하거나 구겨진 영수증은 인식이 어렵습니다.<br>선명하게 다시 촬영해주시거나 직원에게 문의해주세요.")
+
+    except Exception as e:
+        current_app.logger.error(f"Receipt Process Error: {e}", exc_info=True)
+        return _error("시스템 오류", f"처리 중 오류 발생: {e}")
+
+    if not ocr_result_text:
+        return _error("인식 실패", "영수증 글자를 읽을 수 없습니다.")
+
+    # [수정] 캐시된 OCR 텍스트도 항상 현재 파서로 파싱 (파서 변경 후 이전 파싱 결과를 쓰지 않도록)
+    with stage("parse"):
+        parsed_data = parse_receipt_text(ocr_result_text)
+    receipt_no = parsed_data["receipt_no"]
+    branch_paid = parsed_data["branch_paid"]
+    amount = parsed_data["amount"]
+    set_stage_branch(branch_paid)
+
+    current_app.logger.info("Parsed Data", extra={"member_id": member.id, "receipt_no": receipt_no, "branch": branch_paid, "amount": amount})
+
+    # [Rule 1] 1일 1회 적립 제한
+    # 단, 환불(음수)인 경우는 제한에서 제외하여 언제든 취소 가능하게 함
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # 오늘 이 회원이 올린 영수증이 있는지 확인
+    # [수정] 행 전체 대신 EXISTS만 조회 ((member_id, visit_date) 인덱스만으로 판단)
+    with stage("db_check"):
+        today_receipt = db.session.query(Receipts.query.filter(
+            Receipts.member_id == member.id,
+            Receipts.visit_date >= today_start
+        ).exists()).scalar()
+
+    # 금액이 양수(일반 적립)인데 이미 오늘 내역이 있다면 차단
+    if amount > 0 and today_receipt:
+        return _error("적립 제한", "하루에 한 번만 적립 가능합니다. (내일 다시 방문해주세요!)")
+
+    # [Rule 2] 중복 영수증 차단 (기존 로직)
+    # [수정] 날짜 패턴 수정 전에 등록된 영수증은 AUTO_ 번호가 다르므로 이전 번호도 함께 확인
+    with stage("db_check"):
+        duplicate = db.session.query(Receipts.query.filter(
+            Receipts.receipt_no.in_(_receipt_keys(ocr_result_text, parsed_data))
+        ).exists()).scalar()
+    if duplicate:
+        return _error("이미 등록된 영수증", "이미 등록하신 영수증입니다.")
+
+    # [수정] 위 조회는 빠른 안내용이며, 동시 업로드는 (member_id, visit_day) 유니크 인덱스가 최종 차단
+    today = datetime.now().strftime("%Y-%m-%d")
+    new_receipt = Receipts(
+        member_id=member.id, receipt_no=receipt_no, branch_paid=branch_paid, amount=amount, visit_date=datetime.now(),
+        visit_day=today if amount > 0 else None
+    )
+    db.session.add(new_receipt)
+
+    # [수정] 조건부 자동 승인 로직 (15만원 기준)
+    status = 'PENDING'
+    save_message = ""
+
+    if amount < THRESHOLD_AUTO_APPROVE:
+        status = 'APPROVED'
+        # 자동 승인: 포인트 즉시 적립 (아래 커밋 직전 SQL로 원자적 반영)
+        save_message = "적립이 완료되었습니다. (자동 승인)"
+
+        # 자동 승인된 건은 이미지 저장 안 함 (용량 절약)
+        image_url = None
+        image_path = None
+
+    else:
+        status = 'PENDING'
+        # 고액 건: 관리자 승인 대기 (포인트 적립 보류)
+        save_message = "15만원 이상 고액 결제는 관리자 승인 후 적립됩니다."
+
+        # 승인 대기 건은 이미지 보존 (관리자 확인용)
+        # 이미지 경로는 웹에서 접근 가능하도록 상대 경로로 저장하거나 별도 처리 필요
+        # 현재는 instance 폴더에 저장하고, static 등으로 옮기거나, 일단 파일명 기록
+        with stage("image_save"):
+            image_url, image_path = save_receipt_image(content, ext)
+
+    new_receipt.status = status
+    new_receipt.amount_claimed = amount
+    new_receipt.image_url = image_url
+    # [신규] 재파싱(reparse_receipts.py)을 위해 OCR 원문 보관 (개인정보 포함 가능 -> 암호화)
+    new_receipt.ocr_text = encrypt_data(ocr_result_text)
+
+    try:
+        with stage("db"):
+            # 영수증 INSERT(유니크 검사) -> 방문 횟수/적립금 UPDATE -> 커밋을 하나의 트랜잭션으로 처리
+            db.session.flush()
+            # 환불(amount < 0)이 아닐 때만 방문 횟수 증가
+            if amount > 0:
+                record_visit(member.id, today)
+            if status == 'APPROVED':
+                adjust_member_points(member.id, amount, ref=new_receipt.receipt_no)
+            db.session.commit()
+    except Exception as e:
+        # [예외 처리] 중복 키 오류(IntegrityError) 등 DB 커밋 실패 대응
+        db.session.rollback()
+        current_app.logger.error(f"Receipt DB Commit Error: {e}")
+
+        # 저장한 이미지는 삭제
+        if image_path and os.path.exists(image_path):
+            try: os.remove(image_path)
+            except: pass
+
+        # 중복 에러일 가능성이 높으므로 안내 메시지
+        if "UNIQUE constraint" in str(e) or "UniqueViolation" in str(e) or "unique constraint" in str(e):
+            # 같은 날 동시 업로드 (member_id, visit_day 유니크 위반)
+            if "visit_day" in str(e):
+                return _error("적립 제한", "하루에 한 번만 적립 가능합니다. (내일 다시 방문해주세요!)")
+            return _error("이미 등록된 영수증", "이미 등록하신 영수증입니다.")
+
+        return _error("시스템 오류", "데이터 저장 중 오류가 발생했습니다. 다시 시도해주세요.")
+
+    # [수정] 등록이 확정된 뒤에만 이 이미지의 제출 회원으로 기록 (검증/적립 제한으로 실패한 제출은 기록 안 함)
+    set_cached_owner(image_hash, member.id)
+
+    total_spent = member.total_lifetime_spend or 0
+
+    return {
+        "success": True,
+        "title": "처리 완료",
+        "member_name": member.name,
+        "visit_count": member.visit_count,
+        "current_amount": amount,
+        "total_amount": total_spent,
+        "coupon_issued": save_message,
+        "member_id": member.id,
+        "phone": member.phone,
+    }
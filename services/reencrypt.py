@@ -0,0 +1,175 @@
+import hashlib
+from datetime import datetime
+from cryptography.fernet import InvalidToken
+from sqlalchemy import select, update, bindparam, func
+from models import db, Members, Receipts, ReencryptCheckpoints
+from config import FERNET_KEY, FERNET_TOKEN_PREFIX, primary_cipher, cipher_suite
+
+# 재암호화 대상: 테이블 -> Fernet 암호화 컬럼(DB 컬럼명)
+TARGETS = {
+    "members": (Members.__table__, ["name", "phone", "birth"]),
+    "receipts": (Receipts.__table__, ["ocr_text"]),
+}
+
+
+def key_fingerprint():
+    """현재 키(FERNET_KEY) 식별용 지문 - 키가 바뀌면 새 작업으로 처음부터 진행"""
+    return hashlib.sha256(FERNET_KEY.encode()).hexdigest()[:12]
+
+
+def reencrypt_value(value):
+    """
+    값 하나를 현재 키로 재암호화.
+    반환값: (새 값, 상태)
+      current   - 이미 현재 키 (변경 없음)
+      rotated   - 이전 키 암호문 -> 현재 키
+      plaintext - 마이그레이션 전 평문 -> 암호화
+      invalid   - 어떤 키로도 복호화 불가 (변경 없음, 리포트만)
+    """
+    if not value:
+        return value, "current"
+    if not value.startswith(FERNET_TOKEN_PREFIX):
+        return primary_cipher.encrypt(value.encode()).decode(), "plaintext"
+    try:
+        # 서명(HMAC)만 검증하여 현재 키 암호문인지 확인 (AES 복호화 생략)
+        primary_cipher.extract_timestamp(value.encode())
+        return value, "current"
+    except InvalidToken:
+        pass
+    try:
+        return cipher_suite.rotate(value.encode()).decode(), "rotated"
+    except InvalidToken:
+        return value, "invalid"
+
+
+# 읽은 뒤 앱에서 수정되어 조건부 UPDATE가 건너뛴 행을 다시 읽어 재시도하는 횟수
+CONFLICT_RETRIES = 3
+
+
+def _update_statement(table, columns):
+    """
+    id + 읽었던 값이 그대로일 때만 갱신 (조건부 UPDATE).
+    배치 사이에 앱에서 값을 수정했다면 덮어쓰지 않고 건너뜀 -> 다시 읽어서 재시도 (_apply).
+    """
+    return (
+        update(table)
+        .where(table.c.id == bindparam("b_id"),
+               *[table.c[col].is_not_distinct_from(bindparam(f"old_{col}")) for col in columns])
+        .values({col: bindparam(f"new_{col}") for col in columns})
+    )
+
+
+def _plan(rows, columns, stats=None):
+    """행 목록 -> 변경이 필요한 행의 UPDATE 파라미터 목록 (stats가 있으면 값 상태 집계)"""
+    params = []
+    for row in rows:
+        values = row._mapping
+        param = {"b_id": values["id"]}
+        changed = False
+        for col in columns:
+            new_value, state = reencrypt_value(values[col])
+            if stats is not None:
+                stats[state] += 1
+            param[f"old_{col}"] = values[col]
+            param[f"new_{col}"] = new_value
+            changed = changed or new_value != values[col]
+        if changed:
+            params.append(param)
+    return params
+
+
+def _select_rows(table, columns, condition):
+    return db.session.execute(
+        select(table.c.id, *[table.c[col] for col in columns]).where(condition).order_by(table.c.id)
+    ).all()
+
+
+def _apply(table, columns, stmt, params):
+    """
+    조건부 UPDATE 실행 후 같은 행을 다시 읽어 아직 현재 키가 아닌 값이 있으면 재시도
+    (중간에 앱이 한 컬럼만 수정한 행도 나머지 컬럼까지 재암호화).
+    반환값: (갱신 행 수, 재시도 후에도 남은 행 수)
+    """
+    pending = params
+    for _ in range(CONFLICT_RETRIES + 1):
+        db.session.execute(stmt, pending)
+        ids = [param["b_id"] for param in pending]
+        pending = _plan(_select_rows(table, columns, table.c.id.in_(ids)), columns)
+        if not pending:
+            break
+    return len(params) - len(pending), len(pending)
+
+
+def reencrypt_table(table_name, batch_size=500, dry_run=False, restart=False, progress=None):
+    """
+    테이블의 암호화 컬럼을 현재 키로 재암호화 (온라인 실행용).
+    - id 기준 Keyset 배치 조회, 배치마다 짧은 트랜잭션으로 커밋 (테이블 전체 잠금 없음)
+    - 배치마다 체크포인트 저장 -> 중단 후 다시 실행하면 이어서 진행
+    - dry_run: 변경될 건수만 집계 (DB/체크포인트 변경 없음)
+    - [수정] 재시도 후에도 남은 행(conflicts) 또는 복호화 불가 값(invalid)이 있으면 완료로 기록하지 않고
+      체크포인트를 처음으로 되돌림 (complete=False -> 이전 키를 제거하면 안 됨)
+    progress(테이블, 처리 건수, 전체 건수): 배치마다 호출
+    반환값: 요약 dict
+    """
+    table, columns = TARGETS[table_name]
+    job = f"{table_name}:{key_fingerprint()}"
+    stats = {"scanned": 0, "updated": 0, "conflicts": 0,
+             "current": 0, "rotated": 0, "plaintext": 0, "invalid": 0, "resumed_from": 0, "finished": False, "complete": False}
+
+    checkpoint = ReencryptCheckpoints.query.filter_by(job=job).first()
+    if checkpoint is None:
+        checkpoint = ReencryptCheckpoints(job=job, last_id=0, scanned=0, updated=0)
+        if not dry_run:
+            db.session.add(checkpoint)
+            db.session.commit()
+    elif restart and not dry_run:
+        checkpoint.last_id, checkpoint.scanned, checkpoint.updated = 0, 0, 0
+        checkpoint.started_at, checkpoint.finished_at = datetime.now(), None
+        db.session.commit()
+    elif checkpoint.finished_at and not restart:
+        stats["finished"] = stats["complete"] = True
+        return stats  # 이 키로는 이미 완료
+
+    last_id = 0 if restart else (checkpoint.last_id or 0)
+    stats["resumed_from"] = last_id
+    total = db.session.execute(select(func.count()).select_from(table).where(table.c.id > last_id)).scalar()
+    stmt = _update_statement(table, columns)
+
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, *[table.c[col] for col in columns])
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        params = _plan(rows, columns, stats)
+        last_id = rows[-1].id
+        stats["scanned"] += len(rows)
+
+        if dry_run:
+            stats["updated"] += len(params)
+        else:
+            updated, conflicts = _apply(table, columns, stmt, params) if params else (0, 0)
+            stats["updated"] += updated
+            stats["conflicts"] += conflicts
+            checkpoint.last_id = last_id
+            checkpoint.scanned = (checkpoint.scanned or 0) + len(rows)
+            checkpoint.updated = (checkpoint.updated or 0) + updated
+            checkpoint.updated_at = datetime.now()
+            db.session.commit()
+
+        if progress:
+            progress(table_name, stats["scanned"], total)
+
+    stats["complete"] = not dry_run and stats["conflicts"] == 0 and stats["invalid"] == 0
+    if not dry_run:
+        if stats["complete"]:
+            checkpoint.finished_at = datetime.now()
+        else:
+            # 남은 행이 건너뛰어지지 않도록 다음 실행은 처음부터 (이미 현재 키인 값은 서명 확인만 하고 넘어감)
+            checkpoint.last_id = 0
+        db.session.commit()
+    return stats
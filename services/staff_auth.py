@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from limits import parse
+from sqlalchemy import update, func, case
+from models import db, Staffs
+from config import Config
+from extensions import limiter
+from services.password_hasher import check_password, hash_password, needs_rehash, HasherBusy
+
+PIN_FAILED_MESSAGE = "직원 인증 실패: PIN 번호가 올바르지 않습니다."
+SELECT_STAFF_MESSAGE = "직원 인증 실패: PIN만으로 확인할 수 없는 직원이 있습니다. 직원을 선택한 뒤 PIN을 입력해주세요."
+PIN_ONLY_LOCKED_MESSAGE = "PIN 입력 실패가 반복되었습니다. 직원을 선택한 뒤 PIN을 입력해주세요."
+
+
+def verify_staff_pin(branch_code, pin, staff_id=None):
+    """
+    직원 PIN 검증 (요청당 bcrypt 비교 1회).
+    - staff_id 지정: 선택한 직원의 PIN만 검증
+    - 미지정: HMAC 인덱스(지점+PIN)로 직원을 찾은 뒤 bcrypt로 확인
+      (인덱스가 없으면 bcrypt 없이 실패 - 틀린 PIN 대입에 CPU를 쓰지 않음, IP별 요청 제한으로 방어)
+      [수정] 인덱스 없는 기존 직원(도입 전 등록)이 남은 지점은 직원 선택 필수
+      [수정] 직원을 특정할 수 없는 실패는 지점별로 집계, STAFF_PIN_ONLY_FAILURE_LIMIT 초과 시 직원 선택 필수
+    실패 횟수가 STAFF_PIN_MAX_FAILURES에 도달하면 STAFF_PIN_LOCK_MINUTES 동안 잠금.
+    반환값: (직원, 오류 메시지) - 성공 시 오류 메시지는 None
+    """
+    if staff_id:
+        staff = Staffs.query.filter_by(id=staff_id, branch=branch_code).first()
+    else:
+        if not _pin_only_allowed(branch_code):
+            return None, PIN_ONLY_LOCKED_MESSAGE
+        pin_index = Staffs.generate_pin_index(branch_code, pin)
+        staff = Staffs.query.filter_by(branch=branch_code, pin_index=pin_index).first()
+        if staff is None:
+            _record_pin_only_failure(branch_code)
+            if has_legacy_staff(branch_code):
+                return None, SELECT_STAFF_MESSAGE
+            return None, PIN_FAILED_MESSAGE
+
+    if staff is None:
+        return None, PIN_FAILED_MESSAGE
+    if staff.pin_locked_until and staff.pin_locked_until > datetime.now():
+        return None, f"PIN 입력 실패가 반복되어 잠긴 직원입니다. ({staff.pin_locked_until:%H:%M} 이후 다시 시도)"
+
+    if not check_password(pin, staff.pin_hash):
+        _record_failure(staff.id)
+        return None, PIN_FAILED_MESSAGE
+
+    _on_success(staff, branch_code, pin)
+    return staff, None
+
+
+def has_legacy_staff(branch_code):
+    """pin_index가 없는 기존 직원(인덱스 도입 전 등록)이 지점에 남아 있는지 (첫 로그인 시 채워짐)"""
+    return db.session.query(
+        Staffs.query.filter_by(branch=branch_code, pin_index=None).exists()
+    ).scalar()
+
+
+def _on_success(staff, branch_code, pin):
+    """
+    인증 성공 후처리 (호출한 쪽 트랜잭션에서 커밋)
+    - 실패 횟수 초기화, 인덱스 없는 기존 직원은 인덱스 채움
+    - BCRYPT_ROUNDS가 바뀌었으면 평문 PIN을 알고 있는 지금 새 cost로 재해싱
+      (재해싱은 부가 작업이므로 bcrypt 풀이 가득 차면 건너뛰고 다음 인증 때 다시 시도)
+    """
+    if staff.failed_pin_attempts or staff.pin_locked_until:
+        staff.failed_pin_attempts = 0
+        staff.pin_locked_until = None
+    if staff.pin_index is None:
+        staff.pin_index = Staffs.generate_pin_index(branch_code, pin)
+    if needs_rehash(staff.pin_hash):
+        try:
+            staff.pin_hash = hash_password(pin)
+        except HasherBusy:
+            # [수정] PIN은 이미 확인됨 -> 재해싱 때문에 429로 쿠폰 사용이 실패하지 않도록 함
+            pass
+
+
+def _pin_only_allowed(branch_code):
+    """지점별 PIN 단독 실패 횟수가 한도 이내인지 (요청 제한과 같은 저장소 사용 -> 워커 간 공유)"""
+    if not limiter.enabled:
+        return True
+    return limiter.limiter.test(parse(Config.STAFF_PIN_ONLY_FAILURE_LIMIT), "staff-pin-only", branch_code)
+
+
+def _record_pin_only_failure(branch_code):
+    if limiter.enabled:
+        limiter.limiter.hit(parse(Config.STAFF_PIN_ONLY_FAILURE_LIMIT), "staff-pin-only", branch_code)
+
+
+def _record_failure(staff_id):
+    """실패 횟수 +1 (DB에서 원자적으로), 허용 횟수 도달 시 잠금"""
+    attempts = func.coalesce(Staffs.failed_pin_attempts, 0) + 1
+    locked_until = datetime.now() + timedelta(minutes=Config.STAFF_PIN_LOCK_MINUTES)
+    db.session.execute(
+        update(Staffs)
+        .where(Staffs.id == staff_id)
+        .values(
+            failed_pin_attempts=attempts,
+            pin_locked_until=case((attempts >= Config.STAFF_PIN_MAX_FAILURES, locked_until), else_=Staffs.pin_locked_until),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
@@ -0,0 +1,57 @@
+from app import app
+from models import db, Members, AlimtalkOutbox
+from config import Config
+from services.alimtalk_outbox import enqueue_alimtalk, dispatch_once
+from fake_aligo_server import FakeAligoServer
+
+def test_outbox_dispatch():
+    server = FakeAligoServer().start()
+    Config.ALIGO_API_URL, Config.ALIGO_API_KEY = server.url, "test"
+    Config.ALIMTALK_DISPATCH_INTERVAL = 0  # 이 스크립트에서 직접 발송
+
+    with app.app_context():
+        print("Starting outbox verification...")
+        phones = ["010-7777-0001", "010-7777-0002", "010-7777-0003"]
+        members = []
+        for phone in phones:
+            m = Members(name="OutboxTest", phone=phone, branch="test")
+            db.session.add(m)
+            db.session.flush()
+            enqueue_alimtalk(m.id, "WELCOME", f"verify:{m.id}", coupon_name="테스트 쿠폰", expiry_date="2099-12-31")
+            members.append(m)
+        db.session.commit()
+        ids = [m.id for m in members]
+
+        try:
+            # 1. 발송 실패 -> 재시도 대기
+            server.fail_next = 1
+            stats = dispatch_once()
+            print(f"Failed dispatch: {stats}")
+            rows = AlimtalkOutbox.query.filter(AlimtalkOutbox.member_id.in_(ids)).all()
+            assert all(r.status == 'PENDING' and r.attempts == 1 and r.last_error for r in rows)
+            print("SUCCESS: Failed batch scheduled for retry")
+
+            # 2. 재시도 시각 도래 -> 한 번의 요청으로 3명 발송
+            for r in rows:
+                r.next_attempt_at = r.created_at
+            db.session.commit()
+            stats = dispatch_once()
+            print(f"Retry dispatch: {stats}")
+            assert len(server.requests) == 2
+            assert sorted(server.receivers()[-3:]) == phones
+            rows = AlimtalkOutbox.query.filter(AlimtalkOutbox.member_id.in_(ids)).all()
+            assert all(r.status == 'SENT' and r.sent_at for r in rows)
+            print("SUCCESS: Batch sent in a single request")
+
+            # 3. 이미 발송된 알림은 다시 발송하지 않음
+            assert dispatch_once()["claimed"] == 0
+            assert len(server.requests) == 2
+            print("SUCCESS: No duplicate sends")
+        finally:
+            AlimtalkOutbox.query.filter(AlimtalkOutbox.member_id.in_(ids)).delete()
+            Members.query.filter(Members.id.in_(ids)).delete()
+            db.session.commit()
+            server.stop()
+
+if __name__ == "__main__":
+    test_outbox_dispatch()
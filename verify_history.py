@@ -1,17 +1,24 @@
-from app import app, db, Members, Receipts
+from app import app
+from models import db, Members, Receipts, PointLedger
+from services.point_service import adjust_member_points, recent_spend_history
+from services.member_lookup import find_member_by_phone
 from datetime import datetime
 
+def _cleanup(member_id):
+    Receipts.query.filter_by(member_id=member_id).delete()
+    PointLedger.query.filter_by(member_id=member_id).delete()
+    Members.query.filter_by(id=member_id).delete()
+    db.session.commit()
+
 def test_history_logic():
     with app.app_context():
         print("Starting verification...")
         # Create dummy member
         # Use a unique phone to avoid conflicts
         phone = "010-TEST-HIST"
-        existing = Members.query.filter_by(phone=phone).first()
+        existing = find_member_by_phone(phone)
         if existing:
-            Receipts.query.filter_by(member_id=existing.id).delete()
-            db.session.delete(existing)
-            db.session.commit()
+            _cleanup(existing.id)
 
         m = Members(name="Test", phone=phone, branch="test")
         db.session.add(m)
@@ -28,24 +35,16 @@ def test_history_logic():
                     receipt_no=f"R-{d}-{i}", 
                     amount=a, 
                     visit_date=datetime.strptime(d, "%Y-%m-%d"),
-                    branch_paid="test"
+                    branch_paid="test",
+                    status="APPROVED"
                 )
                 db.session.add(r)
+                adjust_member_points(m.id, a, ref=r.receipt_no)
             db.session.commit()
             
-            # Run the logic (copied from app.py)
-            all_receipts = Receipts.query.filter_by(member_id=m.id).order_by(Receipts.visit_date.asc()).all()
-            history = []
-            cumulative_total = 0
-            for r in all_receipts:
-                cumulative_total += r.amount
-                history.append({
-                    "date": r.visit_date.strftime("%Y-%m-%d"),
-                    "amount": r.amount,
-                    "total": cumulative_total
-                })
-            
-            recent_history = history[-3:][::-1]
+            # Run the logic (routes/public.py check -> point ledger)
+            all_receipts = Receipts.query.filter_by(member_id=m.id).all()
+            recent_history = recent_spend_history(m.id, limit=3)
             
             print(f"Total Receipts: {len(all_receipts)}")
             print("Recent History (Last 3, Reversed):")
@@ -53,10 +52,10 @@ def test_history_logic():
                 print(h)
                 
             # Verify values
-            # Expected: 
-            # 1. 2024-01-04, amt 4000, total 10000
-            # 2. 2024-01-03, amt 3000, total 6000
-            # 3. 2024-01-02, amt 2000, total 3000
+            # Expected (latest first): 
+            # 1. amt 4000, total 10000
+            # 2. amt 3000, total 6000
+            # 3. amt 2000, total 3000
             
             assert len(recent_history) == 3
             assert recent_history[0]['amount'] == 4000
@@ -72,10 +71,7 @@ def test_history_logic():
             traceback.print_exc()
         finally:
             # Cleanup
-            pass
-            # Receipts.query.filter_by(member_id=m.id).delete()
-            # Members.query.filter_by(id=m.id).delete()
-            # db.session.commit()
+            _cleanup(m.id)
 
 if __name__ == "__main__":
     test_history_logic()
@@ -1,5 +1,8 @@
-from app import app, db, Members, Receipts, encrypt_data
+from app import app
+from models import db, Members, Receipts
+from config import encrypt_data
 from datetime import datetime
+from services.member_lookup import find_member_by_phone
 
 def test_lookup_and_count():
     with app.app_context():
@@ -24,13 +27,8 @@ def test_lookup_and_count():
         
         # Verify 1: Phone Lookup
         print(f"Searching for phone: {phone}")
-        # Logic from app.py
-        all_members = Members.query.all()
-        found_member = None
-        for mem in all_members:
-            if mem.phone == phone:
-                found_member = mem
-                break
+        # Logic from routes (services/member_lookup.py)
+        found_member = find_member_by_phone(phone)
         
         if found_member:
             print(f"SUCCESS: Found member ID {found_member.id}")